@@ -0,0 +1,162 @@
+"""
+End-to-end benchmark of the extract pipeline against local mock thor nodes:
+fetch, decode, transform and (optionally) write reward events
+
+    poetry run python benchmarks/bench_extract.py --events_per_block 5 --latency_ms 50
+    poetry run python benchmarks/bench_extract.py --task_block_size 120,240,480 \\
+        --delay_between_thor_requests 0.05,0.2
+
+--task_block_size and --delay_between_thor_requests take several values,
+every combination is run. Defaults are the settings extract uses.
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+import time
+from typing import Optional, Sequence, Union
+
+import fire
+from loguru import logger
+
+from mock_thor import MockThorConfig, start_nodes
+from vbd_indexer.b3tr.b3tr_apps import apps_of_round_call, load_app_name_cache
+from vbd_indexer.b3tr.b3tr_events_defs import B3TR_REWARD_DEFINITION
+from vbd_indexer.b3tr.b3tr_models import B3TRRewardDecodedEvent, B3TRRewardEvent
+from vbd_indexer.b3tr.b3tr_round import round_call
+from vbd_indexer.b3tr.b3tr_schemas import B3TR_REWARD_ARROW_SCHEMA
+from vbd_indexer.indexer.event_indexer import EventIndexer
+from vbd_indexer.indexer.indexer_options import IndexerOptions
+from vbd_indexer.sinks.csv_event_sink import CsvEventSink
+from vbd_indexer.sinks.event_sink import EventSink
+from vbd_indexer.sinks.parquet_event_sink import ParquetEventSink
+from vbd_indexer.thor.thor_client import ThorClient
+from vbd_indexer.thor.thor_client_options import ThorClientOptions
+
+
+def _values(value: Union[float, Sequence[float]]) -> Sequence[float]:
+    return value if isinstance(value, (list, tuple)) else (value,)
+
+
+def _warm_app_name_cache(url: str, rounds: int) -> None:
+    """
+    Loads the round ranges and app names from the mock node, like extract does
+    """
+    round_numbers = list(range(1, rounds + 1))
+    thor_client = ThorClient(ThorClientOptions(thor_url=url, http_request_timeout=10))
+    try:
+        outputs = thor_client.call_functions(
+            [round_call(r) for r in round_numbers]
+            + [apps_of_round_call(r) for r in round_numbers]
+        )
+    finally:
+        thor_client.dispose()
+    round_ranges = {
+        r: (vote_start, vote_start + vote_duration)
+        for r, (_, vote_start, vote_duration) in zip(round_numbers, outputs)
+    }
+    app_maps = {
+        r: {"0x" + app[0].hex(): app[2] for app in apps}
+        for r, (apps,) in zip(round_numbers, outputs[rounds:])
+    }
+    load_app_name_cache(round_ranges, app_maps)
+
+
+def _create_sink(output_format: Optional[str], directory: str) -> Optional[EventSink]:
+    if output_format is None:
+        return None
+    file_name = os.path.join(directory, f"bench-rewards.{output_format}")
+    if output_format == "parquet":
+        return ParquetEventSink(file_name, B3TR_REWARD_ARROW_SCHEMA)
+    return CsvEventSink(file_name)
+
+
+def main(
+    nodes: int = 2,
+    rounds: int = 1,
+    round_blocks: int = 8640,
+    events_per_block: float = 5.0,
+    latency_ms: float = 20.0,
+    error_rate: float = 0.0,
+    task_block_size: Union[int, Sequence[int]] = 240,
+    delay_between_thor_requests: Union[float, Sequence[float]] = 0.2,
+    max_events_per_thor_request: int = 1000,
+    max_requests_in_flight_per_endpoint: int = 4,
+    async_mode: bool = True,
+    decode_processes: int = 0,
+    output_format: Optional[str] = None,
+    log_level: str = "WARNING",
+) -> None:
+    """
+    Runs the indexer over all blocks of the mock rounds and prints events/sec
+    --output_format csv or parquet also writes the events (to a temporary directory)
+    """
+    logger.remove()
+    logger.add(sys.stderr, level=log_level)
+    config = MockThorConfig(
+        rounds=rounds,
+        round_blocks=round_blocks,
+        events_per_block=events_per_block,
+        latency_secs=latency_ms / 1000,
+        error_rate=error_rate,
+    )
+    mock_nodes = start_nodes(nodes, config)
+    try:
+        urls = [node.url for node in mock_nodes]
+        _warm_app_name_cache(urls[0], rounds)
+        print(
+            f"{nodes} mock nodes, blocks {config.start_block}-{config.end_block}, "
+            f"{events_per_block} events/block, {latency_ms}ms latency, "
+            f"{error_rate:.0%} errors"
+        )
+        reward_def = B3TR_REWARD_DEFINITION
+        for block_size, delay in itertools.product(
+            _values(task_block_size), _values(delay_between_thor_requests)
+        ):
+            before = [node.stats() for node in mock_nodes]
+            with tempfile.TemporaryDirectory() as directory:
+                options = IndexerOptions[B3TRRewardDecodedEvent, B3TRRewardEvent](
+                    block_ranges=[(config.start_block, config.end_block)],
+                    contract_address=reward_def.contract_address,
+                    topic0=reward_def.topic0,
+                    thor_endpoints=urls,
+                    task_block_size=int(block_size),
+                    delay_between_thor_requests=float(delay),
+                    max_events_per_thor_request=max_events_per_thor_request,
+                    event_decoder=reward_def.event_decoder,
+                    event_transformer=reward_def.event_transformer,
+                    batch_event_decoder=reward_def.batch_event_decoder,
+                    async_mode=async_mode,
+                    max_requests_in_flight_per_endpoint=(
+                        max_requests_in_flight_per_endpoint
+                    ),
+                    split_full_pages=True,
+                    event_sink=_create_sink(output_format, directory),
+                    decode_processes=decode_processes,
+                    decode_process_initializer=load_app_name_cache,
+                    decode_process_initargs=(config.round_ranges(), config.app_maps()),
+                )
+                started = time.perf_counter()
+                idx = EventIndexer(options)
+                idx.start()
+                status = idx.wait()
+                elapsed = time.perf_counter() - started
+            after = [node.stats() for node in mock_nodes]
+            requests, errors = (
+                sum(a[key] - b[key] for a, b in zip(after, before))
+                for key in ("requests", "errors")
+            )
+            print(
+                f"task_block_size={block_size:<5} delay={delay:<5} {status.name:<9} "
+                f"{idx.result_count:>9,} events {elapsed:>7.2f}s "
+                f"{idx.result_count / elapsed:>10,.0f} events/s "
+                f"{requests:>6} requests {errors:>5} errors"
+            )
+    finally:
+        for node in mock_nodes:
+            node.stop()
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,72 @@
+"""
+Micro-benchmarks of the per-event work of an extract and of the round analysis
+
+    poetry run python benchmarks/bench_micro.py [--events 20000] [--repeat 5]
+"""
+
+import time
+from typing import Any, Callable
+
+import fire
+import pandas as pd
+import pyarrow as pa
+
+from mock_thor import MockThorConfig, make_raw_events
+from vbd_indexer.analysis.reward_analyser import _analyse_rewards
+from vbd_indexer.b3tr.b3tr_apps import load_app_name_cache
+from vbd_indexer.b3tr.b3tr_event_decoders import (
+    decode_reward_event,
+    decode_reward_events,
+)
+from vbd_indexer.b3tr.b3tr_event_transformers import transform_reward_event
+from vbd_indexer.b3tr.b3tr_proof_parser import parse_reward_proof
+from vbd_indexer.b3tr.b3tr_schemas import B3TR_REWARD_ARROW_SCHEMA
+from vbd_indexer.sinks.event_sink import event_to_record
+
+
+def _best_of(repeat: int, fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _report(name: str, seconds: float, count: int) -> None:
+    print(
+        f"{name:<28} {seconds / count * 1e6:>9.2f} us/op "
+        f"{count / seconds:>12,.0f} ops/s"
+    )
+
+
+def main(events: int = 20_000, repeat: int = 5) -> None:
+    config = MockThorConfig()
+    raw_events = make_raw_events(events, config)
+    load_app_name_cache(config.round_ranges(), config.app_maps())
+    decoded = decode_reward_events(raw_events)
+    proofs = [e.proof for e in decoded]
+    transformed = [transform_reward_event(e) for e in decoded]
+    # typed like a loaded round file
+    df = pa.Table.from_pylist(
+        [event_to_record(e) for e in transformed], schema=B3TR_REWARD_ARROW_SCHEMA
+    ).to_pandas(types_mapper=pd.ArrowDtype)
+    print(f"{len(raw_events)} synthetic events, best of {repeat}")
+
+    benchmarks = {
+        "decode_reward_event": lambda: [decode_reward_event(e) for e in raw_events],
+        "decode_reward_events": lambda: decode_reward_events(raw_events),
+        "parse_reward_proof": lambda: [parse_reward_proof(p) for p in proofs],
+        # every proof parsed, as when proofs do not repeat
+        "parse_reward_proof uncached": lambda: [
+            parse_reward_proof.__wrapped__(p) for p in proofs
+        ],
+        "transform_reward_event": lambda: [transform_reward_event(e) for e in decoded],
+        "_analyse_rewards": lambda: _analyse_rewards(df),
+    }
+    for name, fn in benchmarks.items():
+        _report(name, _best_of(repeat, fn), len(raw_events))
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,345 @@
+"""
+Local stand-in for a Thor node, serving synthetic B3TR reward events
+
+Serves the endpoints the indexer uses:
+  - GET /blocks/<revision>    the best block
+  - POST /logs/event          RewardDistributed events of a block range, paged
+  - POST /accounts/*          getRound, getAppsOfRound and currentRoundId calls
+  - GET /stats                request and error counters of the node
+Latency, event density and error rate are configurable. Nodes run in their own
+process, so serving does not compete with the indexer for the GIL.
+"""
+
+import json
+import math
+import multiprocessing
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+import httpx
+from eth_abi.abi import decode, encode
+from eth_utils.crypto import keccak
+
+from vbd_indexer.b3tr.b3tr_impact_names import B3TR_IMPACT_NAMES
+from vbd_indexer.thor.raw_event import RawEventPage, parse_raw_event_page
+
+REWARD_TOPIC0 = (
+    "0x"
+    + keccak(text="RewardDistributed(uint256,bytes32,address,string,address)").hex()
+)
+_DISTRIBUTOR_TOPIC = "0x" + "00" * 12 + "ab" * 20
+_SELECTORS = {
+    keccak(text=sig)[:4].hex(): sig
+    for sig in ("getRound(uint256)", "getAppsOfRound(uint256)", "currentRoundId()")
+}
+# distinct abi encoded event payloads, events reuse them so serving stays cheap
+_PAYLOAD_VARIANTS = 256
+
+
+@dataclass(frozen=True)
+class MockThorConfig:
+    """
+    Shape of the synthetic chain and behaviour of the node
+    Round r covers blocks start_block + (r - 1) * round_blocks onwards
+    """
+
+    start_block: int = 1_000_000
+    round_blocks: int = 8640
+    rounds: int = 2
+    # average, blocks get the integer part or one more
+    events_per_block: float = 5.0
+    apps: int = 40
+    wallets: int = 20_000
+    # share of events with an impact proof
+    proof_ratio: float = 0.75
+    latency_secs: float = 0.0
+    # share of /logs/event requests answered with 429 Too Many Requests
+    error_rate: float = 0.0
+    seed: int = 1
+
+    @property
+    def end_block(self) -> int:
+        return self.start_block + self.rounds * self.round_blocks - 1
+
+    def app_id(self, app: int) -> str:
+        return "0x" + f"{app + 1:064x}"
+
+    def app_name(self, app: int) -> str:
+        return f"App{app + 1}"
+
+    def round_ranges(self) -> Dict[int, Tuple[int, int]]:
+        return {
+            r: (
+                self.start_block + (r - 1) * self.round_blocks,
+                self.start_block + r * self.round_blocks - 1,
+            )
+            for r in range(1, self.rounds + 1)
+        }
+
+    def app_maps(self) -> Dict[int, Dict[str, str]]:
+        """
+        App names by app id of every round, as the app name cache holds them
+        """
+        app_map = {self.app_id(app): self.app_name(app) for app in range(self.apps)}
+        return {r: dict(app_map) for r in range(1, self.rounds + 1)}
+
+    def events_in_block(self, block_number: int) -> int:
+        n = block_number - self.start_block
+        if n < 0 or block_number > self.end_block:
+            return 0
+        density = self.events_per_block
+        return math.floor((n + 1) * density) - math.floor(n * density)
+
+
+def _payloads(config: MockThorConfig) -> List[str]:
+    rnd = random.Random(config.seed)
+    payloads = []
+    for _ in range(_PAYLOAD_VARIANTS):
+        proof = ""
+        if rnd.random() < config.proof_ratio:
+            impact = {
+                name: rnd.choice([1, 2, 5, 10, 0.5, 125])
+                for name in rnd.sample(B3TR_IMPACT_NAMES, 2)
+            }
+            proof = json.dumps(
+                {
+                    "version": 2,
+                    "description": "Bench action",
+                    "proof": {"image": "https://example.com/proof.png"},
+                    "impact": impact,
+                }
+            )
+        amount = rnd.randint(1, 100_000) * 10**15 + rnd.randint(0, 10**12)
+        payloads.append("0x" + encode(["uint256", "string"], [amount, proof]).hex())
+    return payloads
+
+
+def block_events(
+    config: MockThorConfig, payloads: List[str], block_number: int
+) -> List[Dict[str, Any]]:
+    """
+    The events of a block, always the same for a config
+    """
+    events = []
+    for k in range(config.events_in_block(block_number)):
+        seed = block_number * 1_000_003 + k
+        events.append(
+            {
+                "data": payloads[seed % len(payloads)],
+                "topics": [
+                    REWARD_TOPIC0,
+                    config.app_id(seed % config.apps),
+                    "0x" + "00" * 12 + f"{(seed * 7919) % config.wallets + 1:040x}",
+                    _DISTRIBUTOR_TOPIC,
+                ],
+                "meta": {
+                    "blockID": "0x" + f"{block_number:064x}",
+                    "blockNumber": block_number,
+                    "blockTimestamp": 1_700_000_000 + block_number * 10,
+                    "txID": "0x" + f"{seed:064x}",
+                    "txOrigin": "0x" + "cd" * 20,
+                    "clauseIndex": 0,
+                },
+            }
+        )
+    return events
+
+
+def range_events(
+    config: MockThorConfig,
+    payloads: List[str],
+    from_block: int,
+    to_block: int,
+    offset: int,
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """
+    A page of the events of a block range, as the /logs/event options select it
+    """
+    events: List[Dict[str, Any]] = []
+    skip = offset
+    first_block = max(from_block, config.start_block)
+    last_block = min(to_block, config.end_block)
+    for block_number in range(first_block, last_block + 1):
+        count = config.events_in_block(block_number)
+        if skip >= count:
+            skip -= count
+            continue
+        events.extend(block_events(config, payloads, block_number)[skip:])
+        skip = 0
+        if len(events) >= limit:
+            break
+    return events[:limit]
+
+
+def make_raw_events(
+    count: int, config: MockThorConfig = MockThorConfig()
+) -> RawEventPage:
+    """
+    The first count synthetic events, parsed like a thor response
+    """
+    payloads = _payloads(config)
+    return parse_raw_event_page(
+        range_events(config, payloads, config.start_block, config.end_block, 0, count)
+    )
+
+
+def _contract_call_output(config: MockThorConfig, call_data: str) -> bytes:
+    selector, args = call_data[2:10], bytes.fromhex(call_data[10:])
+    sig = _SELECTORS.get(selector)
+    if sig == "getRound(uint256)":
+        (round_number,) = decode(["uint256"], args)
+        start = config.start_block + (round_number - 1) * config.round_blocks
+        return encode(
+            ["address", "uint48", "uint32"],
+            ["0x" + "00" * 20, start, config.round_blocks - 1],
+        )
+    if sig == "getAppsOfRound(uint256)":
+        apps = [
+            (
+                bytes.fromhex(config.app_id(app)[2:]),
+                "0x" + "11" * 20,
+                config.app_name(app),
+                "",
+                1,
+                True,
+            )
+            for app in range(config.apps)
+        ]
+        return encode(["(bytes32,address,string,string,uint256,bool)[]"], [apps])
+    if sig == "currentRoundId()":
+        return encode(["uint256"], [config.rounds])
+    raise ValueError(f"Unknown function selector: {selector}")
+
+
+def _make_handler(config: MockThorConfig) -> type:
+    payloads = _payloads(config)
+    stats = {"requests": 0, "logs_requests": 0, "errors": 0, "events": 0}
+    stats_lock = threading.Lock()
+    error_random = random.Random(config.seed)
+
+    def count(**increments: int) -> None:
+        with stats_lock:
+            for key, value in increments.items():
+                stats[key] += value
+
+    class MockThorHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _send(self, status: int, body: Any = None) -> None:
+            content = json.dumps(body).encode() if body is not None else b""
+            self.send_response(status)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self) -> None:
+            if self.path == "/stats":
+                with stats_lock:
+                    return self._send(200, dict(stats))
+            count(requests=1)
+            time.sleep(config.latency_secs)
+            best = config.end_block + 100
+            self._send(
+                200, {"number": best, "id": "0x" + f"{best:064x}", "timestamp": 0}
+            )
+
+        def do_POST(self) -> None:
+            body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+            count(requests=1)
+            time.sleep(config.latency_secs)
+            if self.path.startswith("/logs/event"):
+                with stats_lock:
+                    failed = error_random.random() < config.error_rate
+                if failed:
+                    count(errors=1)
+                    return self._send(429)
+                block_range, options = body["range"], body["options"]
+                events = range_events(
+                    config,
+                    payloads,
+                    block_range["from"],
+                    block_range["to"],
+                    options["offset"],
+                    options["limit"],
+                )
+                count(logs_requests=1, events=len(events))
+                return self._send(200, events)
+            outputs = [
+                {
+                    "data": "0x" + _contract_call_output(config, clause["data"]).hex(),
+                    "events": [],
+                    "transfers": [],
+                    "gasUsed": 0,
+                    "reverted": False,
+                    "vmError": "",
+                }
+                for clause in body["clauses"]
+            ]
+            self._send(200, outputs)
+
+    return MockThorHandler
+
+
+def _serve(config_fields: Dict[str, Any], port_conn: Any) -> None:
+    handler = _make_handler(MockThorConfig(**config_fields))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    port_conn.send(server.server_port)
+    server.serve_forever()
+
+
+class MockThorNode:
+    """
+    A mock thor node in a child process, stopped on exit of a with block
+    """
+
+    def __init__(self, config: MockThorConfig = MockThorConfig()) -> None:
+        self.config = config
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.get_context("spawn").Process(
+            target=_serve, args=(asdict(config), child_conn), daemon=True
+        )
+        self._process.start()
+        self.url = f"http://127.0.0.1:{parent_conn.recv()}"
+
+    def stats(self) -> Dict[str, int]:
+        return httpx.get(f"{self.url}/stats").json()
+
+    def stop(self) -> None:
+        self._process.terminate()
+        self._process.join()
+
+    def __enter__(self) -> "MockThorNode":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def start_nodes(count: int, config: MockThorConfig) -> Tuple[MockThorNode, ...]:
+    return tuple(MockThorNode(config) for _ in range(count))
+
+
+if __name__ == "__main__":
+    # serve a mock node in the foreground, e.g. to point extract at it
+    import fire
+
+    def main(port: int = 8669, **config_fields: Any) -> None:
+        config = MockThorConfig(**config_fields)
+        server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(config))
+        print(
+            f"Mock thor node on http://127.0.0.1:{port}, "
+            f"blocks {config.start_block}-{config.end_block}"
+        )
+        server.serve_forever()
+
+    fire.Fire(main)
@@ -0,0 +1,330 @@
+import json
+import os
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Context, Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from vbd_indexer.b3tr.b3tr_impact_names import B3TR_IMPACT_NAMES
+from vbd_indexer.b3tr.b3tr_models import B3TRRewardEvent
+from vbd_indexer.b3tr.b3tr_schemas import B3TR_AMOUNT_SCALE, B3TR_IMPACT_SCALE
+from vbd_indexer.sinks.arrow_schema import decimal_column
+from vbd_indexer.sinks.event_sink import EventSink
+
+# wallets are bucketed by their action count: 1, 2-5, 6-10, more than 10
+WALLET_BUCKETS = (
+    "wallets_one_action",
+    "wallets_1_to_5_actions",
+    "wallets_5_to_10_actions",
+    "wallets_greater_than_10_actions",
+)
+_WALLET_BUCKET_BOUNDS = (1, 5, 10)
+
+# columns of the reward records used by the aggregate, with the impact_<name> columns
+_TABLE_COLUMNS = {"app_name", "receiver_address", "amount"}
+_IMPACT_PREFIX = "impact_"
+
+AGGREGATE_FORMAT_VERSION = 3
+
+# enough digits to scale any decimal128 value without rounding
+_EXACT = Context(prec=80)
+# decimal256 holds at most 76 digits
+_SUM_PRECISION = 76
+_QUANTUMS = {
+    scale: Decimal(1).scaleb(-scale) for scale in (B3TR_AMOUNT_SCALE, B3TR_IMPACT_SCALE)
+}
+
+
+def _scaled(value: Decimal, scale: int) -> int:
+    """
+    Returns the value as an integer count of 10**-scale, rounded half up like
+    the parquet output, so totals match whichever way the events are read
+    """
+    value = value.quantize(_QUANTUMS[scale], rounding=ROUND_HALF_UP, context=_EXACT)
+    return int(value.scaleb(scale, context=_EXACT))
+
+
+def _unscaled(total: int, scale: int) -> Decimal:
+    return Decimal(total).scaleb(-scale, context=_EXACT)
+
+
+def _summable(values: pa.ChunkedArray) -> pa.ChunkedArray:
+    """
+    decimal128 values as decimal256, arrow sums a decimal128 column as decimal128
+    and wraps around past 38 digits
+    """
+    return values.cast(pa.decimal256(_SUM_PRECISION, values.type.scale))
+
+
+@dataclass
+class AppRewardAggregate:
+    """
+    Running totals of the reward events of one app
+    Totals are exact integers: rewards in 10**-B3TR_AMOUNT_SCALE B3TR and
+    impacts in 10**-B3TR_IMPACT_SCALE units
+    """
+
+    actions_total: int = 0
+    rewards_total: int = 0
+    # by impact name, only the impacts named by the events
+    impact_totals: Dict[str, int] = field(default_factory=dict)
+    # action count per receiver wallet
+    wallet_actions: Dict[str, int] = field(default_factory=dict)
+
+    def merge(self, other: "AppRewardAggregate") -> None:
+        self.actions_total += other.actions_total
+        self.rewards_total += other.rewards_total
+        impact_totals = self.impact_totals
+        for name, total in other.impact_totals.items():
+            impact_totals[name] = impact_totals.get(name, 0) + total
+        wallet_actions = self.wallet_actions
+        for wallet, count in other.wallet_actions.items():
+            wallet_actions[wallet] = wallet_actions.get(wallet, 0) + count
+
+    def wallet_bucket_counts(self) -> List[int]:
+        counts = [0] * len(WALLET_BUCKETS)
+        for count in self.wallet_actions.values():
+            counts[bisect_left(_WALLET_BUCKET_BOUNDS, count)] += 1
+        return counts
+
+
+class RewardAggregate:
+    """
+    Per-app summary state of a set of reward events, updated as events arrive
+    Aggregates of different tasks, rounds or processes merge into the aggregate
+    of all their events, so a summary never needs to re-read the events.
+    """
+
+    def __init__(self) -> None:
+        self.apps: Dict[str, AppRewardAggregate] = {}
+
+    def add_events(self, events: Iterable[B3TRRewardEvent]) -> None:
+        apps = self.apps
+        for event in events:
+            app = apps.get(event.app_name)
+            if app is None:
+                app = apps[event.app_name] = AppRewardAggregate()
+            app.actions_total += 1
+            app.rewards_total += _scaled(event.amount, B3TR_AMOUNT_SCALE)
+            impact_totals = app.impact_totals
+            for name, value in event.impact:
+                impact_totals[name] = impact_totals.get(name, 0) + _scaled(
+                    value, B3TR_IMPACT_SCALE
+                )
+            wallet_actions = app.wallet_actions
+            wallet_actions[event.receiver_address] = (
+                wallet_actions.get(event.receiver_address, 0) + 1
+            )
+
+    def add_frame(self, df: pd.DataFrame) -> None:
+        """
+        Adds the reward events of a loaded rewards data frame
+        """
+        columns = [
+            c for c in df.columns if c in _TABLE_COLUMNS or c.startswith(_IMPACT_PREFIX)
+        ]
+        self.add_table(pa.Table.from_pandas(df[columns], preserve_index=False))
+
+    def add_table(self, table: pa.Table) -> None:
+        """
+        Adds the reward events of an arrow table of reward records
+        Totals are summed by arrow as decimal256, which a sum of decimal128
+        values cannot overflow, then added exactly
+        """
+        columns: Dict[str, Any] = {
+            "app_name": table.column("app_name").cast(pa.string()),
+            "receiver_address": table.column("receiver_address").cast(pa.string()),
+            "amount": _summable(
+                decimal_column(table.column("amount"), B3TR_AMOUNT_SCALE)
+            ),
+        }
+        impact_cols = [c for c in table.column_names if c.startswith(_IMPACT_PREFIX)]
+        for col in impact_cols:
+            columns[col] = _summable(
+                decimal_column(table.column(col), B3TR_IMPACT_SCALE)
+            )
+        # events without an app name are not summarized
+        table = pa.table(columns).filter(pc.is_valid(columns["app_name"]))
+
+        app_totals = table.group_by("app_name").aggregate(
+            [("amount", "count"), ("amount", "sum")]
+            + [(col, "sum") for col in impact_cols]
+        )
+        other = RewardAggregate()
+        for row in app_totals.to_pylist():
+            other.apps[row["app_name"]] = AppRewardAggregate(
+                actions_total=row["amount_count"],
+                rewards_total=_scaled(row["amount_sum"], B3TR_AMOUNT_SCALE),
+                impact_totals={
+                    col.removeprefix(_IMPACT_PREFIX): _scaled(
+                        row[f"{col}_sum"], B3TR_IMPACT_SCALE
+                    )
+                    for col in impact_cols
+                },
+            )
+        wallet_counts = table.group_by(["app_name", "receiver_address"]).aggregate(
+            [("receiver_address", "count")]
+        )
+        for app_name, wallet, count in zip(
+            wallet_counts.column("app_name").to_pylist(),
+            wallet_counts.column("receiver_address").to_pylist(),
+            wallet_counts.column("receiver_address_count").to_pylist(),
+        ):
+            other.apps[app_name].wallet_actions[wallet] = count
+        if self.apps:
+            self.merge(other)
+        else:
+            self.apps = other.apps
+
+    def merge(self, other: "RewardAggregate") -> None:
+        for app_name, other_app in other.apps.items():
+            app = self.apps.get(app_name)
+            if app is None:
+                app = self.apps[app_name] = AppRewardAggregate()
+            app.merge(other_app)
+
+    def impact_names(self) -> List[str]:
+        """
+        B3TR_IMPACT_NAMES, then the other impacts named by the events, by name
+        """
+        names = {name for app in self.apps.values() for name in app.impact_totals}
+        return list(B3TR_IMPACT_NAMES) + sorted(names.difference(B3TR_IMPACT_NAMES))
+
+    def summary(self, impact_names: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Per-app summary, one row per app sorted by app name
+        impact_names are the impacts with a total column, impact_names() by default
+        """
+        if impact_names is None:
+            impact_names = self.impact_names()
+        columns = (
+            ["app_name", "actions_total", "wallets_unique", "rewards_total"]
+            + [f"{name}_total" for name in impact_names]
+            + list(WALLET_BUCKETS)
+        )
+        rows = []
+        for app_name in sorted(self.apps):
+            app = self.apps[app_name]
+            rows.append(
+                [
+                    app_name,
+                    app.actions_total,
+                    len(app.wallet_actions),
+                    _unscaled(app.rewards_total, B3TR_AMOUNT_SCALE),
+                ]
+                + [
+                    float(_unscaled(app.impact_totals.get(name, 0), B3TR_IMPACT_SCALE))
+                    for name in impact_names
+                ]
+                + app.wallet_bucket_counts()
+            )
+        return pd.DataFrame(rows, columns=columns)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "apps": {
+                app_name: {
+                    "actions_total": app.actions_total,
+                    "rewards_total": app.rewards_total,
+                    "impact_totals": app.impact_totals,
+                    "wallet_actions": app.wallet_actions,
+                }
+                for app_name, app in self.apps.items()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, saved: Dict[str, Any]) -> "RewardAggregate":
+        aggregate = cls()
+        for app_name, app in saved["apps"].items():
+            aggregate.apps[app_name] = AppRewardAggregate(
+                actions_total=app["actions_total"],
+                rewards_total=app["rewards_total"],
+                impact_totals=app["impact_totals"],
+                wallet_actions=app["wallet_actions"],
+            )
+        return aggregate
+
+
+class RewardAggregateSink(EventSink):
+    """
+    Updates one RewardAggregate per round with the reward events written to it
+    Combined with the file sinks by a TeeEventSink, the aggregates of an
+    extract are ready when its files are, without reading them back.
+    """
+
+    def __init__(self, round_numbers: Sequence[int] = ()) -> None:
+        self.aggregates: Dict[int, RewardAggregate] = {
+            round_number: RewardAggregate() for round_number in round_numbers
+        }
+
+    def write(self, events: Sequence[B3TRRewardEvent]) -> None:
+        batches: Dict[int, List[B3TRRewardEvent]] = {}
+        for event in events:
+            batches.setdefault(event.round_number, []).append(event)
+        for round_number, batch in batches.items():
+            aggregate = self.aggregates.get(round_number)
+            if aggregate is None:
+                aggregate = self.aggregates[round_number] = RewardAggregate()
+            aggregate.add_events(batch)
+
+    def close(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        self.aggregates.clear()
+
+
+# -----------------------------
+# Round aggregate files
+# -----------------------------
+
+
+def round_aggregate_file_name(round_id: int) -> str:
+    return f"rewards-aggregate-round-{round_id}.json"
+
+
+def save_round_aggregate(
+    round_id: int, aggregate: RewardAggregate, source_file: str
+) -> None:
+    """
+    Saves the aggregate of a round next to its events file
+    The size of the events file is recorded, the aggregate is only used while
+    the file is unchanged
+    """
+    saved = {
+        "version": AGGREGATE_FORMAT_VERSION,
+        "source_file": source_file,
+        "source_size": os.path.getsize(source_file),
+        **aggregate.to_json(),
+    }
+    file_name = round_aggregate_file_name(round_id)
+    tmp_file_name = f"{file_name}.tmp"
+    with open(tmp_file_name, "w") as f:
+        json.dump(saved, f)
+    os.replace(tmp_file_name, file_name)
+
+
+def load_round_aggregate(round_id: int) -> Optional[RewardAggregate]:
+    """
+    Loads the saved aggregate of a round
+    Returns None if there is none, or its events file changed since it was saved
+    """
+    file_name = round_aggregate_file_name(round_id)
+    if not os.path.exists(file_name):
+        return None
+    with open(file_name) as f:
+        saved = json.load(f)
+    if saved.get("version") != AGGREGATE_FORMAT_VERSION:
+        return None
+    source_file = saved["source_file"]
+    if (
+        not os.path.exists(source_file)
+        or os.path.getsize(source_file) != saved["source_size"]
+    ):
+        return None
+    return RewardAggregate.from_json(saved)
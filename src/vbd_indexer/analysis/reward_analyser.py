@@ -1,107 +1,231 @@
-from decimal import Decimal
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
 from loguru import logger
 
-from vbd_indexer.b3tr.b3tr_impact_names import B3TR_IMPACT_NAMES
+from vbd_indexer.analysis.reward_aggregate import (
+    RewardAggregate,
+    load_round_aggregate,
+    save_round_aggregate,
+)
+from vbd_indexer.analysis.wallet_sketches import (
+    WalletSketches,
+    load_round_wallet_sketches,
+    save_round_wallet_sketches,
+)
+from vbd_indexer.b3tr.b3tr_schemas import B3TR_AMOUNT_SCALE, B3TR_IMPACT_SCALE
+from vbd_indexer.sinks.arrow_schema import decimal_column
 
+# formats extract writes round files in, the first one found is read
+_ROUND_FILE_FORMATS = ("parquet", "jsonl", "csv")
+# columns read as strings, amounts and impacts are then parsed as exact decimals
+_STRING_COLUMNS = ["app_id", "app_name", "receiver_address", "amount"]
 
-def _load_rewards_csv(round_id: int) -> pd.DataFrame:
+
+def _rewards_file_name(round_id: int) -> str:
     """
-    Loads rewards data csv file for specified round
+    Returns the rewards data file of the round, in the format it was extracted in
     """
-    file_name = f"rewards-events-round-{round_id}.csv"
-    df = pd.read_csv(
-        file_name,
-        dtype={
-            "block_number": "int64",
-            "app_id": "string",
-            "app_name": "string",
-            "receiver_address": "string",
-        },
+    for output_format in _ROUND_FILE_FORMATS:
+        file_name = f"rewards-events-round-{round_id}.{output_format}"
+        if os.path.exists(file_name):
+            return file_name
+    raise FileNotFoundError(
+        f"No rewards data file for round {round_id}, run extract first"
     )
-    # apply types to columns
-    df["amount"] = df["amount"].apply(Decimal)
-    df["timestamp"] = df["timestamp"].apply(pd.to_numeric, errors="coerce")
-    impact_cols = [c for c in df.columns if c.startswith("impact_")]
-    df[impact_cols] = df[impact_cols].apply(pd.to_numeric, errors="coerce").fillna(0)
-    return df
 
 
-def _analyse_rewards(df: pd.DataFrame) -> pd.DataFrame:
+def _load_rewards_table(round_id: int) -> pa.Table:
+    """
+    Loads rewards data for the round as an arrow table, from parquet if extracted
+    in that format. Amounts and impacts are exact decimal128 columns, csv and jsonl
+    values are parsed into them (no floats or python objects)
+    """
+    file_name = _rewards_file_name(round_id)
+    if file_name.endswith(".parquet"):
+        table = pq.read_table(file_name)
+    elif file_name.endswith(".jsonl"):
+        # decimals are written as strings, impact columns are inferred as such
+        table = pa_json.read_json(
+            file_name,
+            parse_options=pa_json.ParseOptions(
+                explicit_schema=pa.schema(
+                    [(name, pa.string()) for name in _STRING_COLUMNS]
+                ),
+                unexpected_field_behavior="infer",
+            ),
+        )
+    else:
+        # impact columns are those of the file, rounds may name new impacts
+        with open(file_name, newline="") as f:
+            header = next(csv.reader(f), [])
+        string_columns = _STRING_COLUMNS + [
+            name for name in header if name.startswith("impact_")
+        ]
+        table = pa_csv.read_csv(
+            file_name,
+            convert_options=pa_csv.ConvertOptions(
+                column_types={name: pa.string() for name in string_columns},
+                strings_can_be_null=True,
+            ),
+        )
+    for i, name in enumerate(table.column_names):
+        if name == "amount":
+            scale = B3TR_AMOUNT_SCALE
+        elif name.startswith("impact_"):
+            scale = B3TR_IMPACT_SCALE
+        else:
+            continue
+        table = table.set_column(i, name, decimal_column(table.column(i), scale))
+    return table
+
+
+def _load_rewards(round_id: int) -> pd.DataFrame:
+    """
+    Loads rewards data for the round, columns keep their arrow types
+    """
+    return _load_rewards_table(round_id).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _analyse_rewards(df: pd.DataFrame, approx_wallets: bool = False) -> pd.DataFrame:
     """
     Runs analysis on the list of rewards and returns a per-app summary.
+    approx_wallets adds HyperLogLog estimates of the unique wallets
     """
-    # build impact aggregations
-    impact_aggs = {
-        f"{name}_total": (f"impact_{name}", "sum") for name in B3TR_IMPACT_NAMES
-    }
-
-    # per-app summary
-    summary_df = df.groupby("app_name", as_index=False).agg(
-        actions_total=("app_name", "size"),
-        wallets_unique=("receiver_address", "nunique"),
-        rewards_total=("amount", "sum"),
-        **impact_aggs,
-    )
+    aggregate = RewardAggregate()
+    aggregate.add_frame(df)
+    summary_df = aggregate.summary()
+    if approx_wallets:
+        _add_wallet_estimates(summary_df, WalletSketches.from_aggregate(aggregate))
+    return summary_df
 
-    # wallet action counts per app
-    wallet_counts = pd.DataFrame(
-        df.groupby(["app_name", "receiver_address"], as_index=False).agg(
-            action_count=("receiver_address", "size")
-        )
-    )
 
-    # bucket wallets by their action_count
-    wallet_counts["bucket"] = pd.cut(
-        wallet_counts["action_count"],
-        bins=[0, 1, 5, 10, float("inf")],
-        labels=[
-            "wallets_one_action",
-            "wallets_1_to_5_actions",
-            "wallets_5_to_10_actions",
-            "wallets_greater_than_10_actions",
-        ],
-        right=True,
-        include_lowest=True,
+def _add_wallet_estimates(summary_df: pd.DataFrame, sketches: WalletSketches) -> None:
+    """
+    Adds the wallets_unique_approx column, after wallets_unique
+    """
+    summary_df.insert(
+        summary_df.columns.get_loc("wallets_unique") + 1,
+        "wallets_unique_approx",
+        [sketches.apps[app_name].count() for app_name in summary_df["app_name"]],
     )
 
-    # count wallets per bucket per app, pivot to columns
-    bucket_df = (
-        wallet_counts.groupby(["app_name", "bucket"])
-        .size()
-        .unstack(fill_value=0)
-        .reset_index()
-    )
 
-    # ensure consistent columns always exist
-    expected = [
-        "wallets_one_action",
-        "wallets_1_to_5_actions",
-        "wallets_5_to_10_actions",
-        "wallets_greater_than_10_actions",
-    ]
-    for col in expected:
-        if col not in bucket_df.columns:
-            bucket_df[col] = 0
+def get_round_aggregate(round_id: int) -> RewardAggregate:
+    """
+    Returns the aggregate of the reward events of a round
+    The aggregate saved by extract/follow is used while the round file is unchanged,
+    otherwise it is rebuilt from the round file once and saved
+    """
+    aggregate = load_round_aggregate(round_id)
+    if aggregate is not None:
+        return aggregate
+    logger.info(f"No up to date aggregate for round {round_id}, reading round file")
+    aggregate = RewardAggregate()
+    aggregate.add_table(_load_rewards_table(round_id))
+    save_round_aggregate(round_id, aggregate, _rewards_file_name(round_id))
+    return aggregate
 
-    bucket_df = bucket_df[["app_name"] + expected]
 
-    # merge buckets into main summary
-    out = summary_df.merge(bucket_df, on="app_name", how="left")
-    return out
+def get_round_wallet_sketches(
+    round_id: int, aggregate: RewardAggregate
+) -> WalletSketches:
+    """
+    Returns the wallet sketches of a round
+    The sketches saved by an earlier run are used while the round file is unchanged,
+    otherwise they are built from the aggregate of the round once and saved
+    """
+    sketches = load_round_wallet_sketches(round_id)
+    if sketches is not None:
+        return sketches
+    sketches = WalletSketches.from_aggregate(aggregate)
+    save_round_wallet_sketches(round_id, sketches, _rewards_file_name(round_id))
+    return sketches
 
 
-def get_rewards_summary(round_id: int) -> pd.DataFrame:
+def get_rewards_summary(round_id: int, approx_wallets: bool = False) -> pd.DataFrame:
     """
     Runs the analysis on the list of reward events for a round
-    Saves the analysis to specified json file
+    Returns the per-app summary
+    approx_wallets adds HyperLogLog estimates of the unique wallets, the
+    sketches are saved next to the summary and reused to be merged across rounds
     """
     logger.info("Running rewards analysis")
     try:
-        df_csv = _load_rewards_csv(round_id)
-        df_analysis = _analyse_rewards(df_csv)
-        return df_analysis
+        aggregate = get_round_aggregate(round_id)
+        summary_df = aggregate.summary()
+        if approx_wallets:
+            _add_wallet_estimates(
+                summary_df, get_round_wallet_sketches(round_id, aggregate)
+            )
+        return summary_df
+    except Exception as e:
+        logger.error(f"Error in rewards analysis: {e}")
+        raise
+
+
+def _summarize_round(
+    round_id: int, approx_wallets: bool
+) -> Tuple[RewardAggregate, Optional[WalletSketches]]:
+    """
+    Gets the aggregate (and wallet sketches) of a round, run in a worker process
+    """
+    aggregate = get_round_aggregate(round_id)
+    if not approx_wallets:
+        return aggregate, None
+    return aggregate, get_round_wallet_sketches(round_id, aggregate)
+
+
+def get_rounds_summary(
+    round_ids: Sequence[int],
+    approx_wallets: bool = False,
+    processes: Optional[int] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Runs the analysis on the reward events of several rounds
+    Rounds are loaded and aggregated in a pool of processes (one per core by default)
+    Returns the per-app summary of every round, with a round_number column,
+    and the per-app summary over all the rounds
+    """
+    logger.info(f"Running rewards analysis of {len(round_ids)} rounds")
+    try:
+        if len(round_ids) == 1 or processes == 1:
+            results = [_summarize_round(r, approx_wallets) for r in round_ids]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                results = list(
+                    pool.map(
+                        _summarize_round, round_ids, [approx_wallets] * len(round_ids)
+                    )
+                )
+
+        total_aggregate = RewardAggregate()
+        for aggregate, _ in results:
+            total_aggregate.merge(aggregate)
+        # every round has the impact columns of all the rounds
+        impact_names = total_aggregate.impact_names()
+
+        round_dfs: List[pd.DataFrame] = []
+        total_sketches = WalletSketches() if approx_wallets else None
+        for round_id, (aggregate, sketches) in zip(round_ids, results):
+            round_df = aggregate.summary(impact_names)
+            if sketches is not None:
+                _add_wallet_estimates(round_df, sketches)
+                total_sketches.merge(sketches)
+            round_df.insert(0, "round_number", round_id)
+            round_dfs.append(round_df)
+
+        totals_df = total_aggregate.summary()
+        if total_sketches is not None:
+            _add_wallet_estimates(totals_df, total_sketches)
+        return pd.concat(round_dfs, ignore_index=True), totals_df
     except Exception as e:
         logger.error(f"Error in rewards analysis: {e}")
         raise
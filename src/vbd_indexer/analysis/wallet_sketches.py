@@ -0,0 +1,118 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from vbd_indexer.analysis.reward_aggregate import RewardAggregate
+from vbd_indexer.utils.hyperloglog import DEFAULT_PRECISION, HyperLogLog
+
+# bumped when the saved sketches change, older files are rebuilt
+SKETCHES_FORMAT_VERSION = 1
+
+
+@dataclass
+class WalletSketches:
+    """
+    HyperLogLog sketches of the receiver wallets of each app and of all apps
+    Sketches of rounds merge into estimates of the unique wallets over all
+    those rounds, without keeping the wallets.
+    """
+
+    precision: int = DEFAULT_PRECISION
+    apps: Dict[str, HyperLogLog] = field(default_factory=dict)
+    all_apps: HyperLogLog | None = None
+
+    def __post_init__(self) -> None:
+        if self.all_apps is None:
+            self.all_apps = HyperLogLog(self.precision)
+
+    @classmethod
+    def from_aggregate(
+        cls, aggregate: RewardAggregate, precision: int = DEFAULT_PRECISION
+    ) -> "WalletSketches":
+        sketches = cls(precision)
+        for app_name, app in aggregate.apps.items():
+            sketch = sketches.apps[app_name] = HyperLogLog(precision)
+            sketch.update(app.wallet_actions)
+            sketches.all_apps.merge(sketch)
+        return sketches
+
+    def merge(self, other: "WalletSketches") -> None:
+        for app_name, other_sketch in other.apps.items():
+            sketch = self.apps.get(app_name)
+            if sketch is None:
+                sketch = self.apps[app_name] = HyperLogLog(self.precision)
+            sketch.merge(other_sketch)
+        self.all_apps.merge(other.all_apps)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "precision": self.precision,
+            "apps": {name: sketch.to_str() for name, sketch in self.apps.items()},
+            "all_apps": self.all_apps.to_str(),
+        }
+
+    @classmethod
+    def from_json(cls, saved: Dict[str, Any]) -> "WalletSketches":
+        return cls(
+            precision=saved["precision"],
+            apps={name: HyperLogLog.from_str(s) for name, s in saved["apps"].items()},
+            all_apps=HyperLogLog.from_str(saved["all_apps"]),
+        )
+
+
+# -----------------------------
+# Round sketch files
+# -----------------------------
+
+
+def wallet_sketches_file_name(round_id: int) -> str:
+    return f"reward-events-wallet-sketches-round-{round_id}.json"
+
+
+def save_round_wallet_sketches(
+    round_id: int, sketches: WalletSketches, source_file: str
+) -> None:
+    """
+    Saves the wallet sketches of a round next to its events file
+    The size of the events file is recorded, the sketches are only used while
+    the file is unchanged
+    """
+    saved = {
+        "version": SKETCHES_FORMAT_VERSION,
+        "source_file": source_file,
+        "source_size": os.path.getsize(source_file),
+        **sketches.to_json(),
+    }
+    file_name = wallet_sketches_file_name(round_id)
+    tmp_file_name = f"{file_name}.tmp"
+    with open(tmp_file_name, "w") as f:
+        json.dump(saved, f)
+    os.replace(tmp_file_name, file_name)
+
+
+def load_round_wallet_sketches(
+    round_id: int, precision: int = DEFAULT_PRECISION
+) -> Optional[WalletSketches]:
+    """
+    Loads the saved wallet sketches of a round
+    Returns None if there are none, they have another precision, or the events
+    file changed since they were saved
+    """
+    file_name = wallet_sketches_file_name(round_id)
+    if not os.path.exists(file_name):
+        return None
+    with open(file_name) as f:
+        saved = json.load(f)
+    if (
+        saved.get("version") != SKETCHES_FORMAT_VERSION
+        or saved["precision"] != precision
+    ):
+        return None
+    source_file = saved["source_file"]
+    if (
+        not os.path.exists(source_file)
+        or os.path.getsize(source_file) != saved["source_size"]
+    ):
+        return None
+    return WalletSketches.from_json(saved)
@@ -1,13 +1,59 @@
+import os
+import sys
+import time
+from operator import attrgetter
+from typing import Dict, List, Optional, Sequence, Union
+
 import fire
 from loguru import logger
 
-from vbd_indexer.analysis.reward_analyser import get_rewards_summary
-from vbd_indexer.b3tr.b3tr_apps import warm_app_name_cache
+from vbd_indexer.analysis.reward_aggregate import (
+    RewardAggregateSink,
+    load_round_aggregate,
+    save_round_aggregate,
+)
+from vbd_indexer.analysis.reward_analyser import get_rewards_summary, get_rounds_summary
+from vbd_indexer.b3tr.b3tr_apps import (
+    export_app_name_cache,
+    load_app_name_cache,
+    warm_app_name_cache,
+    warm_round_cache,
+)
 from vbd_indexer.b3tr.b3tr_events_defs import B3TR_REWARD_DEFINITION
 from vbd_indexer.b3tr.b3tr_models import B3TRRewardDecodedEvent, B3TRRewardEvent
-from vbd_indexer.config.app_config import THOR_ENDPOINTS
+from vbd_indexer.b3tr.b3tr_round import (
+    get_block_range_for_round,
+    get_current_round,
+    get_rounds_for_block_range,
+)
+from vbd_indexer.b3tr.b3tr_schemas import (
+    B3TR_REWARD_ARROW_SCHEMA,
+    B3TR_REWARD_EXTRA_COLUMN_TYPES,
+)
+from vbd_indexer.config.app_config import (
+    CHECKPOINT_DIR,
+    DEFAULT_THOR_ENDPOINT,
+    FOLLOW_STATE_PATH,
+    RAW_EVENT_CACHE_PATH,
+    THOR_ENDPOINTS,
+)
 from vbd_indexer.indexer.event_indexer import EventIndexer
+from vbd_indexer.indexer.follow_state import FollowState
+from vbd_indexer.indexer.indexer_checkpoint import IndexerCheckpoint
+from vbd_indexer.indexer.indexer_metrics import write_metrics_file
 from vbd_indexer.indexer.indexer_options import IndexerOptions
+from vbd_indexer.indexer.indexer_status import IndexerStatus
+from vbd_indexer.sinks.csv_event_sink import CsvEventSink
+from vbd_indexer.sinks.event_sink import EventSink, FileEventSink
+from vbd_indexer.sinks.jsonl_event_sink import JsonlEventSink
+from vbd_indexer.sinks.parquet_event_sink import ParquetEventSink
+from vbd_indexer.sinks.partitioned_event_sink import PartitionedEventSink
+from vbd_indexer.sinks.tee_event_sink import TeeEventSink
+from vbd_indexer.thor.raw_event_cache import RawEventCache
+from vbd_indexer.thor.thor_client import ThorClient
+from vbd_indexer.thor.thor_client_options import ThorClientOptions
+from vbd_indexer.utils.block_ranges import BlockRange
+from vbd_indexer.utils.sampling_profiler import profiled
 
 # -----------------------------
 # Logo printer
@@ -29,16 +75,154 @@ def print_logo() -> None:
 # EXTRACT ROUND DATA
 # -----------------------------
 
+OUTPUT_FORMATS = ("csv", "parquet", "jsonl")
+
+# how often extract refreshes its progress line and metrics file
+PROGRESS_SECS = 2.0
+
+
+def _create_file_sink(
+    file_stem: str, output_format: str, append: bool = False
+) -> FileEventSink:
+    """
+    Creates a file sink that extracted reward events are streamed to
+    """
+    file_name = f"{file_stem}.{output_format}"
+    if output_format == "parquet":
+        if append:
+            raise ValueError("Parquet files cannot be appended to")
+        return ParquetEventSink(
+            file_name,
+            B3TR_REWARD_ARROW_SCHEMA,
+            extra_column_types=B3TR_REWARD_EXTRA_COLUMN_TYPES,
+        )
+    if output_format == "jsonl":
+        return JsonlEventSink(file_name, append)
+    return CsvEventSink(file_name, append)
+
+
+def _create_rewards_sink(
+    job_name: str, round_numbers: Optional[List[int]], output_format: str
+) -> EventSink:
+    """
+    Creates the sink for an extract: one file per round when extracting rounds,
+    otherwise a single file named after the job
+    """
+    if round_numbers is None:
+        return _create_file_sink(job_name, output_format)
+    return PartitionedEventSink(
+        partition_of=attrgetter("round_number"),
+        sink_factory=lambda round_number: _create_file_sink(
+            f"rewards-events-round-{round_number}", output_format
+        ),
+        partitions=round_numbers,
+    )
+
+
+def _sink_file_names(event_sink: EventSink) -> List[str]:
+    if isinstance(event_sink, PartitionedEventSink):
+        return [
+            name
+            for sink in event_sink.sinks.values()
+            for name in _sink_file_names(sink)
+        ]
+    if isinstance(event_sink, TeeEventSink):
+        return [name for sink in event_sink.sinks for name in _sink_file_names(sink)]
+    if isinstance(event_sink, FileEventSink):
+        return [event_sink.filename]
+    return []
+
+
+def _parse_rounds(rounds: Union[int, str, Sequence[int]]) -> List[int]:
+    """
+    Parses --rounds: a round, a first-last range, or a comma separated list of both
+    """
+    if isinstance(rounds, int):
+        parts = [str(rounds)]
+    elif isinstance(rounds, str):
+        parts = rounds.split(",")
+    else:
+        parts = [str(r) for r in rounds]
+    round_numbers = set()
+    for part in parts:
+        first, _, last = part.strip().partition("-")
+        try:
+            first_round = int(first)
+            last_round = int(last) if last else first_round
+        except ValueError:
+            raise ValueError(f"Invalid rounds: {rounds}") from None
+        if first_round < 1 or last_round < first_round:
+            raise ValueError(f"Invalid rounds: {rounds}")
+        round_numbers.update(range(first_round, last_round + 1))
+    return sorted(round_numbers)
+
 
-def _extract_rewards(round_id: int) -> None:
+def _extract_rewards(
+    job_name: str,
+    round_ranges: Dict[int, BlockRange],
+    block_ranges: List[BlockRange],
+    partition_by_round: bool,
+    use_cache: bool,
+    resume: bool,
+    output_format: str,
+    decode_processes: int,
+    metrics_file: Optional[str] = None,
+) -> None:
     """
     Extracts sustainability action rewards data
+    All block ranges are indexed by a single indexer run
+    The app name cache must be warmed for the rounds, decode processes get a copy of it
+    Round files get a summary aggregate, built from the events as they are written
+    """
+    logger.info(f"Extracting rewards actions data: {job_name}")
+    raw_event_cache = RawEventCache(RAW_EVENT_CACHE_PATH) if use_cache else None
+    checkpoint = IndexerCheckpoint(os.path.join(CHECKPOINT_DIR, f"{job_name}.journal"))
+    try:
+        # events are streamed to the output files as tasks complete
+        round_numbers = sorted(round_ranges) if partition_by_round else None
+        event_sink = _create_rewards_sink(job_name, round_numbers, output_format)
+        aggregate_sink = None
+        if round_numbers is not None:
+            aggregate_sink = RewardAggregateSink(round_numbers)
+            event_sink = TeeEventSink([event_sink, aggregate_sink])
+        completed = _run_rewards_indexer(
+            block_ranges,
+            raw_event_cache,
+            checkpoint,
+            resume,
+            event_sink,
+            decode_processes,
+            metrics_file,
+        )
+        if completed and aggregate_sink is not None:
+            for round_number, aggregate in aggregate_sink.aggregates.items():
+                save_round_aggregate(
+                    round_number,
+                    aggregate,
+                    f"rewards-events-round-{round_number}.{output_format}",
+                )
+    finally:
+        checkpoint.close()
+        if raw_event_cache is not None:
+            raw_event_cache.close()
+
+
+def _run_rewards_indexer(
+    block_ranges: List[BlockRange],
+    raw_event_cache: RawEventCache | None,
+    checkpoint: IndexerCheckpoint,
+    resume: bool,
+    event_sink: EventSink,
+    decode_processes: int,
+    metrics_file: Optional[str] = None,
+) -> bool:
+    """
+    Runs the rewards indexer into the sink, returns True if all blocks were indexed
     """
-    logger.info(f"Extracting rewards actions data for round: {round_id}")
     # create indexer options
     b3tr_reward_def = B3TR_REWARD_DEFINITION
     options = IndexerOptions[B3TRRewardDecodedEvent, B3TRRewardEvent](
-        round_number=round_id,
+        block_ranges=block_ranges,
         contract_address=b3tr_reward_def.contract_address,
         topic0=b3tr_reward_def.topic0,
         thor_endpoints=THOR_ENDPOINTS,
@@ -47,31 +231,157 @@ def _extract_rewards(round_id: int) -> None:
         max_events_per_thor_request=1000,
         event_decoder=b3tr_reward_def.event_decoder,
         event_transformer=b3tr_reward_def.event_transformer,
+        batch_event_decoder=b3tr_reward_def.batch_event_decoder,
+        async_mode=True,
+        max_requests_in_flight_per_endpoint=4,
+        split_full_pages=True,
+        raw_event_cache=raw_event_cache,
+        checkpoint=checkpoint,
+        resume_from_checkpoint=resume,
+        probe_endpoints=True,
+        event_sink=event_sink,
+        decode_processes=decode_processes,
+        decode_process_initializer=load_app_name_cache,
+        decode_process_initargs=export_app_name_cache(),
     )
-    # pre-warm the app name cache
-    warm_app_name_cache(round_id)
     # create event indexer
     idx = EventIndexer(options)
     idx.start()
-    final_status = idx.wait()  # blocks until done (or failed/stopped)
+    final_status = _wait_with_progress(idx, metrics_file)
     logger.info(f"Final status: {final_status}")
     completed, total = idx.progress()
     logger.info(f"Progress: {completed}/{total}")
-    logger.info(f"Results count: {len(idx.results())}")
+    logger.info(f"Results count: {idx.result_count}")
     if not idx.error:
-        idx.write_to_csv_file(f"rewards-events-round-{round_id}.csv")
-    else:
-        logger.warning("Indexer encountered error, no csv file will be written")
+        for file_name in _sink_file_names(event_sink):
+            logger.info(f"Events written to {file_name}")
+        checkpoint.discard()
+        return True
+    logger.warning("Indexer encountered error, no output file will be written")
+    logger.warning(f"Completed tasks are kept in {checkpoint.path}, use --resume")
+    return False
 
 
-def extract(round_id: int) -> None:
+def _wait_with_progress(
+    idx: EventIndexer, metrics_file: Optional[str]
+) -> IndexerStatus:
+    """
+    Waits for the indexer, showing a progress line and refreshing the metrics file
+    The line is redrawn in place on a terminal, logged otherwise
+    """
+    interactive = sys.stderr.isatty()
+    while True:
+        status = idx.wait(timeout=PROGRESS_SECS)
+        metrics = idx.metrics()
+        if metrics_file is not None:
+            write_metrics_file(metrics, metrics_file)
+        if status != IndexerStatus.RUNNING:
+            break
+        if interactive:
+            print(
+                f"\r{metrics.progress_line()}\033[K",
+                end="",
+                file=sys.stderr,
+                flush=True,
+            )
+        else:
+            logger.info(metrics.progress_line())
+    if interactive:
+        print(file=sys.stderr)
+    logger.info(metrics.progress_line())
+    for endpoint in metrics.endpoints:
+        logger.info(
+            f"Endpoint {endpoint.endpoint}: {endpoint.requests} requests, "
+            f"{endpoint.pages} pages, {endpoint.bytes_received / 1e6:.1f} MB, "
+            f"{endpoint.errors} errors, {endpoint.retries} retries"
+        )
+    stages = ", ".join(
+        f"{stage} {secs:.1f}s" for stage, secs in metrics.stage_secs.items()
+    )
+    logger.info(f"Stage time: {stages}")
+    if metrics_file is not None:
+        logger.info(f"Metrics written to {metrics_file}")
+    return status
+
+
+def extract(
+    round_id: Optional[int] = None,
+    rounds: Union[int, str, Sequence[int], None] = None,
+    from_block: Optional[int] = None,
+    to_block: Optional[int] = None,
+    use_cache: bool = True,
+    resume: bool = False,
+    output_format: str = "csv",
+    decode_processes: int = 0,
+    metrics_file: Optional[str] = None,
+    profile: bool = False,
+) -> None:
     """
     Entry point for extract CLI command
+    Extracts one round, --rounds (e.g. 1-60 or 3,5,7-9) with one output file per round,
+    or --from_block/--to_block into a single file, in one indexer run
+    Finalized raw events are cached locally, --nouse_cache always fetches from thor
+    --resume continues a failed extract, fetching only the unfinished block ranges
+    --output_format is one of csv, parquet (typed columns) or jsonl
+    --decode_processes decodes events on that many cores, 0 decodes in the fetch workers
+    --metrics_file keeps the run metrics in a file, prometheus text for .prom,
+    json otherwise
+    --profile samples the run and writes a per stage profile report next to the output
+    (decoding runs in the fetch workers so it is sampled too)
     """
-    if round_id < 1:
+    block_mode = from_block is not None or to_block is not None
+    if [round_id is not None, rounds is not None, block_mode].count(True) != 1:
+        logger.error("Give one of round_id, --rounds or --from_block/--to_block")
+        raise ValueError("Give one of round_id, --rounds or --from_block/--to_block")
+    if round_id is not None and round_id < 1:
         logger.error("round_id has to be >= 1")
         raise ValueError("round_id has to be >= 1")
-    _extract_rewards(round_id)
+    if block_mode and (from_block is None or to_block is None or from_block > to_block):
+        logger.error(
+            "--from_block and --to_block are both needed, from_block <= to_block"
+        )
+        raise ValueError(
+            "--from_block and --to_block are both needed, from_block <= to_block"
+        )
+    if output_format not in OUTPUT_FORMATS:
+        logger.error(f"output_format has to be one of {OUTPUT_FORMATS}")
+        raise ValueError(f"output_format has to be one of {OUTPUT_FORMATS}")
+    if decode_processes < 0:
+        logger.error("decode_processes has to be >= 0")
+        raise ValueError("decode_processes has to be >= 0")
+    if profile and decode_processes > 0:
+        logger.warning(
+            "Decode processes are not sampled, decoding in the fetch workers"
+        )
+        decode_processes = 0
+
+    if block_mode:
+        # rounds are only needed to name the apps
+        job_name = f"rewards-events-blocks-{from_block}-{to_block}"
+        round_ranges = get_rounds_for_block_range(from_block, to_block)
+        warm_app_name_cache(round_ranges)
+        block_ranges = [(from_block, to_block)]
+    else:
+        round_numbers = [round_id] if round_id is not None else _parse_rounds(rounds)
+        if len(round_numbers) == 1:
+            job_name = f"rewards-events-round-{round_numbers[0]}"
+        else:
+            job_name = f"rewards-events-rounds-{round_numbers[0]}-{round_numbers[-1]}"
+        # round boundaries and app names in one round trip
+        round_ranges = warm_round_cache(round_numbers)
+        block_ranges = list(round_ranges.values())
+    with profiled(f"{job_name}-profile", enabled=profile):
+        _extract_rewards(
+            job_name,
+            round_ranges,
+            block_ranges,
+            not block_mode,
+            use_cache,
+            resume,
+            output_format,
+            decode_processes,
+            metrics_file,
+        )
 
 
 # -----------------------------
@@ -79,24 +389,206 @@ def extract(round_id: int) -> None:
 # -----------------------------
 
 
-def _summarize_rewards(round_id: int) -> None:
+def _summarize_rewards(round_id: int, approx_wallets: bool = False) -> None:
     logger.info(f"Summarizing rewards data for round: {round_id}")
     # do the analysis
-    df_summary = get_rewards_summary(round_id)
+    df_summary = get_rewards_summary(round_id, approx_wallets)
     file_name = f"reward-events-summary-round-{round_id}.json"
     df_summary.to_json(file_name, orient="records", indent=2)
     logger.info(f"Analysis saved to file: {file_name}")
 
 
-def summarize(round_id: int) -> None:
+def _summarize_rounds(
+    round_ids: List[int], approx_wallets: bool, processes: Optional[int]
+) -> None:
+    first, last = round_ids[0], round_ids[-1]
+    logger.info(f"Summarizing rewards data for rounds: {first}-{last}")
+    df_rounds, df_totals = get_rounds_summary(round_ids, approx_wallets, processes)
+    for df_summary, file_name in (
+        (df_rounds, f"reward-events-summary-rounds-{first}-{last}.json"),
+        (df_totals, f"reward-events-summary-rounds-{first}-{last}-totals.json"),
+    ):
+        df_summary.to_json(file_name, orient="records", indent=2)
+        logger.info(f"Analysis saved to file: {file_name}")
+
+
+def summarize(
+    round_id: Optional[int] = None,
+    rounds: Union[int, str, Sequence[int], None] = None,
+    approx_wallets: bool = False,
+    processes: Optional[int] = None,
+    profile: bool = False,
+) -> None:
     """
-    Analyses extracted round data CSV file
+    Analyses extracted round data file (parquet if extracted as parquet, else CSV)
     Produces a json file of statistics
+    Uses the round aggregate saved by extract/follow, the round file is only read
+    (once) when the aggregate is missing or out of date
+    --rounds (e.g. 1-60 or 3,5,7-9) summarizes several rounds in --processes processes
+    (one per core by default), into a per-app/per-round table and per-app totals
+    over the rounds
+    --approx_wallets adds HyperLogLog unique wallet estimates (wallets_unique_approx)
+    and saves the mergeable wallet sketches next to the summary
+    --profile samples the analysis and writes a per stage profile report next to the
+    summary (rounds are then summarized in this process, so they are sampled too)
     """
-    if round_id < 1:
+    if (round_id is None) == (rounds is None):
+        logger.error("Give one of round_id or --rounds")
+        raise ValueError("Give one of round_id or --rounds")
+    if round_id is not None and round_id < 1:
         logger.error("round_id has to be >= 1")
         raise ValueError("round_id has to be >= 1")
-    _summarize_rewards(round_id)
+    if processes is not None and processes < 1:
+        logger.error("processes has to be >= 1")
+        raise ValueError("processes has to be >= 1")
+    if round_id is not None:
+        with profiled(
+            f"reward-events-summary-round-{round_id}-profile", enabled=profile
+        ):
+            _summarize_rewards(round_id, approx_wallets)
+        return
+    round_ids = _parse_rounds(rounds)
+    if profile:
+        processes = 1
+    file_prefix = f"reward-events-summary-rounds-{round_ids[0]}-{round_ids[-1]}-profile"
+    with profiled(file_prefix, enabled=profile):
+        _summarize_rounds(round_ids, approx_wallets, processes)
+
+
+# -----------------------------
+# FOLLOW NEW BLOCKS
+# -----------------------------
+
+# parquet files cannot be appended to
+FOLLOW_OUTPUT_FORMATS = ("csv", "jsonl")
+
+
+def _follow_rewards_once(
+    state: FollowState, confirmations: int, output_format: str
+) -> bool:
+    """
+    Indexes the confirmed blocks after the last indexed block, appending to the
+    round files. On the first run, the current round is indexed from its start
+    into new files.
+    Returns False if there were no new confirmed blocks
+    """
+    thor_client = ThorClient(ThorClientOptions(thor_url=DEFAULT_THOR_ENDPOINT))
+    try:
+        to_block = thor_client.get_block_number("best") - confirmations
+    finally:
+        thor_client.dispose()
+    append = state.last_block is not None
+    if state.last_block is None:
+        from_block = get_block_range_for_round(get_current_round())[0]
+    else:
+        from_block = state.last_block + 1
+    if to_block < from_block:
+        return False
+
+    logger.info(f"Following rewards events in blocks {from_block}-{to_block}")
+    round_ranges = get_rounds_for_block_range(from_block, to_block)
+    warm_app_name_cache(round_ranges)
+    file_sink = PartitionedEventSink(
+        partition_of=attrgetter("round_number"),
+        sink_factory=lambda round_number: _create_file_sink(
+            f"rewards-events-round-{round_number}", output_format, append
+        ),
+    )
+    # new events are added to the saved round aggregates, rounds without an
+    # up to date aggregate get theirs rebuilt from the file when summarized
+    aggregate_sink = RewardAggregateSink()
+    stale_rounds = set()
+    if append:
+        for round_number in round_ranges:
+            aggregate = load_round_aggregate(round_number)
+            if aggregate is None:
+                stale_rounds.add(round_number)
+            else:
+                aggregate_sink.aggregates[round_number] = aggregate
+    event_sink = TeeEventSink([file_sink, aggregate_sink])
+    b3tr_reward_def = B3TR_REWARD_DEFINITION
+    options = IndexerOptions[B3TRRewardDecodedEvent, B3TRRewardEvent](
+        block_ranges=[(from_block, to_block)],
+        contract_address=b3tr_reward_def.contract_address,
+        topic0=b3tr_reward_def.topic0,
+        thor_endpoints=THOR_ENDPOINTS,
+        task_block_size=240,
+        delay_between_thor_requests=0.2,
+        max_events_per_thor_request=1000,
+        event_decoder=b3tr_reward_def.event_decoder,
+        event_transformer=b3tr_reward_def.event_transformer,
+        batch_event_decoder=b3tr_reward_def.batch_event_decoder,
+        async_mode=True,
+        max_requests_in_flight_per_endpoint=4,
+        split_full_pages=True,
+        event_sink=event_sink,
+    )
+    idx = EventIndexer(options)
+    idx.start()
+    idx.wait()
+    file_names = _sink_file_names(event_sink)
+    if idx.error:
+        # drop anything appended by the failed run, the blocks are fetched again
+        # next time (new files are discarded by the sinks)
+        state.rollback(file_names if append else ())
+        raise RuntimeError(
+            f"Following blocks {from_block}-{to_block} failed"
+        ) from idx.error
+    for round_number in sorted(file_sink.sinks):
+        if round_number not in stale_rounds:
+            save_round_aggregate(
+                round_number,
+                aggregate_sink.aggregates[round_number],
+                f"rewards-events-round-{round_number}.{output_format}",
+            )
+    state.save(to_block, output_format, file_names)
+    logger.info(f"Indexed {idx.result_count} new events up to block {to_block}")
+
+    # refresh the summaries of the rounds that got new events
+    for round_number in sorted(file_sink.sinks):
+        if output_format == "csv" or round_number not in stale_rounds:
+            _summarize_rewards(round_number)
+    return True
+
+
+def follow(
+    confirmations: int = 12,
+    poll_secs: float = 30.0,
+    output_format: str = "csv",
+    once: bool = False,
+) -> None:
+    """
+    Entry point for follow CLI command
+    Keeps the round files up to date with new blocks, fetching only blocks not
+    indexed yet that are at least --confirmations blocks deep, every --poll_secs.
+    The first run indexes the current round from its start.
+    Summaries of rounds with new events are refreshed from their aggregates.
+    --output_format is one of csv or jsonl, --once polls a single time
+    """
+    if confirmations < 0:
+        logger.error("confirmations has to be >= 0")
+        raise ValueError("confirmations has to be >= 0")
+    if output_format not in FOLLOW_OUTPUT_FORMATS:
+        logger.error(f"output_format has to be one of {FOLLOW_OUTPUT_FORMATS}")
+        raise ValueError(f"output_format has to be one of {FOLLOW_OUTPUT_FORMATS}")
+    state = FollowState(FOLLOW_STATE_PATH)
+    if state.output_format not in (None, output_format):
+        logger.error(
+            f"Already following as {state.output_format}, remove {state.path} to change"
+        )
+        raise ValueError(f"Already following as {state.output_format}")
+    # drop output of a follow run that did not finish
+    state.rollback()
+    while True:
+        try:
+            _follow_rewards_once(state, confirmations, output_format)
+        except Exception as e:
+            if once:
+                raise
+            logger.error(f"Follow poll failed, retrying in {poll_secs}s: {e!r}")
+        if once:
+            return
+        time.sleep(poll_secs)
 
 
 # -----------------------------
@@ -106,7 +598,7 @@ def summarize(round_id: int) -> None:
 
 def main() -> None:
     print_logo()
-    fire.Fire({"extract": extract, "summarize": summarize})
+    fire.Fire({"extract": extract, "summarize": summarize, "follow": follow})
 
 
 if __name__ == "__main__":
@@ -1,75 +1,147 @@
-from typing import Dict
+from bisect import bisect_right
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
 
-from eth_abi.abi import decode, encode
-from eth_utils.crypto import keccak
 from loguru import logger
 
 from vbd_indexer.b3tr.b3tr_contracts import B3TR_CONTRACTS
+from vbd_indexer.b3tr.b3tr_round import round_call, round_ranges_of_outputs
 from vbd_indexer.config.app_config import DEFAULT_THOR_ENDPOINT
+from vbd_indexer.thor.contract_call import ContractCall
 from vbd_indexer.thor.thor_client import ThorClient, ThorClientOptions
+from vbd_indexer.utils.block_ranges import BlockRange
 
 # cached values
-_cached_app_map: Dict[str, str] | None = None
-_cached_round: int | None = None
+_cached_app_maps: Dict[int, Dict[str, str]] | None = None
+_cached_round_ranges: Dict[int, BlockRange] = {}
+# (start block, round number) of the cached rounds, sorted to look up the round
+# of a block
+_round_starts: List[Tuple[int, int]] = []
 
 
-def warm_app_name_cache(round_number: int) -> None:
+def apps_of_round_call(round_number: int) -> ContractCall:
     """
-    Gets a list of app ids and app names for the round number
+    XAllocationVoting.getAppsOfRound call, outputs the list of app tuples
+    (id, team wallet, name, metadata uri, created at, active)
+    """
+    return ContractCall(
+        contract_address=B3TR_CONTRACTS["XAllocationVoting"],
+        function_sig="getAppsOfRound(uint256)",
+        args=(round_number,),
+        output_types=("(bytes32,address,string,string,uint256,bool)[]",),
+    )
+
+
+def warm_app_name_cache(round_ranges: Mapping[int, BlockRange]) -> None:
+    """
+    Gets the app ids and app names of the rounds, keyed by round number with
+    the round block ranges. The apps of all rounds are fetched in one batched call.
     Only need to call this once as it populates above caches
     """
-    global _cached_app_map, _cached_round
-    if round_number != _cached_round:
-        # clear cache if different round
-        if _cached_app_map is not None:
-            _cached_app_map.clear()
-    if round_number == _cached_round and _cached_app_map is not None:
-        # raise error if same round and already cached
-        raise ValueError(f"App names are already cached for round: {round_number}")
-    # setup cache
-    _cached_round = round_number
-    _cached_app_map = {}
-    # call contract function
+    round_numbers = sorted(round_ranges)
+    logger.info(f"Getting app names for rounds {round_numbers}")
+    outputs = _call_functions([apps_of_round_call(r) for r in round_numbers])
+    _load_app_outputs(round_ranges, round_numbers, outputs)
+
+
+def warm_round_cache(round_numbers: Sequence[int]) -> Dict[int, BlockRange]:
+    """
+    Gets the block ranges and the app names of the rounds in one batched call
+    Populates the app name cache and returns the round block ranges
+    """
+    round_numbers = sorted(round_numbers)
+    logger.info(f"Getting block ranges and app names for rounds {round_numbers}")
+    outputs = _call_functions(
+        [round_call(r) for r in round_numbers]
+        + [apps_of_round_call(r) for r in round_numbers]
+    )
+    round_ranges = round_ranges_of_outputs(round_numbers, outputs)
+    _load_app_outputs(round_ranges, round_numbers, outputs[len(round_numbers) :])
+    return round_ranges
+
+
+def _call_functions(calls: Sequence[ContractCall]) -> List[Tuple[Any, ...]]:
     client_options = ThorClientOptions(
         thor_url=DEFAULT_THOR_ENDPOINT, http_request_timeout=10
     )
     thor_client = ThorClient(client_options)
     try:
-        logger.info(f"Getting app names for round {round_number}")
-        # encode the function call data
-        solidity_sig = "getAppsOfRound(uint256)"
-        func_selector = keccak(text=solidity_sig)[:4]
-        encoded_args = encode(["uint256"], [round_number])
-        encoded_call_data = "0x" + (func_selector + encoded_args).hex()
-        # get the raw response
-        response_data = thor_client.call_contract(
-            contract_address=B3TR_CONTRACTS["XAllocationVoting"],
-            call_data=encoded_call_data,
-        )
-        # decode the response
-        raw = bytes.fromhex(response_data[2:])  # strip 0x
-        app_type = "(bytes32,address,string,string,uint256,bool)[]"
-        apps = decode([app_type], raw)[0]
-        # extract only id and name
-        for app in apps:
-            app_id = "0x" + app[0].hex().lower()
-            name = app[2]
-            _cached_app_map[app_id] = name
-        logger.info(f"Round {round_number} has {len(_cached_app_map)} active apps")
+        return thor_client.call_functions(calls)
     finally:
         thor_client.dispose()
 
 
-def get_app_name(app_id: str) -> str | None:
+def _load_app_outputs(
+    round_ranges: Mapping[int, BlockRange],
+    round_numbers: Sequence[int],
+    outputs: Sequence[Tuple[Any, ...]],
+) -> None:
+    """
+    Loads the decoded getAppsOfRound outputs of the rounds into the cache
+    """
+    app_maps: Dict[int, Dict[str, str]] = {}
+    for round_number, (apps,) in zip(round_numbers, outputs):
+        # extract only id and name
+        app_maps[round_number] = {"0x" + app[0].hex().lower(): app[2] for app in apps}
+        logger.info(
+            f"Round {round_number} has {len(app_maps[round_number])} active apps"
+        )
+    load_app_name_cache(dict(round_ranges), app_maps)
+
+
+def export_app_name_cache() -> Tuple[Dict[int, BlockRange], Dict[int, Dict[str, str]]]:
+    """
+    Returns the cached round block ranges and app names, to load into another process
+    """
+    if _cached_app_maps is None:
+        raise RuntimeError(
+            "Cache not warmed – call warm_app_name_cache(round_ranges) first"
+        )
+    return dict(_cached_round_ranges), {
+        round_number: dict(app_map)
+        for round_number, app_map in _cached_app_maps.items()
+    }
+
+
+def load_app_name_cache(
+    round_ranges: Dict[int, BlockRange], app_maps: Dict[int, Dict[str, str]]
+) -> None:
+    """
+    Populates the cache with rounds and app names exported by export_app_name_cache
+    Used as initializer of decode worker processes, which cannot share the cache
+    """
+    global _cached_app_maps, _cached_round_ranges, _round_starts
+    _cached_round_ranges = dict(round_ranges)
+    _cached_app_maps = {
+        round_number: dict(app_map) for round_number, app_map in app_maps.items()
+    }
+    _round_starts = sorted((start, r) for r, (start, _) in round_ranges.items())
+
+
+def get_round_for_block(block_number: int) -> int:
+    """
+    Returns the latest cached round started at or before the block
+    Blocks after a round ended but before the next one started belong to it
+    """
+    if _cached_app_maps is None:
+        raise RuntimeError(
+            "Cache not warmed – call warm_app_name_cache(round_ranges) first"
+        )
+    i = bisect_right(_round_starts, (block_number, float("inf")))
+    if i == 0:
+        raise ValueError(f"No cached round has started by block {block_number}")
+    return _round_starts[i - 1][1]
+
+
+def get_app_name(app_id: str, round_number: int) -> str | None:
     """
-    Returns the app name for an id, using cached round data.
+    Returns the app name for an id in a round, using cached round data.
     If not found, returns None.
     """
-    if _cached_app_map is None:
+    if _cached_app_maps is None:
         raise RuntimeError(
-            "Cache not warmed – call warm_app_name_cache(round_number) first"
+            "Cache not warmed – call warm_app_name_cache(round_ranges) first"
         )
-    app_name = _cached_app_map.get(app_id.lower())
+    app_name = _cached_app_maps[round_number].get(app_id.lower())
     if app_name is None:
         logger.warning(f"No app name found for app id: {app_id}")
         app_name = None
@@ -1,8 +1,24 @@
+import sys
+from functools import lru_cache
+from typing import List, Sequence
+
 from eth_abi.abi import decode
 from eth_utils.address import to_checksum_address
 
 from vbd_indexer.b3tr.b3tr_models import B3TRRewardDecodedEvent
-from vbd_indexer.thor.raw_event import RawEvent
+from vbd_indexer.thor.raw_event import RawEvent, raw_event_rows
+
+# hex characters in one 32 byte abi word
+_WORD = 64
+
+
+@lru_cache(maxsize=65536)
+def _checksum_address(topic: str) -> str:
+    """
+    Checksum address from an indexed address topic
+    Memoized as receivers and distributors repeat a lot, and checksumming does a keccak
+    """
+    return to_checksum_address("0x" + topic[-40:])
 
 
 def decode_reward_event(raw_event: RawEvent) -> B3TRRewardDecodedEvent:
@@ -17,10 +33,10 @@ def decode_reward_event(raw_event: RawEvent) -> B3TRRewardDecodedEvent:
       address indexed distributor
     );
     """
-    # indexed data
-    app_id = raw_event.topics[1]
-    receiver_address = to_checksum_address("0x" + raw_event.topics[2][-40:])
-    distributor_address = to_checksum_address("0x" + raw_event.topics[3][-40:])
+    # indexed data, app ids repeat so they share one string
+    app_id = sys.intern(raw_event.topics[1])
+    receiver_address = _checksum_address(raw_event.topics[2])
+    distributor_address = _checksum_address(raw_event.topics[3])
     # --- non-indexed fields from data ---
     # order: uint256 amount, string proof
     reward_amount, reward_proof = decode(
@@ -37,3 +53,38 @@ def decode_reward_event(raw_event: RawEvent) -> B3TRRewardDecodedEvent:
         app_id=app_id,
         distributor_address=distributor_address,
     )
+
+
+def decode_reward_events(
+    raw_events: Sequence[RawEvent],
+) -> List[B3TRRewardDecodedEvent]:
+    """
+    Decodes a page of RewardDistributed events, same results as decode_reward_event
+    The data layout is fixed: word 0 is the uint256 amount, word 1 the offset
+    of the proof string, which is a length word followed by the utf-8 bytes.
+    The words are sliced straight from the hex data, skipping the generic abi decoder.
+    A RawEventPage is read column-wise, without building a RawEvent per event.
+    """
+    decoded: List[B3TRRewardDecodedEvent] = []
+    append = decoded.append
+    for block_number, timestamp, data, topics in raw_event_rows(raw_events):
+        # skip the 0x prefix
+        proof_start = 2 + int(data[2 + _WORD : 2 + 2 * _WORD], 16) * 2
+        proof_length = int(data[proof_start : proof_start + _WORD], 16)
+        proof_data = data[proof_start + _WORD : proof_start + _WORD + proof_length * 2]
+        if len(proof_data) != proof_length * 2:
+            raise ValueError(
+                f"Malformed RewardDistributed data in block {block_number}"
+            )
+        append(
+            B3TRRewardDecodedEvent(
+                block_number=block_number,
+                timestamp=timestamp,
+                amount=int(data[2 : 2 + _WORD], 16),
+                receiver_address=_checksum_address(topics[2]),
+                proof=bytes.fromhex(proof_data).decode("utf-8"),
+                app_id=sys.intern(topics[1]),
+                distributor_address=_checksum_address(topics[3]),
+            )
+        )
+    return decoded
@@ -1,6 +1,6 @@
 from loguru import logger
 
-from vbd_indexer.b3tr.b3tr_apps import get_app_name
+from vbd_indexer.b3tr.b3tr_apps import get_app_name, get_round_for_block
 from vbd_indexer.b3tr.b3tr_models import B3TRRewardDecodedEvent, B3TRRewardEvent
 from vbd_indexer.b3tr.b3tr_proof_parser import parse_reward_proof
 from vbd_indexer.utils.units import format_wei
@@ -10,13 +10,15 @@ def transform_reward_event(raw_event: B3TRRewardDecodedEvent) -> B3TRRewardEvent
     """
     Transform a raw Reward event into a final Reward event
     - amount (wei) to b3tr
-    - app name is filled
+    - round is found from the block number
+    - app name is filled for the round
     - impacts are extracted from proof json
     """
     try:
         # get transformed fields
         b3tr_amount = format_wei(raw_event.amount)
-        app_name = get_app_name(raw_event.app_id)
+        round_number = get_round_for_block(raw_event.block_number)
+        app_name = get_app_name(raw_event.app_id, round_number)
         if app_name is None:
             # blacklisted app
             return None
@@ -26,6 +28,7 @@ def transform_reward_event(raw_event: B3TRRewardDecodedEvent) -> B3TRRewardEvent
         return B3TRRewardEvent(
             block_number=raw_event.block_number,
             timestamp=raw_event.timestamp,
+            round_number=round_number,
             amount=b3tr_amount,
             app_id=raw_event.app_id,
             app_name=app_name,
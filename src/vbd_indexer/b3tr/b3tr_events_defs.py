@@ -1,7 +1,10 @@
 from eth_utils.crypto import keccak
 
 from vbd_indexer.b3tr.b3tr_contracts import B3TR_CONTRACTS
-from vbd_indexer.b3tr.b3tr_event_decoders import decode_reward_event
+from vbd_indexer.b3tr.b3tr_event_decoders import (
+    decode_reward_event,
+    decode_reward_events,
+)
 from vbd_indexer.b3tr.b3tr_event_transformers import transform_reward_event
 from vbd_indexer.b3tr.b3tr_models import B3TRRewardDecodedEvent, B3TRRewardEvent
 from vbd_indexer.indexer.contract_event import ContractEvent
@@ -23,4 +26,5 @@ B3TR_REWARD_DEFINITION: ContractEvent = ContractEvent[
     ).hex(),
     event_decoder=decode_reward_event,
     event_transformer=transform_reward_event,
+    batch_event_decoder=decode_reward_events,
 )
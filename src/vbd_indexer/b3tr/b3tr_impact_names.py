@@ -1,4 +1,6 @@
-# TODO - can this come from a contract call?
+# Impacts of the B3TR reward proofs, exported as impact_<name> columns in this
+# order. Proofs can name other impacts too, they are kept as they are parsed and
+# exported as extra columns after these.
 B3TR_IMPACT_NAMES = [
     "carbon",
     "water",
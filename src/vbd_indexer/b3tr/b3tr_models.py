@@ -1,16 +1,19 @@
 from dataclasses import dataclass
 from decimal import Decimal
-from typing import Dict
+from typing import Any, Dict, Tuple
 
+from vbd_indexer.b3tr.b3tr_impact_names import B3TR_IMPACT_NAMES
 from vbd_indexer.indexer.decoded_event import DecodedEvent
 from vbd_indexer.indexer.transformed_event import TransformedEvent
 
+_ZERO = Decimal(0)
+
 # ---------------------------
 # Indexed Event objects
 # ---------------------------
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class B3TRRewardDecodedEvent(DecodedEvent):
     """
     Data gathered from the direct decoding of a "RewardDistributed" solidity event
@@ -28,14 +31,36 @@ class B3TRRewardDecodedEvent(DecodedEvent):
 # -----------------------------
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class B3TRRewardEvent(TransformedEvent):
     """
     A transformed/sanitised B3TRRewardRawEvent
+    Impacts are the (name, value) pairs named by the proof rather than a dict
+    per event, to_record() expands them to impact_<name> columns
     """
 
+    round_number: int
     amount: Decimal
     app_id: str
     app_name: str
     receiver_address: str
-    impact: Dict[str, Decimal]
+    impact: Tuple[Tuple[str, Decimal], ...]
+
+    def to_record(self) -> Dict[str, Any]:
+        """
+        Fields for export, with impacts as a dict keyed by impact name
+        Every impact of B3TR_IMPACT_NAMES is included (0 if not in the proof),
+        other impacts only if the proof names them
+        """
+        impact = dict.fromkeys(B3TR_IMPACT_NAMES, _ZERO)
+        impact.update(self.impact)
+        return {
+            "block_number": self.block_number,
+            "timestamp": self.timestamp,
+            "round_number": self.round_number,
+            "amount": self.amount,
+            "app_id": self.app_id,
+            "app_name": self.app_name,
+            "receiver_address": self.receiver_address,
+            "impact": impact,
+        }
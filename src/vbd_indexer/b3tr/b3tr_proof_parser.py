@@ -1,30 +1,128 @@
 import json
-from decimal import Decimal
-from typing import Dict
+import re
+import sys
+from decimal import ROUND_HALF_UP, Context, Decimal, InvalidOperation
+from functools import lru_cache
+from typing import Any, List, Optional, Set, Tuple
 
 from loguru import logger
 
 from vbd_indexer.b3tr.b3tr_impact_names import B3TR_IMPACT_NAMES
+from vbd_indexer.b3tr.b3tr_schemas import B3TR_IMPACT_SCALE
+from vbd_indexer.utils import fast_json
 
+# (impact name, value) pairs of the impacts named by a proof
+Impacts = Tuple[Tuple[str, Decimal], ...]
 
-def parse_reward_proof(raw_proof: str) -> Dict[str, Decimal]:
+# shared by every event without impacts
+_NO_IMPACTS: Impacts = ()
+
+_KNOWN_IMPACT_NAMES = frozenset(B3TR_IMPACT_NAMES)
+# impacts not in B3TR_IMPACT_NAMES are kept if named like them, once snake-cased
+_IMPACT_NAME = re.compile(r"[a-z][a-z0-9_]*")
+_CAMEL_CASE_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_NOT_NAME_CHARS = re.compile(r"[^a-z0-9]+")
+# names that cannot be snake-cased into an impact name, logged once each
+_dropped_names: Set[str] = set()
+# impact values must fit the decimal128(38, B3TR_IMPACT_SCALE) impact columns
+_IMPACT_LIMIT = Decimal(10) ** 20
+# values are rounded half up to the scale once, like the parquet output, so every
+# output format holds the same digits (Decimal(0.1) has 55 decimals)
+_IMPACT_QUANTUM = Decimal(1).scaleb(-B3TR_IMPACT_SCALE)
+# one more digit than the columns, for values rounding up to _IMPACT_LIMIT
+_IMPACT_CONTEXT = Context(prec=39)
+
+# floats at least this large may be integers read inexactly by orjson
+_INEXACT_FLOAT = float(2**63)
+
+
+def _loads(raw_proof: str) -> Any:
+    try:
+        return fast_json.loads(raw_proof)
+    except ValueError:
+        # orjson rejects a few documents json accepts, e.g. NaN
+        return json.loads(raw_proof)
+
+
+def _impact_name(name: str) -> Optional[str]:
+    """
+    Snake-cased name of an impact (e.g. CO2 -> co2, newThing -> new_thing,
+    "Trees Planted" -> trees_planted), None if it does not make an impact name
+    """
+    if _IMPACT_NAME.fullmatch(name):
+        return name
+    snake_name = _CAMEL_CASE_BOUNDARY.sub("_", name).lower()
+    snake_name = _NOT_NAME_CHARS.sub("_", snake_name).strip("_")
+    if _IMPACT_NAME.fullmatch(snake_name):
+        return snake_name
+    if name not in _dropped_names:
+        _dropped_names.add(name)
+        logger.warning(
+            f"Dropping reward proof impacts named {name!r}, not a valid name"
+        )
+    return None
+
+
+def _impact_value(value: Any) -> Optional[Decimal]:
+    """
+    Value of an impact rounded to the impact scale, None if it is not a finite
+    number small enough to export
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return None
+    try:
+        impact = Decimal(value)
+    except InvalidOperation:
+        return None
+    if not impact.is_finite() or impact.copy_abs() >= _IMPACT_LIMIT:
+        return None
+    impact = impact.quantize(
+        _IMPACT_QUANTUM, rounding=ROUND_HALF_UP, context=_IMPACT_CONTEXT
+    )
+    # values just under the limit can round up to it
+    return impact if impact.copy_abs() < _IMPACT_LIMIT else None
+
+
+@lru_cache(maxsize=65536)
+def parse_reward_proof(raw_proof: str) -> Impacts:
     """
     Parses a sustainability proof
-    Returns a dict of impact name and value
+    Returns the (name, value) pairs of the impacts it names, impacts not in
+    B3TR_IMPACT_NAMES included, so new impact categories are not dropped.
+    Names are snake-cased, values are rounded to the scale of the impact columns
+    and dropped if they do not fit them
+    Memoized as the proofs of an app repeat a lot, the returned tuple is shared
     """
+    if not raw_proof:
+        # actions without a proof
+        return _NO_IMPACTS
     try:
-        impacts: Dict[str, Decimal] = {}
-        proof_json = json.loads(raw_proof)
+        proof_json = _loads(raw_proof)
         if "impact" not in proof_json:
-            return {name: Decimal(0) for name in B3TR_IMPACT_NAMES}
-        for field_name in B3TR_IMPACT_NAMES:
-            if field_name in proof_json["impact"]:
-                impact_value = Decimal(proof_json["impact"][field_name])
-                impacts[field_name] = impact_value
+            return _NO_IMPACTS
+        proof_impacts = proof_json["impact"]
+        if not isinstance(proof_impacts, dict):
+            return _NO_IMPACTS
+        impacts: List[Tuple[str, Decimal]] = []
+        for proof_name, value in proof_impacts.items():
+            name = _impact_name(proof_name)
+            # a proof naming e.g. carbon and Carbon keeps the first one
+            if name is None or any(name == seen for seen, _ in impacts):
+                continue
+            if type(value) is float and not abs(value) < _INEXACT_FLOAT:
+                # orjson reads integers over 64 bits as floats, json keeps them exact
+                value = json.loads(raw_proof)["impact"][proof_name]
+            known = name in _KNOWN_IMPACT_NAMES
+            impact = _impact_value(value)
+            if impact is None:
+                # one bad proof must not fail the aggregate or the output columns
+                logger.warning(f"Dropping reward proof impact {proof_name}: {value!r}")
+            elif known:
+                impacts.append((name, impact))
             else:
-                impacts[field_name] = Decimal(0)
-        return impacts
+                # names repeat across proofs, events share one string
+                impacts.append((sys.intern(name), impact))
+        return tuple(impacts) if impacts else _NO_IMPACTS
     except Exception as e:
-        if raw_proof is not None and len(raw_proof) > 0:
-            logger.warning(f"Unable to parse reward proof: {raw_proof}")
-        return {name: Decimal(0) for name in B3TR_IMPACT_NAMES}
+        logger.warning(f"Unable to parse reward proof: {raw_proof}")
+        return _NO_IMPACTS
@@ -1,43 +1,108 @@
-from typing import Tuple
+from typing import Any, Dict, Sequence, Tuple
 
-from eth_abi.abi import decode, encode
-from eth_utils.crypto import keccak
 from loguru import logger
 
 from vbd_indexer.b3tr.b3tr_contracts import B3TR_CONTRACTS
 from vbd_indexer.config.app_config import DEFAULT_THOR_ENDPOINT
+from vbd_indexer.thor.contract_call import ContractCall
 from vbd_indexer.thor.thor_client import ThorClient
 from vbd_indexer.thor.thor_client_options import ThorClientOptions
+from vbd_indexer.utils.block_ranges import BlockRange
+
+
+def round_call(round_number: int) -> ContractCall:
+    """
+    XAllocationVoting.getRound call, outputs (proposer, vote_start, vote_duration)
+    """
+    return ContractCall(
+        contract_address=B3TR_CONTRACTS["XAllocationVoting"],
+        function_sig="getRound(uint256)",
+        args=(round_number,),
+        output_types=("address", "uint48", "uint32"),
+    )
 
 
 def get_block_range_for_round(round_number: int) -> Tuple[int, int]:
     """
     Gets the start and end block number for a VBD round
     """
+    return get_block_ranges_for_rounds([round_number])[round_number]
+
+
+def get_block_ranges_for_rounds(round_numbers: Sequence[int]) -> Dict[int, BlockRange]:
+    """
+    Gets the start and end block numbers of several VBD rounds
+    All rounds are looked up in one batched contract call
+    """
     client_options = ThorClientOptions(
         thor_url=DEFAULT_THOR_ENDPOINT, http_request_timeout=10
     )
     thor_client = ThorClient(client_options)
     try:
-        # encode the function call data
-        solidity_sig = "getRound(uint256)"
-        func_selector = keccak(text=solidity_sig)[:4]
-        encoded_args = encode(["uint256"], [round_number])
-        encoded_call_data = "0x" + (func_selector + encoded_args).hex()
-        # get the raw response
-        response_data = thor_client.call_contract(
-            contract_address=B3TR_CONTRACTS["XAllocationVoting"],
-            call_data=encoded_call_data,
-        )
-        # decode the response
-        raw = bytes.fromhex(response_data[2:])  # strip 0x
-        proposer, vote_start, vote_duration = decode(
-            ["address", "uint48", "uint32"],
-            raw,
+        outputs = thor_client.call_functions(
+            [round_call(round_number) for round_number in round_numbers]
         )
+    finally:
+        thor_client.dispose()
+    return round_ranges_of_outputs(round_numbers, outputs)
+
+
+def round_ranges_of_outputs(
+    round_numbers: Sequence[int], outputs: Sequence[Tuple[Any, ...]]
+) -> Dict[int, BlockRange]:
+    """
+    Returns the block ranges of the rounds from their decoded getRound outputs
+    """
+    round_ranges: Dict[int, BlockRange] = {}
+    for round_number, (proposer, vote_start, vote_duration) in zip(
+        round_numbers, outputs
+    ):
         logger.info(
             f"Round: {round_number} start_block: {vote_start} block_length: {vote_duration}"
         )
-        return vote_start, (vote_start + vote_duration)
+        round_ranges[round_number] = (vote_start, vote_start + vote_duration)
+    return round_ranges
+
+
+def get_current_round() -> int:
+    """
+    Gets the number of the current (latest started) VBD round
+    """
+    client_options = ThorClientOptions(
+        thor_url=DEFAULT_THOR_ENDPOINT, http_request_timeout=10
+    )
+    thor_client = ThorClient(client_options)
+    try:
+        (current_round,) = thor_client.call_functions(
+            [
+                ContractCall(
+                    contract_address=B3TR_CONTRACTS["XAllocationVoting"],
+                    function_sig="currentRoundId()",
+                    output_types=("uint256",),
+                )
+            ]
+        )[0]
+        return current_round
     finally:
         thor_client.dispose()
+
+
+def get_rounds_for_block_range(from_block: int, to_block: int) -> Dict[int, BlockRange]:
+    """
+    Gets the rounds whose events can fall in the block range: the rounds
+    overlapping it, and the last round started before it
+    """
+    current_round = get_current_round()
+    round_ranges = get_block_ranges_for_rounds(list(range(1, current_round + 1)))
+    started_before = [
+        r for r, (start, _) in round_ranges.items() if start <= from_block
+    ]
+    rounds = {
+        r: (start, end)
+        for r, (start, end) in round_ranges.items()
+        if start <= to_block
+        and (end >= from_block or r == max(started_before, default=0))
+    }
+    if not rounds:
+        raise ValueError(f"No round has started by block {to_block}")
+    return rounds
@@ -0,0 +1,24 @@
+from vbd_indexer.b3tr.b3tr_impact_names import B3TR_IMPACT_NAMES
+from vbd_indexer.b3tr.b3tr_models import B3TRRewardEvent
+from vbd_indexer.sinks.arrow_schema import arrow_schema_for, nested_column_types
+
+# ---------------------------
+# Arrow schemas of exported events
+# ---------------------------
+
+
+# amounts are rounded to 0.001 B3TR by format_wei, impacts keep 18 decimals
+B3TR_AMOUNT_SCALE = 3
+B3TR_IMPACT_SCALE = 18
+
+_DECIMAL_SCALES = {"amount": B3TR_AMOUNT_SCALE, "impact": B3TR_IMPACT_SCALE}
+
+B3TR_REWARD_ARROW_SCHEMA = arrow_schema_for(
+    B3TRRewardEvent,
+    dict_keys={"impact": B3TR_IMPACT_NAMES},
+    dictionary_fields=["app_id", "app_name"],
+    decimal_scales=_DECIMAL_SCALES,
+)
+
+# types of the impact_<name> columns of impacts not in B3TR_IMPACT_NAMES
+B3TR_REWARD_EXTRA_COLUMN_TYPES = nested_column_types(B3TRRewardEvent, _DECIMAL_SCALES)
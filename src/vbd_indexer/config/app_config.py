@@ -10,3 +10,12 @@ THOR_ENDPOINTS = [
 ]
 
 DEFAULT_THOR_ENDPOINT = "https://mainnet.vechain.org"
+
+# Local cache of raw events fetched from thor
+RAW_EVENT_CACHE_PATH = ".vbd-cache/raw-events.sqlite"
+
+# Journals of completed indexer tasks, used by extract --resume
+CHECKPOINT_DIR = ".vbd-checkpoints"
+
+# Last indexed block and output file sizes of the follow command
+FOLLOW_STATE_PATH = ".vbd-follow/rewards-events.json"
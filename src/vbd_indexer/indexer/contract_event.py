@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Callable, Generic, TypeVar
+from typing import Callable, Generic, List, Optional, Sequence, TypeVar
 
 from vbd_indexer.thor.raw_event import RawEvent
 
@@ -22,3 +22,5 @@ class ContractEvent(Generic[EDecoded, ETransformed]):
     topic0: str
     event_decoder: Callable[[RawEvent], EDecoded]
     event_transformer: Callable[[EDecoded], ETransformed | None]
+    # optional faster decoder for a whole page of raw events
+    batch_event_decoder: Optional[Callable[[Sequence[RawEvent]], List[EDecoded]]] = None
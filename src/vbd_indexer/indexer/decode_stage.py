@@ -0,0 +1,116 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from vbd_indexer.thor.raw_event import RawEvent
+
+
+@dataclass(frozen=True, slots=True)
+class DecodedPage:
+    """
+    Transformed events of a page, with the time spent decoding and transforming
+    """
+
+    events: List[Any]
+    decode_secs: float
+    transform_secs: float
+
+
+def decode_and_transform(
+    event_decoder: Callable[[RawEvent], Any],
+    batch_event_decoder: Optional[Callable[[Sequence[RawEvent]], List[Any]]],
+    event_transformer: Callable[[Any], Any],
+    raw_events: Sequence[RawEvent],
+) -> DecodedPage:
+    """
+    Decodes and transforms a page of raw events
+    Events the transformer returns None for are dropped
+    """
+    started = time.perf_counter()
+    if batch_event_decoder is not None:
+        decoded_events = batch_event_decoder(raw_events)
+    else:
+        decoded_events = [event_decoder(raw_event) for raw_event in raw_events]
+    decoded = time.perf_counter()
+    trans_events = [
+        event_transformer(decoded_event) for decoded_event in decoded_events
+    ]
+    events = [e for e in trans_events if e is not None]
+    return DecodedPage(events, decoded - started, time.perf_counter() - decoded)
+
+
+class DecodeStage:
+    """
+    Runs decode_and_transform for pages of raw events in a pool of worker processes
+    Decoding is CPU bound, so this takes it off the GIL shared with the fetch workers.
+    At most max_pending_pages pages are queued or decoding, submit() blocks when
+    the pool falls behind so fetched pages do not pile up in memory.
+    The decoder, transformer and initializer must be picklable (module level functions).
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        event_decoder: Callable[[RawEvent], Any],
+        batch_event_decoder: Optional[Callable[[Sequence[RawEvent]], List[Any]]],
+        event_transformer: Callable[[Any], Any],
+        initializer: Optional[Callable[..., None]] = None,
+        initargs: Tuple[Any, ...] = (),
+        max_pending_pages: Optional[int] = None,
+    ) -> None:
+        if processes < 1:
+            raise ValueError("processes must be > 0")
+        self._event_decoder = event_decoder
+        self._batch_event_decoder = batch_event_decoder
+        self._event_transformer = event_transformer
+        self._pending = threading.Semaphore(max_pending_pages or 2 * processes)
+        # spawn, forking a process with running fetch threads is not safe
+        self._pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer,
+            initargs=initargs,
+        )
+
+    def submit(
+        self,
+        raw_events: Sequence[RawEvent],
+        on_done: Callable[["Future[DecodedPage]"], None],
+    ) -> None:
+        """
+        Queues a page for decoding, blocking while too many pages are pending
+        on_done is called with the future from a pool thread once the page is decoded
+        """
+        self._pending.acquire()
+        try:
+            future = self._pool.submit(
+                decode_and_transform,
+                self._event_decoder,
+                self._batch_event_decoder,
+                self._event_transformer,
+                raw_events,
+            )
+        except BaseException:
+            self._pending.release()
+            raise
+
+        def done(f: "Future[DecodedPage]") -> None:
+            self._pending.release()
+            on_done(f)
+
+        future.add_done_callback(done)
+
+    def close(self) -> None:
+        """
+        Waits for all pending pages, then stops the worker processes
+        """
+        self._pool.shutdown(wait=True)
+
+    def abort(self) -> None:
+        """
+        Drops pages not yet started, then stops the worker processes
+        """
+        self._pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional
+
+
+class EndpointHealth:
+    """
+    Tracks the recent request outcomes, latency and throughput of one thor
+    endpoint (thread-safe)
+    An endpoint whose recent error rate is too high is benched for a while,
+    its workers take no tasks until the bench time is over.
+    The score estimates the endpoint capacity, used to weight work between endpoints.
+    """
+
+    # number of recent requests the error rate is computed over
+    WINDOW_SIZE = 20
+    # requests needed in the window before an endpoint can be benched
+    MIN_SAMPLES = 5
+    # weight of the newest latency sample in the moving average
+    LATENCY_SMOOTHING = 0.2
+
+    def __init__(
+        self, endpoint: str, error_rate_threshold: float, bench_secs: float
+    ) -> None:
+        self.endpoint = endpoint
+        self.error_rate_threshold = error_rate_threshold
+        self.bench_secs = bench_secs
+        self._outcomes: Deque[bool] = deque(maxlen=self.WINDOW_SIZE)
+        self._benched_until = 0.0
+        self._latency_secs: Optional[float] = None
+        self._busy_secs = 0.0
+        self._events = 0
+        self._lock = threading.Lock()
+
+    def record_success(self, latency_secs: float) -> None:
+        """
+        Records a successful request and the time it took
+        """
+        with self._lock:
+            self._outcomes.append(True)
+            if self._latency_secs is None:
+                self._latency_secs = latency_secs
+            else:
+                self._latency_secs += self.LATENCY_SMOOTHING * (
+                    latency_secs - self._latency_secs
+                )
+            self._busy_secs += latency_secs
+
+    def record_events(self, events: int) -> None:
+        """
+        Records the number of events of a fetched task
+        """
+        with self._lock:
+            self._events += events
+
+    def record_failure(self) -> bool:
+        """
+        Records a failed request, benching the endpoint if its error rate is too high
+        Returns True if the endpoint was benched by this failure
+        """
+        with self._lock:
+            self._outcomes.append(False)
+            if len(self._outcomes) < self.MIN_SAMPLES:
+                return False
+            if self._error_rate() <= self.error_rate_threshold:
+                return False
+            self._benched_until = time.monotonic() + self.bench_secs
+            # start with a clean window when back from the bench
+            self._outcomes.clear()
+            return True
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            return self._error_rate()
+
+    @property
+    def latency_secs(self) -> Optional[float]:
+        """Moving average request latency, None until a request succeeded"""
+        with self._lock:
+            return self._latency_secs
+
+    @property
+    def events_per_sec(self) -> float:
+        """Events received per second spent in requests"""
+        with self._lock:
+            if self._busy_secs == 0:
+                return 0.0
+            return self._events / self._busy_secs
+
+    @property
+    def score(self) -> Optional[float]:
+        """
+        Events per second a single request slot can expect: the events received
+        per second spent in requests, less the share of requests failing lately
+        None until events were received
+        """
+        with self._lock:
+            if self._events == 0 or self._busy_secs == 0:
+                return None
+            return (1 - self._error_rate()) * self._events / self._busy_secs
+
+    def is_benched(self) -> bool:
+        with self._lock:
+            return time.monotonic() < self._benched_until
+
+    def _error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
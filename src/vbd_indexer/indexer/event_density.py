@@ -0,0 +1,59 @@
+import threading
+from typing import Optional
+
+
+class EventDensity:
+    """
+    Tracks the observed number of events per block (thread-safe)
+    Used to size indexing tasks so that most of them fit in a single thor page
+    """
+
+    # aim for pages this full, leaving headroom for busier block ranges
+    TARGET_PAGE_FILL = 0.8
+
+    def __init__(self, events_per_block_hint: Optional[float] = None) -> None:
+        if events_per_block_hint is not None and events_per_block_hint < 0:
+            raise ValueError("events_per_block_hint must be >= 0")
+        self._hint = events_per_block_hint
+        self._blocks = 0
+        self._events = 0
+        self._lock = threading.Lock()
+
+    def record(self, blocks: int, events: int) -> None:
+        """
+        Records the event count of a fully fetched block range
+        """
+        with self._lock:
+            self._blocks += blocks
+            self._events += events
+
+    @property
+    def observed_events_per_block(self) -> Optional[float]:
+        """
+        Observed events per block, None until something is recorded
+        """
+        with self._lock:
+            if self._blocks > 0:
+                return self._events / self._blocks
+            return None
+
+    @property
+    def events_per_block(self) -> Optional[float]:
+        """
+        Observed events per block, falls back to the hint until something is recorded
+        """
+        observed = self.observed_events_per_block
+        return self._hint if observed is None else observed
+
+    def suggest_block_size(self, max_events_per_request: int) -> Optional[int]:
+        """
+        Block count expected to fill TARGET_PAGE_FILL of a page
+        Returns None when there is no density information
+        """
+        density = self.events_per_block
+        if density is None:
+            return None
+        if density == 0:
+            # no events seen, any size fits in one page
+            return None
+        return max(1, int(max_events_per_request * self.TARGET_PAGE_FILL / density))
@@ -1,16 +1,36 @@
+import asyncio
+import math
 import queue
+import random
 import threading
-from dataclasses import asdict
-from typing import Generic, List, Optional, Tuple, TypeVar
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
 
+import httpx
 import pandas as pd
 from loguru import logger
 
-from vbd_indexer.b3tr.b3tr_round import get_block_range_for_round
+from vbd_indexer.sinks.event_sink import event_to_record
+from vbd_indexer.sinks.sink_writer import SinkWriter
+from vbd_indexer.thor.async_thor_client import AsyncThorClient
+from vbd_indexer.thor.raw_event import RawEvent
 from vbd_indexer.thor.thor_client import ThorClient
 from vbd_indexer.thor.thor_client_options import ThorClientOptions
+from vbd_indexer.thor.thor_errors import is_transient_thor_error
+from vbd_indexer.thor.token_bucket import TokenBucket
+from vbd_indexer.utils.block_ranges import (
+    BlockRange,
+    merge_block_ranges,
+    subtract_block_ranges,
+)
 
+from .decode_stage import DecodedPage, DecodeStage, decode_and_transform
 from .decoded_event import DecodedEvent
+from .endpoint_health import EndpointHealth
+from .event_density import EventDensity
+from .indexer_checkpoint import CHECKPOINT_FORMAT_VERSION, CheckpointHeader
+from .indexer_metrics import IndexerMetrics, IndexerMetricsSnapshot
 from .indexer_options import IndexerOptions
 from .indexer_status import IndexerStatus
 from .indexer_task import IndexerTask
@@ -26,15 +46,41 @@ ETransformed = TypeVar("ETransformed", bound=TransformedEvent)
 
 class EventIndexer(Generic[EDecoded, ETransformed]):
     """
-    Spawns one worker per thor endpoint. Each worker:
+    Spawns max_requests_in_flight_per_endpoint workers per thor endpoint. Each worker:
       - pulls an IndexerTask from a shared queue
       - appends results into a shared structure (thread-safe)
-    The main thread can call wait() until status is COMPLETED/FAILED/STOPPED.
+    In async mode a single thread runs an event loop instead, with the
+    workers as coroutines; cache access, decoding and journaling run in threads
+    so they never hold up the requests in flight.
+    Workers of an endpoint share a token bucket rate limit.
+    Endpoint latency and error rate are measured, and slower endpoints get
+    fewer workers in flight than the fastest one.
+    With split_full_pages a task whose first page is full is split in half by
+    block range and both halves are put back on the queue.
+    With a raw_event_cache, cached block ranges are not fetched from thor, and
+    the observed event density is saved there to size the tasks of later runs.
+    With a checkpoint, every completed task is journaled so a failed run can resume.
+    With an event_sink, results are streamed to it by a writer thread instead of
+    being kept in memory. The sink is closed when the run completes, aborted otherwise.
+    With decode_processes, fetched pages are decoded and transformed by a process
+    pool; workers block once enough pages are waiting, and a task completes when
+    its page has been decoded.
+    Transient thor errors are retried with backoff, then the task is handed to
+    another endpoint. Endpoints with a high error rate are benched for a while.
+    The main thread can call wait() until status is COMPLETED/FAILED/STOPPED,
+    and metrics() for request, stage and progress metrics of the run.
     """
 
+    # how long an idle worker waits before re-checking for work
+    _QUEUE_POLL_SECS = 0.1
+    # upper bound for the exponential retry backoff
+    _MAX_RETRY_BACKOFF_SECS = 30.0
+
     def __init__(self, options: IndexerOptions[EDecoded, ETransformed]) -> None:
-        if options.round_number <= 0:
-            raise ValueError("round_id must be >= 1")
+        if not options.block_ranges:
+            raise ValueError("block_ranges must not be empty")
+        if any(start > end for start, end in options.block_ranges):
+            raise ValueError("block_ranges must have start <= end")
         if not options.thor_endpoints:
             raise ValueError("endpoints must not be empty")
         if options.task_block_size <= 0:
@@ -45,6 +91,18 @@ class EventIndexer(Generic[EDecoded, ETransformed]):
             raise ValueError("max_events_per_thor_request must be > 0")
         if options.delay_between_thor_requests <= 0:
             raise ValueError("delay_between_thor_requests must be > 0")
+        if options.max_requests_in_flight_per_endpoint < 1:
+            raise ValueError("max_requests_in_flight_per_endpoint must be > 0")
+        if options.max_retries_per_endpoint < 0:
+            raise ValueError("max_retries_per_endpoint must be >= 0")
+        if options.retry_backoff_secs < 0:
+            raise ValueError("retry_backoff_secs must be >= 0")
+        if not 0 < options.endpoint_error_rate_threshold <= 1:
+            raise ValueError("endpoint_error_rate_threshold must be > 0 and <= 1")
+        if options.endpoint_bench_secs < 0:
+            raise ValueError("endpoint_bench_secs must be >= 0")
+        if options.decode_processes < 0:
+            raise ValueError("decode_processes must be >= 0")
 
         # save options
         self.options = options
@@ -60,12 +118,29 @@ class EventIndexer(Generic[EDecoded, ETransformed]):
         # Shared results structure
         self._results_lock = threading.Lock()
         self._results: List[ETransformed] = []
+        self._result_count = 0
+        self._sink_writer: Optional[SinkWriter] = None
+        self._decode_stage: Optional[DecodeStage] = None
 
         # For tracking progress
         self._total_tasks = 0
         self._completed_tasks = 0
         self._progress_lock = threading.Lock()
 
+        # Observed events per block, kept across runs to size tasks
+        self._density = EventDensity(options.events_per_block_hint)
+
+        # Last block whose events may be stored in the raw event cache
+        self._cacheable_to_block = -1
+
+        # Endpoints in use and their health/rate limits, reset on every start
+        self._endpoints: List[str] = list(options.thor_endpoints)
+        self._endpoint_health: Dict[str, EndpointHealth] = {}
+        self._rate_limiters: Dict[str, TokenBucket] = {}
+
+        # Request, stage and progress metrics, reset on every start
+        self._metrics = IndexerMetrics()
+
     # --------
     # Public API
     # --------
@@ -85,35 +160,98 @@ class EventIndexer(Generic[EDecoded, ETransformed]):
         with self._results_lock:
             return list(self._results)
 
+    @property
+    def result_count(self) -> int:
+        """Number of events produced, whether kept in memory or streamed to the sink"""
+        with self._results_lock:
+            return self._result_count
+
     def progress(self) -> Tuple[int, int]:
         """(completed_tasks, total_tasks)"""
         with self._progress_lock:
             return self._completed_tasks, self._total_tasks
 
+    def metrics(self) -> IndexerMetricsSnapshot:
+        """Snapshot of the metrics of the current (or last) run"""
+        completed_tasks, total_tasks = self.progress()
+        sink_writer = self._sink_writer
+        return self._metrics.snapshot(
+            events=self.result_count,
+            completed_tasks=completed_tasks,
+            total_tasks=total_tasks,
+            queued_tasks=self._tasks.qsize(),
+            pending_sink_batches=sink_writer.pending_batches if sink_writer else 0,
+        )
+
+    @property
+    def events_per_block(self) -> Optional[float]:
+        """Observed events per block (or the hint if nothing observed yet)"""
+        return self._density.events_per_block
+
     def start(self) -> None:
         if self.status not in (IndexerStatus.CREATED, IndexerStatus.STOPPED):
             raise RuntimeError(f"Cannot start Indexer in state {self.status}")
         logger.info("Starting indexing")
-        # get block start and end for round number
-        self.block_start, self.block_end = get_block_range_for_round(
-            self.options.round_number
+        self.block_ranges = merge_block_ranges(self.options.block_ranges)
+        self._metrics = IndexerMetrics(
+            self.options.thor_endpoints,
+            total_blocks=sum(end - start + 1 for start, end in self.block_ranges),
+        )
+        # the sink comes first, journaled events are streamed to it as they are read
+        if self.options.event_sink is not None:
+            self._sink_writer = SinkWriter(
+                self.options.event_sink,
+                write_observer=lambda secs: self._metrics.add_stage_secs("sink", secs),
+            )
+        try:
+            completed_ranges = self._init_checkpoint()
+            # thor is only asked (probes, finalized block) if some blocks are fetched
+            fetch_ranges = self._ranges_to_fetch(completed_ranges)
+            self._init_endpoints(probe=bool(fetch_ranges))
+            self._init_raw_event_cache(fetch_ranges)
+            self._init_density()
+            self._build_task_queue(completed_ranges)
+            if self.options.decode_processes > 0:
+                self._decode_stage = DecodeStage(
+                    self.options.decode_processes,
+                    self.options.event_decoder,
+                    self.options.batch_event_decoder,
+                    self.options.event_transformer,
+                    initializer=self.options.decode_process_initializer,
+                    initargs=self.options.decode_process_initargs,
+                )
+        except BaseException:
+            self._finish_sink(IndexerStatus.FAILED)
+            raise
+        self._metrics.record_resumed(
+            sum(end - start + 1 for start, end in completed_ranges), self.result_count
         )
-        self._build_task_queue()
         with self._status_lock:
             self._status = IndexerStatus.RUNNING
             self._error = None
         self._stop_event.clear()
         self._threads = []
 
-        for i, endpoint in enumerate(self.options.thor_endpoints):
+        if self.options.async_mode:
             t = threading.Thread(
-                target=self._worker_loop,
-                name=f"indexer-worker-{i}",
-                args=(endpoint,),
+                target=self._run_async_loop,
+                name="indexer-async",
                 daemon=True,
             )
             self._threads.append(t)
             t.start()
+            return
+
+        for i, endpoint in enumerate(self._endpoints):
+            for slot in range(self.options.max_requests_in_flight_per_endpoint):
+                t = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"indexer-worker-{i}-{slot}",
+                    args=(endpoint, slot),
+                    daemon=True,
+                )
+                self._threads.append(t)
+                t.start()
 
         # Optionally: a monitor thread could be used, but wait() can do it too.
 
@@ -127,22 +265,33 @@ class EventIndexer(Generic[EDecoded, ETransformed]):
     def wait(self, timeout: Optional[float] = None) -> IndexerStatus:
         """
         Block until all work is done, failed, or stopped.
-        Returns final status.
+        Returns final status, or the current status if timeout (secs) expired first.
         """
-        # Join worker threads
+        # Join worker threads, the timeout is for all of them
+        deadline = None if timeout is None else time.monotonic() + timeout
         for t in self._threads:
-            t.join(timeout=timeout)
+            remaining = (
+                None if deadline is None else max(0.0, deadline - time.monotonic())
+            )
+            t.join(timeout=remaining)
 
         # If still running after timeout, return current status
         # (threads may not be finished)
         if any(t.is_alive() for t in self._threads):
             return self.status
 
+        # pages still decoding only matter if the run did not complete
+        self._finish_decode_stage()
+        self._save_density()
+
         # All threads finished: if still RUNNING, we completed successfully
         with self._status_lock:
             if self._status == IndexerStatus.RUNNING:
                 self._status = IndexerStatus.COMPLETED
-            return self._status
+            status = self._status
+
+        self._finish_sink(status)
+        return self.status
 
     def write_to_csv_file(self, filename: str) -> None:
         """
@@ -154,10 +303,9 @@ class EventIndexer(Generic[EDecoded, ETransformed]):
             )
         logger.info(f"Writing csv file {filename}")
         with self._results_lock:
-            records = [asdict(e) for e in self._results]
-            df = pd.json_normalize(
-                records, sep="_"
-            )  # want to flattern any nested Dicts to new columns
+            # nested dicts are flattened to new columns
+            records = [event_to_record(e) for e in self._results]
+            df = pd.DataFrame.from_records(records)
             df.to_csv(filename, index=False)
 
     def clear_results(self) -> None:
@@ -169,99 +317,808 @@ class EventIndexer(Generic[EDecoded, ETransformed]):
                 raise RuntimeError("Cannot clear results while indexing is in progress")
         with self._results_lock:
             self._results.clear()
+            self._result_count = 0
 
     # --------
     # Internals
     # --------
 
-    def _build_task_queue(self) -> None:
+    def _build_task_queue(self, completed_ranges: List[BlockRange]) -> None:
         # Clear any previous queue contents by replacing the queue
         self._tasks = queue.Queue()
 
-        start = self.block_start
-        end = self.block_end
-        step = self.options.task_block_size
+        step = self._task_block_size()
 
         tasks = 0
-        b = start
-        while b <= end:
-            chunk_end = min(b + step - 1, end)
-            self._tasks.put(IndexerTask(start_block=b, end_block=chunk_end))
-            tasks += 1
-            b = chunk_end + 1
+        for block_start, block_end in self.block_ranges:
+            for start, end in subtract_block_ranges(
+                block_start, block_end, completed_ranges
+            ):
+                b = start
+                while b <= end:
+                    chunk_end = min(b + step - 1, end)
+                    self._tasks.put(IndexerTask(start_block=b, end_block=chunk_end))
+                    tasks += 1
+                    b = chunk_end + 1
 
+        # journaled tasks count as already completed
         with self._progress_lock:
-            self._total_tasks = tasks
-            self._completed_tasks = 0
+            self._total_tasks = tasks + len(completed_ranges)
+            self._completed_tasks = len(completed_ranges)
 
-        logger.info(f"Created {self._total_tasks} indexing tasks")
+        logger.info(f"Created {tasks} indexing tasks of {step} blocks")
 
-        # Add sentinels (one per worker) for clean shutdown
-        for _ in self.options.thor_endpoints:
-            self._tasks.put(IndexerTask(-1, -1))  # sentinel
+    def _ranges_to_fetch(self, completed_ranges: List[BlockRange]) -> List[BlockRange]:
+        """
+        Returns the block ranges that are neither journaled nor in the raw event cache
+        """
+        cache = self.options.raw_event_cache
+        fetch_ranges: List[BlockRange] = []
+        for block_start, block_end in self.block_ranges:
+            for start, end in subtract_block_ranges(
+                block_start, block_end, completed_ranges
+            ):
+                if cache is None:
+                    fetch_ranges.append((start, end))
+                    continue
+                fetch_ranges.extend(
+                    cache.missing_ranges(
+                        self.options.contract_address, self.options.topic0, start, end
+                    )
+                )
+        return fetch_ranges
+
+    def _init_endpoints(self, probe: bool) -> None:
+        """
+        Sets up health tracking and rate limits for the endpoints
+        If probing (and probe_endpoints is set), endpoints that do not respond
+        are dropped and the rest are ordered fastest first
+        """
+        self._endpoints = list(self.options.thor_endpoints)
+        self._endpoint_health = {
+            endpoint: EndpointHealth(
+                endpoint,
+                error_rate_threshold=self.options.endpoint_error_rate_threshold,
+                bench_secs=self.options.endpoint_bench_secs,
+            )
+            for endpoint in self._endpoints
+        }
+        self._rate_limiters = {
+            endpoint: TokenBucket(
+                rate=1 / self.options.delay_between_thor_requests,
+                capacity=self.options.max_requests_in_flight_per_endpoint,
+            )
+            for endpoint in self._endpoints
+        }
+        if probe and self.options.probe_endpoints:
+            self._endpoints = self._probe_endpoints()
+
+    def _probe_endpoints(self) -> List[str]:
+        """
+        Asks every endpoint for its best block, measuring the latency
+        Returns the endpoints that responded, fastest first
+        """
+
+        def probe(endpoint: str) -> bool:
+            thor_client = ThorClient(self._thor_client_options(endpoint))
+            try:
+                thor_client.get_block_number("best")
+                return True
+            except Exception as e:
+                logger.warning(f"Dropping endpoint {endpoint}, probe failed: {e!r}")
+                return False
+            finally:
+                thor_client.dispose()
+
+        with ThreadPoolExecutor(max_workers=len(self._endpoints)) as pool:
+            alive = list(pool.map(probe, self._endpoints))
+        endpoints = [e for e, ok in zip(self._endpoints, alive) if ok]
+        if not endpoints:
+            raise RuntimeError("No thor endpoint responded to the probe")
+        endpoints.sort(key=lambda e: self._endpoint_health[e].latency_secs or 0.0)
+        for endpoint in endpoints:
+            latency = self._endpoint_health[endpoint].latency_secs or 0.0
+            logger.info(f"Endpoint {endpoint} probe latency {latency * 1000:.0f}ms")
+        return endpoints
+
+    def _thor_client_options(self, endpoint: str) -> ThorClientOptions:
+        """
+        Client options for an endpoint, reporting successful requests to its health
+        and the run metrics
+        """
+        health = self._endpoint_health[endpoint]
+        metrics = self._metrics
+
+        def observe(elapsed: float, response: httpx.Response) -> None:
+            health.record_success(elapsed)
+            metrics.observe_request(endpoint, elapsed, response)
+
+        return ThorClientOptions(thor_url=endpoint, request_observer=observe)
+
+    def _init_checkpoint(self) -> List[BlockRange]:
+        """
+        Starts or resumes the checkpoint journal
+        When resuming, previous results are dropped as the journal holds
+        everything completed so far. The events of every journaled task are
+        contributed as a batch of their own while the journal is read.
+        Returns the block ranges already completed
+        """
+        checkpoint = self.options.checkpoint
+        if checkpoint is None:
+            return []
+        header = CheckpointHeader(
+            format_version=CHECKPOINT_FORMAT_VERSION,
+            contract_address=self.options.contract_address,
+            topic0=self.options.topic0,
+            block_ranges=tuple(self.block_ranges),
+        )
+        if not self.options.resume_from_checkpoint:
+            checkpoint.begin(header)
+            return []
+        with self._results_lock:
+            self._results = []
+            self._result_count = 0
+        completed_ranges: List[BlockRange] = []
+        for block_range, events in checkpoint.resume(header):
+            completed_ranges.append(block_range)
+            self._contribute_results(events)
+        return completed_ranges
+
+    def _init_raw_event_cache(self, fetch_ranges: List[BlockRange]) -> None:
+        """
+        Finds the last block that can be cached (finalized)
+        Only asks thor if some blocks are fetched (see _ranges_to_fetch)
+        """
+        self._cacheable_to_block = -1
+        cache = self.options.raw_event_cache
+        if cache is None:
+            return
+        if not fetch_ranges:
+            logger.info("All blocks are cached, no events will be fetched from thor")
+            return
+        thor_client = ThorClient(self._thor_client_options(self._endpoints[0]))
+        try:
+            self._cacheable_to_block = thor_client.get_block_number("finalized")
+        finally:
+            thor_client.dispose()
+        logger.info(f"Caching raw events up to block {self._cacheable_to_block}")
+
+    def _init_density(self) -> None:
+        """
+        Without a hint or observations, starts from the events per block saved
+        in the raw event cache by an earlier run
+        """
+        cache = self.options.raw_event_cache
+        if cache is None or self._density.events_per_block is not None:
+            return
+        saved = cache.get_events_per_block(
+            self.options.contract_address, self.options.topic0
+        )
+        if saved is not None:
+            logger.info(f"Sizing tasks for {saved:.2f} events per block seen before")
+            self._density = EventDensity(saved)
+
+    def _save_density(self) -> None:
+        """
+        Saves the observed events per block in the raw event cache for later runs
+        """
+        cache = self.options.raw_event_cache
+        observed = self._density.observed_events_per_block
+        if cache is None or observed is None:
+            return
+        cache.put_events_per_block(
+            self.options.contract_address, self.options.topic0, observed
+        )
+
+    def _task_block_size(self) -> int:
+        """
+        Block size for new tasks
+        In split mode this is learnt from the observed event density,
+        capped so that every worker still gets a task
+        """
+        step = self.options.task_block_size
+        if not self.options.split_full_pages:
+            return step
+        hint = self._density.suggest_block_size(
+            self.options.max_events_per_thor_request
+        )
+        if hint is None:
+            return step
+        workers = (
+            len(self._endpoints) * self.options.max_requests_in_flight_per_endpoint
+        )
+        blocks = sum(end - start + 1 for start, end in self.block_ranges)
+        return max(1, min(hint, math.ceil(blocks / workers)))
 
     # ------------
     # Worker Loop
     # ------------
 
-    def _worker_loop(self, endpoint: str) -> None:
+    def _worker_loop(self, endpoint: str, slot: int) -> None:
         # create a thor client
-        thor_client_options = ThorClientOptions(thor_url=endpoint)
+        thor_client_options = self._thor_client_options(endpoint)
         thor_client = ThorClient(thor_client_options)
+        health = self._endpoint_health[endpoint]
+        rate_limiter = self._rate_limiters[endpoint]
         try:
-            # loop until cancelled or sentinal task reached
+            # loop until cancelled or all tasks completed
             while not self._stop_event.is_set():
-                task = self._tasks.get()
-
+                if not self._is_slot_active(endpoint, slot):
+                    if self._all_tasks_completed():
+                        return
+                    time.sleep(self._QUEUE_POLL_SECS)
+                    continue
                 try:
-                    # Sentinel means "no more work"
-                    if task.start_block == -1 and task.end_block == -1:
+                    task = self._tasks.get(timeout=self._QUEUE_POLL_SECS)
+                except queue.Empty:
+                    # queue can be refilled by split tasks still in progress
+                    if self._all_tasks_completed():
                         return
+                    continue
 
-                    # Get raw events from thor with decoder
-                    raw_events = thor_client.get_events(
-                        from_block=task.start_block,
-                        to_block=task.end_block,
-                        contract_address=self.options.contract_address,
-                        topic0=self.options.topic0,
-                        max_events_per_request=self.options.max_events_per_thor_request,
-                        delay_between_requests=self.options.delay_between_thor_requests,
+                try:
+                    if self._serve_cached_task(task):
+                        continue
+                    if self._hand_back_failed_task(task, endpoint):
+                        time.sleep(self._QUEUE_POLL_SECS)
+                        continue
+
+                    raw_events = self._fetch_task_with_retries(
+                        thor_client, rate_limiter, health, task
                     )
+                    if raw_events is None:
+                        continue
 
-                    # decode the raw events
-                    decoded_events = [
-                        self.options.event_decoder(raw_event)
-                        for raw_event in raw_events
-                    ]
-
-                    # transform decoded events to final type
-                    trans_events = [
-                        self.options.event_transformer(decoded_event)
-                        for decoded_event in decoded_events
-                    ]
-                    # remove any None values - where transformer couldnt transform
-                    cleaned_trans_events = [e for e in trans_events if e is not None]
-                    raw_events = []
-                    decoded_events = []
-                    trans_events = []
-
-                    # Contribute results (shared structure)
-                    if cleaned_trans_events:
-                        with self._results_lock:
-                            self._results.extend(cleaned_trans_events)
-
-                    # Progress tracking
-                    with self._progress_lock:
-                        self._completed_tasks += 1
+                    self._complete_fetched_task(task, raw_events)
 
                 finally:
                     self._tasks.task_done()
 
         except BaseException as e:
-            # Mark failed and stop all workers
-            with self._status_lock:
-                self._status = IndexerStatus.FAILED
-                self._error = e
-            self._stop_event.set()
+            self._fail(e)
         finally:
             thor_client.dispose()
+
+    def _fetch_task_with_retries(
+        self,
+        thor_client: ThorClient,
+        rate_limiter: TokenBucket,
+        health: EndpointHealth,
+        task: IndexerTask,
+    ) -> Optional[Sequence[RawEvent]]:
+        """
+        Fetches the raw events of the task, retrying transient errors with backoff
+        Returns None if the task was split or handed over to another endpoint
+        """
+        attempt = task.errors_on(health.endpoint)
+        while True:
+            started = time.perf_counter()
+            try:
+                # the backoff sleep is not fetch time
+                try:
+                    raw_events = self._fetch_task(thor_client, rate_limiter, task)
+                finally:
+                    self._metrics.add_stage_secs("fetch", time.perf_counter() - started)
+                if raw_events is not None:
+                    health.record_events(len(raw_events))
+                return raw_events
+            except Exception as e:
+                attempt += 1
+                delay = self._retry_delay(health, task, e, attempt)
+                if delay is None:
+                    return None
+                time.sleep(delay)
+
+    def _fetch_task(
+        self, thor_client: ThorClient, rate_limiter: TokenBucket, task: IndexerTask
+    ) -> Optional[Sequence[RawEvent]]:
+        """
+        Fetches the raw events of the task from thor
+        Returns None if the task was split
+        """
+        if self.options.split_full_pages:
+            raw_events = thor_client.get_events_page(
+                from_block=task.start_block,
+                to_block=task.end_block,
+                contract_address=self.options.contract_address,
+                topic0=self.options.topic0,
+                max_events_per_request=self.options.max_events_per_thor_request,
+                delay_between_requests=0,
+                rate_limiter=rate_limiter,
+            )
+            if self._split_full_task(task, raw_events):
+                return None
+            if not self._is_full_page(raw_events):
+                return raw_events
+            # a single block cannot be split, page through it
+
+        return thor_client.get_events(
+            from_block=task.start_block,
+            to_block=task.end_block,
+            contract_address=self.options.contract_address,
+            topic0=self.options.topic0,
+            max_events_per_request=self.options.max_events_per_thor_request,
+            delay_between_requests=0,
+            rate_limiter=rate_limiter,
+        )
+
+    # ------------
+    # Async Engine
+    # ------------
+
+    def _run_async_loop(self) -> None:
+        try:
+            asyncio.run(self._async_main())
+        except BaseException as e:
+            self._fail(e)
+
+    async def _async_main(self) -> None:
+        """
+        Runs max_requests_in_flight_per_endpoint workers for every endpoint
+        Workers of the same endpoint share one http client and one token bucket
+        """
+        clients: List[AsyncThorClient] = []
+        workers = []
+        try:
+            for endpoint in self._endpoints:
+                client = AsyncThorClient(self._thor_client_options(endpoint))
+                clients.append(client)
+                for slot in range(self.options.max_requests_in_flight_per_endpoint):
+                    workers.append(self._async_worker(endpoint, slot, client))
+            await asyncio.gather(*workers)
+        finally:
+            for client in clients:
+                await client.dispose()
+
+    async def _async_worker(
+        self, endpoint: str, slot: int, thor_client: AsyncThorClient
+    ) -> None:
+        health = self._endpoint_health[endpoint]
+        rate_limiter = self._rate_limiters[endpoint]
+        try:
+            # loop until cancelled or all tasks completed
+            while not self._stop_event.is_set():
+                if not self._is_slot_active(endpoint, slot):
+                    if self._all_tasks_completed():
+                        return
+                    await asyncio.sleep(self._QUEUE_POLL_SECS)
+                    continue
+                try:
+                    task = self._tasks.get_nowait()
+                except queue.Empty:
+                    # queue can be refilled by split tasks still in progress
+                    if self._all_tasks_completed():
+                        return
+                    await asyncio.sleep(self._QUEUE_POLL_SECS)
+                    continue
+
+                try:
+                    # cache access, decoding and journaling block, so they run
+                    # in a thread and requests in flight keep going
+                    if await asyncio.to_thread(self._serve_cached_task, task):
+                        continue
+                    if self._hand_back_failed_task(task, endpoint):
+                        await asyncio.sleep(self._QUEUE_POLL_SECS)
+                        continue
+
+                    raw_events = await self._fetch_task_with_retries_async(
+                        thor_client, rate_limiter, health, task
+                    )
+                    if raw_events is None:
+                        continue
+
+                    await asyncio.to_thread(
+                        self._complete_fetched_task, task, raw_events
+                    )
+
+                finally:
+                    self._tasks.task_done()
+
+        except BaseException as e:
+            self._fail(e)
+
+    async def _fetch_task_with_retries_async(
+        self,
+        thor_client: AsyncThorClient,
+        rate_limiter: TokenBucket,
+        health: EndpointHealth,
+        task: IndexerTask,
+    ) -> Optional[Sequence[RawEvent]]:
+        """
+        Async version of _fetch_task_with_retries
+        """
+        attempt = task.errors_on(health.endpoint)
+        while True:
+            started = time.perf_counter()
+            try:
+                try:
+                    raw_events = await self._fetch_task_async(
+                        thor_client, rate_limiter, task
+                    )
+                finally:
+                    self._metrics.add_stage_secs("fetch", time.perf_counter() - started)
+                if raw_events is not None:
+                    health.record_events(len(raw_events))
+                return raw_events
+            except Exception as e:
+                attempt += 1
+                delay = self._retry_delay(health, task, e, attempt)
+                if delay is None:
+                    return None
+                await asyncio.sleep(delay)
+
+    async def _fetch_task_async(
+        self, thor_client: AsyncThorClient, rate_limiter: TokenBucket, task: IndexerTask
+    ) -> Optional[Sequence[RawEvent]]:
+        """
+        Async version of _fetch_task
+        """
+        if self.options.split_full_pages:
+            raw_events = await thor_client.get_events_page(
+                from_block=task.start_block,
+                to_block=task.end_block,
+                contract_address=self.options.contract_address,
+                topic0=self.options.topic0,
+                max_events_per_request=self.options.max_events_per_thor_request,
+                rate_limiter=rate_limiter,
+            )
+            if self._split_full_task(task, raw_events):
+                return None
+            if not self._is_full_page(raw_events):
+                return raw_events
+            # a single block cannot be split, page through it
+
+        return await thor_client.get_events(
+            from_block=task.start_block,
+            to_block=task.end_block,
+            contract_address=self.options.contract_address,
+            topic0=self.options.topic0,
+            max_events_per_request=self.options.max_events_per_thor_request,
+            rate_limiter=rate_limiter,
+        )
+
+    # ------------
+    # Retries
+    # ------------
+
+    def _retry_delay(
+        self,
+        health: EndpointHealth,
+        task: IndexerTask,
+        error: Exception,
+        attempt: int,
+    ) -> Optional[float]:
+        """
+        Decides what to do after a failed fetch
+        Returns the backoff delay (secs) before retrying on the same endpoint,
+        or None if the task was put back on the queue for any endpoint (the
+        endpoint is benched) or handed over to another endpoint (the endpoint
+        used up its retries).
+        Raises the error if it is not transient or every endpoint used up its
+        retries on the task.
+        """
+        if not is_transient_thor_error(error):
+            self._metrics.record_error(health.endpoint, retried=False)
+            raise error
+        if health.record_failure():
+            logger.warning(
+                f"Benching endpoint {health.endpoint} for "
+                f"{self.options.endpoint_bench_secs}s due to high error rate"
+            )
+        retries_left = attempt <= self.options.max_retries_per_endpoint
+        if retries_left and not health.is_benched():
+            delay = min(
+                self._MAX_RETRY_BACKOFF_SECS,
+                self.options.retry_backoff_secs * 2 ** (attempt - 1),
+            ) * random.uniform(0.5, 1.5)
+            logger.warning(
+                f"Retrying blocks {task.start_block}-{task.end_block} on "
+                f"{health.endpoint} in {delay:.2f}s: {error!r}"
+            )
+            self._metrics.record_error(health.endpoint, retried=True)
+            return delay
+        self._metrics.record_error(health.endpoint, retried=False)
+        if retries_left:
+            # benched: another endpoint, or this one once back, takes the task
+            logger.warning(
+                f"Requeueing blocks {task.start_block}-{task.end_block} while "
+                f"{health.endpoint} is benched"
+            )
+            self._tasks.put(task.with_errors_on(health.endpoint, attempt))
+            return None
+        task = task.given_up_by(health.endpoint)
+        if set(self._endpoints) <= set(task.failed_endpoints):
+            logger.error(
+                f"All endpoints failed blocks {task.start_block}-{task.end_block}"
+            )
+            raise error
+        logger.warning(
+            f"Handing blocks {task.start_block}-{task.end_block} to another endpoint "
+            f"after {attempt} attempts on {health.endpoint}"
+        )
+        self._tasks.put(task)
+        return None
+
+    # ------------
+    # Scheduling
+    # ------------
+
+    def _is_slot_active(self, endpoint: str, slot: int) -> bool:
+        """
+        Whether a worker slot of the endpoint may take tasks
+        Benched endpoints take none. Otherwise the endpoint gets a share of
+        max_requests_in_flight_per_endpoint in proportion to its score
+        relative to the best scoring endpoint, always at least one.
+        """
+        health = self._endpoint_health[endpoint]
+        if health.is_benched():
+            return False
+        if slot == 0:
+            return True
+        score = health.score
+        if score is None:
+            return True
+        best_score = max(
+            (
+                other.score or 0.0
+                for other in (self._endpoint_health[e] for e in self._endpoints)
+                if not other.is_benched()
+            ),
+            default=score,
+        )
+        if best_score <= 0:
+            return True
+        window = max(
+            1,
+            round(
+                self.options.max_requests_in_flight_per_endpoint * score / best_score
+            ),
+        )
+        return slot < window
+
+    def _hand_back_failed_task(self, task: IndexerTask, endpoint: str) -> bool:
+        """
+        Puts a task back on the queue if this endpoint already gave up on it
+        Returns True if the task was put back
+        """
+        if endpoint not in task.failed_endpoints:
+            return False
+        self._tasks.put(task)
+        return True
+
+    # ------------
+    # Shared helpers
+    # ------------
+
+    def _all_tasks_completed(self) -> bool:
+        with self._progress_lock:
+            return self._completed_tasks >= self._total_tasks
+
+    def _is_full_page(self, raw_events: Sequence[RawEvent]) -> bool:
+        return len(raw_events) >= self.options.max_events_per_thor_request
+
+    def _split_full_task(self, task: IndexerTask, page: Sequence[RawEvent]) -> bool:
+        """
+        Splits the task in half by block range if its first page came back full
+        Both halves go back on the queue so any worker can pick them up
+        Returns True if the task was split
+        """
+        if not self._is_full_page(page) or task.start_block == task.end_block:
+            return False
+        mid = (task.start_block + task.end_block) // 2
+        # count the extra task before queueing, so no worker sees the queue
+        # empty with all tasks completed while the halves are being added
+        with self._progress_lock:
+            self._total_tasks += 1
+        self._tasks.put(IndexerTask(start_block=task.start_block, end_block=mid))
+        self._tasks.put(IndexerTask(start_block=mid + 1, end_block=task.end_block))
+        return True
+
+    def _serve_cached_task(self, task: IndexerTask) -> bool:
+        """
+        Processes the task from the raw event cache if it is fully cached, or
+        splits it if it is partially cached
+        Returns True if the task was handled without fetching
+        """
+        cached_events = self._read_cached_task(task)
+        if cached_events is not None:
+            self._process_raw_events(task, cached_events)
+            return True
+        return self._split_partially_cached_task(task)
+
+    def _complete_fetched_task(
+        self, task: IndexerTask, raw_events: Sequence[RawEvent]
+    ) -> None:
+        """
+        Caches and processes the raw events fetched for the task
+        """
+        self._store_cached_task(task, raw_events)
+        self._process_raw_events(task, raw_events)
+
+    def _read_cached_task(self, task: IndexerTask) -> Optional[Sequence[RawEvent]]:
+        """
+        Returns the cached events of the task, or None if it is not fully cached
+        """
+        cache = self.options.raw_event_cache
+        if cache is None:
+            return None
+        if cache.missing_ranges(
+            self.options.contract_address,
+            self.options.topic0,
+            task.start_block,
+            task.end_block,
+        ):
+            return None
+        return cache.get_events(
+            self.options.contract_address,
+            self.options.topic0,
+            task.start_block,
+            task.end_block,
+        )
+
+    def _split_partially_cached_task(self, task: IndexerTask) -> bool:
+        """
+        Splits a partially cached task into its cached and uncached block ranges
+        All parts go back on the queue, so each task is either fully cached or
+        not at all
+        Returns True if the task was split
+        """
+        cache = self.options.raw_event_cache
+        if cache is None:
+            return False
+        missing = cache.missing_ranges(
+            self.options.contract_address,
+            self.options.topic0,
+            task.start_block,
+            task.end_block,
+        )
+        if missing == [(task.start_block, task.end_block)]:
+            return False
+        cached = subtract_block_ranges(task.start_block, task.end_block, missing)
+        parts = sorted(missing + cached)
+        # count the extra tasks before queueing (see _split_full_task)
+        with self._progress_lock:
+            self._total_tasks += len(parts) - 1
+        for start_block, end_block in parts:
+            self._tasks.put(IndexerTask(start_block=start_block, end_block=end_block))
+        return True
+
+    def _store_cached_task(
+        self, task: IndexerTask, raw_events: Sequence[RawEvent]
+    ) -> None:
+        """
+        Caches the fetched events of the task, up to the last finalized block
+        """
+        cache = self.options.raw_event_cache
+        if cache is None or task.start_block > self._cacheable_to_block:
+            return
+        end_block = min(task.end_block, self._cacheable_to_block)
+        events = raw_events
+        if events and events[-1].block_number > end_block:
+            # events are in block order, only a tail can be past the cacheable block
+            events = [e for e in raw_events if e.block_number <= end_block]
+        cache.put_events(
+            self.options.contract_address,
+            self.options.topic0,
+            task.start_block,
+            end_block,
+            events,
+        )
+
+    def _process_raw_events(
+        self, task: IndexerTask, raw_events: Sequence[RawEvent]
+    ) -> None:
+        """
+        Decodes and transforms the raw events of one fetched task, in the
+        decode stage if there is one, then completes the task
+        """
+        self._density.record(task.end_block - task.start_block + 1, len(raw_events))
+
+        decode_stage = self._decode_stage
+        if decode_stage is not None:
+            decode_stage.submit(
+                raw_events, lambda future: self._complete_decoded_task(task, future)
+            )
+            return
+
+        page = decode_and_transform(
+            self.options.event_decoder,
+            self.options.batch_event_decoder,
+            self.options.event_transformer,
+            raw_events,
+        )
+        self._complete_page(task, page)
+
+    def _complete_decoded_task(
+        self, task: IndexerTask, future: "Future[DecodedPage]"
+    ) -> None:
+        """
+        Completes a task decoded by the decode stage (runs on a pool thread)
+        """
+        if future.cancelled():
+            return
+        try:
+            self._complete_page(task, future.result())
+        except BaseException as e:
+            logger.error(
+                f"Error decoding blocks {task.start_block}-{task.end_block}: {e}"
+            )
+            self._fail(e)
+
+    def _complete_page(self, task: IndexerTask, page: DecodedPage) -> None:
+        """
+        Records the decode and transform time of a page and completes its task
+        """
+        self._metrics.add_stage_secs("decode", page.decode_secs)
+        self._metrics.add_stage_secs("transform", page.transform_secs)
+        self._complete_task(task, page.events)
+
+    def _complete_task(self, task: IndexerTask, events: Sequence[ETransformed]) -> None:
+        """
+        Journals the events of a task, contributes them to the shared results
+        and counts the task as completed
+        """
+        # Journal the completed task before it counts as done
+        if self.options.checkpoint is not None:
+            self.options.checkpoint.record(task, events)
+
+        self._contribute_results(events)
+
+        # Progress tracking
+        with self._progress_lock:
+            self._completed_tasks += 1
+        self._metrics.record_completed_blocks(task.end_block - task.start_block + 1)
+
+    def _contribute_results(self, events: Sequence[ETransformed]) -> None:
+        """
+        Streams events to the sink, or adds them to the shared results
+        """
+        if not events:
+            return
+        if self._sink_writer is not None:
+            self._sink_writer.submit(events)
+            with self._results_lock:
+                self._result_count += len(events)
+            return
+        with self._results_lock:
+            self._results.extend(events)
+            self._result_count += len(events)
+
+    def _finish_decode_stage(self) -> None:
+        """
+        Waits for pages still decoding after a completed run, drops them otherwise
+        """
+        decode_stage = self._decode_stage
+        if decode_stage is None:
+            return
+        self._decode_stage = None
+        if self.status == IndexerStatus.RUNNING:
+            decode_stage.close()
+        else:
+            decode_stage.abort()
+
+    def _finish_sink(self, status: IndexerStatus) -> None:
+        """
+        Closes the sink after a completed run, aborts it otherwise
+        """
+        sink_writer = self._sink_writer
+        if sink_writer is None:
+            return
+        self._sink_writer = None
+        if status != IndexerStatus.COMPLETED:
+            sink_writer.abort()
+            return
+        try:
+            sink_writer.close()
+        except BaseException as e:
+            logger.error(f"Error closing event sink: {e}")
+            self._fail(e)
+
+    def _fail(self, error: BaseException) -> None:
+        """
+        Mark failed and stop all workers
+        """
+        with self._status_lock:
+            self._status = IndexerStatus.FAILED
+            self._error = error
+        self._stop_event.set()
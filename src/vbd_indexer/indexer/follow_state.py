@@ -0,0 +1,71 @@
+import json
+import os
+from typing import Dict, Iterable, Optional
+
+from loguru import logger
+
+
+class FollowState:
+    """
+    Remembers how far a follow run has indexed: the last indexed block and
+    the size of every output file it appends to at that block
+    Output appended after the last save (e.g. by a poll that failed or a crash)
+    is rolled back by truncating the files to their saved sizes.
+    Saved as json, replaced atomically.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.last_block: Optional[int] = None
+        self.output_format: Optional[str] = None
+        self.file_sizes: Dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            self.last_block = saved["last_block"]
+            self.output_format = saved["output_format"]
+            self.file_sizes = saved["file_sizes"]
+
+    def save(
+        self, last_block: int, output_format: str, file_names: Iterable[str]
+    ) -> None:
+        """
+        Records the last indexed block and the current size of the output files
+        """
+        self.last_block = last_block
+        self.output_format = output_format
+        for file_name in file_names:
+            self.file_sizes[file_name] = os.path.getsize(file_name)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "last_block": self.last_block,
+                    "output_format": self.output_format,
+                    "file_sizes": self.file_sizes,
+                },
+                f,
+                indent=2,
+            )
+        os.replace(tmp_path, self.path)
+
+    def rollback(self, file_names: Iterable[str] = ()) -> None:
+        """
+        Truncates the saved output files to their saved sizes
+        Other given files were created after the last save and are removed
+        """
+        for file_name in set(self.file_sizes) | set(file_names):
+            if not os.path.exists(file_name):
+                continue
+            size = self.file_sizes.get(file_name)
+            if size is None:
+                logger.warning(
+                    f"Removing {file_name}, written after the last follow state"
+                )
+                os.remove(file_name)
+            elif os.path.getsize(file_name) > size:
+                logger.warning(f"Truncating {file_name} to the last follow state")
+                os.truncate(file_name, size)
@@ -0,0 +1,144 @@
+import os
+import pickle
+import threading
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Iterator, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from vbd_indexer.utils.block_ranges import BlockRange
+
+from .indexer_task import IndexerTask
+
+# bumped when the journal records change, including the events they hold,
+# journals of other versions are discarded
+CHECKPOINT_FORMAT_VERSION = 2
+
+
+@dataclass(frozen=True)
+class CheckpointHeader:
+    """
+    Identifies the indexing job a journal belongs to, and the journal format
+    """
+
+    format_version: int
+    contract_address: str
+    topic0: str
+    block_ranges: Tuple[BlockRange, ...]
+
+
+class IndexerCheckpoint:
+    """
+    Append-only journal of completed indexer tasks and their transformed events
+    Lets an interrupted or failed indexing job resume with only the unfinished
+    block ranges. Records are pickled one after another, a record cut short by a
+    crash is dropped on load.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+
+    def begin(self, header: CheckpointHeader) -> None:
+        """
+        Starts a new journal, discarding any previous one
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._close_file()
+            self._file = open(self.path, "wb")
+            pickle.dump(header, self._file)
+            self._file.flush()
+
+    def resume(
+        self, header: CheckpointHeader
+    ) -> Iterator[Tuple[BlockRange, List[Any]]]:
+        """
+        Yields the completed block ranges of the journal with their events, one
+        record at a time, then keeps appending to it. Starts a new journal if there
+        is none for the same job.
+        The journal is only reopened for appending once every record was read.
+        """
+        if not os.path.exists(self.path):
+            logger.info(f"No checkpoint found at {self.path}, starting from scratch")
+            self.begin(header)
+            return
+
+        completed = 0
+        with open(self.path, "rb") as f:
+            try:
+                saved_header = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError, ValueError, TypeError) as e:
+                logger.warning(f"Ignoring unreadable checkpoint header: {e}")
+                saved_header = None
+            good_offset = f.tell()
+            # headers before versioning have no format_version
+            saved_version = getattr(saved_header, "format_version", None)
+            if saved_header is not None and saved_version != header.format_version:
+                logger.warning(
+                    f"Checkpoint {self.path} has format version {saved_version}, "
+                    f"expected {header.format_version}, starting from scratch"
+                )
+                saved_header = None
+            while saved_header == header:
+                try:
+                    start_block, end_block, task_events = pickle.load(f)
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, TypeError) as e:
+                    logger.warning(f"Ignoring incomplete checkpoint record: {e}")
+                    break
+                good_offset = f.tell()
+                completed += 1
+                yield (start_block, end_block), task_events
+
+        if saved_header != header:
+            if saved_header is not None:
+                logger.warning(
+                    f"Checkpoint {self.path} is for another job, starting from scratch"
+                )
+            self.begin(header)
+            return
+
+        with self._lock:
+            self._close_file()
+            self._file = open(self.path, "r+b")
+            # drop any partial record left by a crash
+            self._file.truncate(good_offset)
+            self._file.seek(good_offset)
+        logger.info(f"Resumed from checkpoint with {completed} completed tasks")
+
+    def record(self, task: IndexerTask, events: Sequence[Any]) -> None:
+        """
+        Journals a completed task and its transformed events
+        """
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError("Checkpoint is not open, call begin() or resume()")
+            pickle.dump((task.start_block, task.end_block, list(events)), self._file)
+            self._file.flush()
+
+    def close(self) -> None:
+        """
+        Close the journal file, keeping it on disk
+        """
+        with self._lock:
+            self._close_file()
+
+    def discard(self) -> None:
+        """
+        Close and delete the journal, once its job results are safely written
+        """
+        with self._lock:
+            self._close_file()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
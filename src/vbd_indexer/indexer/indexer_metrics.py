@@ -0,0 +1,283 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+# upper bounds (secs) of the request latency histogram buckets, plus +Inf
+LATENCY_BUCKETS_SECS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# pipeline stages timed by the indexer: busy time summed over workers
+STAGES = ("fetch", "decode", "transform", "sink")
+
+
+@dataclass(frozen=True)
+class EndpointMetricsSnapshot:
+    """
+    Request counters of one thor endpoint
+    latency_buckets holds (upper bound secs, requests) per bucket, not cumulative
+    """
+
+    endpoint: str
+    requests: int
+    pages: int
+    bytes_received: int
+    errors: int
+    retries: int
+    latency_sum_secs: float
+    latency_buckets: Tuple[Tuple[float, int], ...]
+
+
+@dataclass(frozen=True)
+class IndexerMetricsSnapshot:
+    """
+    Point in time metrics of an indexer run
+    """
+
+    elapsed_secs: float
+    events: int
+    events_per_sec: float
+    completed_tasks: int
+    total_tasks: int
+    completed_blocks: int
+    total_blocks: int
+    queued_tasks: int
+    pending_sink_batches: int
+    # None until blocks were indexed in this run
+    eta_secs: Optional[float]
+    stage_secs: Dict[str, float]
+    endpoints: Tuple[EndpointMetricsSnapshot, ...]
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        for endpoint in data["endpoints"]:
+            endpoint["latency_buckets"] = [
+                ["+Inf" if upper_bound == float("inf") else upper_bound, count]
+                for upper_bound, count in endpoint["latency_buckets"]
+            ]
+        return json.dumps(data, indent=2)
+
+    def to_prometheus(self) -> str:
+        """
+        Prometheus text exposition format
+        """
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, samples: Sequence[Tuple[str, float]]) -> None:
+            lines.append(f"# TYPE vbd_indexer_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"vbd_indexer_{name}{labels} {value}")
+
+        metric("events_total", "counter", [("", self.events)])
+        metric("events_per_second", "gauge", [("", self.events_per_sec)])
+        metric("tasks_completed", "gauge", [("", self.completed_tasks)])
+        metric("tasks_total", "gauge", [("", self.total_tasks)])
+        metric("blocks_completed", "gauge", [("", self.completed_blocks)])
+        metric("blocks_total", "gauge", [("", self.total_blocks)])
+        metric("queued_tasks", "gauge", [("", self.queued_tasks)])
+        metric("pending_sink_batches", "gauge", [("", self.pending_sink_batches)])
+        if self.eta_secs is not None:
+            metric("eta_seconds", "gauge", [("", self.eta_secs)])
+        metric(
+            "stage_seconds_total",
+            "counter",
+            [(f'{{stage="{stage}"}}', secs) for stage, secs in self.stage_secs.items()],
+        )
+        for name, field in (
+            ("thor_requests_total", "requests"),
+            ("thor_pages_total", "pages"),
+            ("thor_received_bytes_total", "bytes_received"),
+            ("thor_errors_total", "errors"),
+            ("thor_retries_total", "retries"),
+        ):
+            metric(
+                name,
+                "counter",
+                [
+                    (f'{{endpoint="{e.endpoint}"}}', getattr(e, field))
+                    for e in self.endpoints
+                ],
+            )
+        lines.append("# TYPE vbd_indexer_thor_request_duration_seconds histogram")
+        for e in self.endpoints:
+            cumulative = 0
+            for upper_bound, count in e.latency_buckets:
+                cumulative += count
+                le = "+Inf" if upper_bound == float("inf") else str(upper_bound)
+                lines.append(
+                    f"vbd_indexer_thor_request_duration_seconds_bucket"
+                    f'{{endpoint="{e.endpoint}",le="{le}"}} {cumulative}'
+                )
+            lines.append(
+                f"vbd_indexer_thor_request_duration_seconds_sum"
+                f'{{endpoint="{e.endpoint}"}} {e.latency_sum_secs}'
+            )
+            lines.append(
+                f"vbd_indexer_thor_request_duration_seconds_count"
+                f'{{endpoint="{e.endpoint}"}} {e.requests}'
+            )
+        return "\n".join(lines) + "\n"
+
+    def progress_line(self) -> str:
+        """
+        One line summary, e.g. for a live progress display
+        """
+        percent = (
+            100 * self.completed_blocks / self.total_blocks if self.total_blocks else 0
+        )
+        eta = "--:--" if self.eta_secs is None else _format_secs(self.eta_secs)
+        busiest = max(self.stage_secs.items(), key=lambda item: item[1], default=None)
+        busiest_stage = f" busiest {busiest[0]}" if busiest and busiest[1] > 0 else ""
+        return (
+            f"{percent:5.1f}% blocks {self.completed_blocks}/{self.total_blocks} "
+            f"tasks {self.completed_tasks}/{self.total_tasks} "
+            f"(queued {self.queued_tasks}) "
+            f"{self.events} events {self.events_per_sec:,.0f}/s "
+            f"elapsed {_format_secs(self.elapsed_secs)} eta {eta}{busiest_stage}"
+        )
+
+
+def _format_secs(secs: float) -> str:
+    minutes, secs = divmod(int(secs), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def write_metrics_file(snapshot: IndexerMetricsSnapshot, path: str) -> None:
+    """
+    Writes the snapshot as prometheus text (.prom or .txt), json otherwise
+    The file is replaced atomically so scrapers never read a partial file
+    """
+    if path.endswith((".prom", ".txt")):
+        content = snapshot.to_prometheus()
+    else:
+        content = snapshot.to_json()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class _EndpointCounters:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.pages = 0
+        self.bytes_received = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_sum_secs = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS_SECS) + 1)
+
+
+class IndexerMetrics:
+    """
+    Counters of an indexer run, updated from the hot paths (thread-safe)
+    Updates are a lock and a few additions, snapshot() does the rest
+    """
+
+    def __init__(self, endpoints: Sequence[str] = (), total_blocks: int = 0) -> None:
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._endpoints = {endpoint: _EndpointCounters() for endpoint in endpoints}
+        self._stage_secs = {stage: 0.0 for stage in STAGES}
+        self._total_blocks = total_blocks
+        self._completed_blocks = 0
+        # work restored from a checkpoint does not count for the rates
+        self._resumed_blocks = 0
+        self._resumed_events = 0
+
+    def observe_request(
+        self, endpoint: str, elapsed_secs: float, response: httpx.Response
+    ) -> None:
+        """
+        Records a successful thor request, /logs/event requests are pages
+        """
+        bucket = bisect_left(LATENCY_BUCKETS_SECS, elapsed_secs)
+        is_page = response.request.url.path.endswith("/logs/event")
+        with self._lock:
+            counters = self._endpoints.setdefault(endpoint, _EndpointCounters())
+            counters.requests += 1
+            counters.pages += is_page
+            counters.bytes_received += response.num_bytes_downloaded
+            counters.latency_sum_secs += elapsed_secs
+            counters.latency_buckets[bucket] += 1
+
+    def record_error(self, endpoint: str, retried: bool) -> None:
+        """
+        Records a failed thor request, and whether it is retried on the same endpoint
+        """
+        with self._lock:
+            counters = self._endpoints.setdefault(endpoint, _EndpointCounters())
+            counters.errors += 1
+            counters.retries += retried
+
+    def record_resumed(self, blocks: int, events: int) -> None:
+        """
+        Records the blocks and events restored from a checkpoint
+        """
+        with self._lock:
+            self._completed_blocks += blocks
+            self._resumed_blocks += blocks
+            self._resumed_events += events
+
+    def add_stage_secs(self, stage: str, secs: float) -> None:
+        with self._lock:
+            self._stage_secs[stage] += secs
+
+    def record_completed_blocks(self, blocks: int) -> None:
+        with self._lock:
+            self._completed_blocks += blocks
+
+    def snapshot(
+        self,
+        events: int,
+        completed_tasks: int,
+        total_tasks: int,
+        queued_tasks: int,
+        pending_sink_batches: int,
+    ) -> IndexerMetricsSnapshot:
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            run_blocks = self._completed_blocks - self._resumed_blocks
+            eta = None
+            if run_blocks > 0:
+                remaining = max(0, self._total_blocks - self._completed_blocks)
+                eta = remaining * elapsed / run_blocks
+            run_events = events - self._resumed_events
+            return IndexerMetricsSnapshot(
+                elapsed_secs=elapsed,
+                events=events,
+                events_per_sec=run_events / elapsed if elapsed > 0 else 0.0,
+                completed_tasks=completed_tasks,
+                total_tasks=total_tasks,
+                completed_blocks=self._completed_blocks,
+                total_blocks=self._total_blocks,
+                queued_tasks=queued_tasks,
+                pending_sink_batches=pending_sink_batches,
+                eta_secs=eta,
+                stage_secs=dict(self._stage_secs),
+                endpoints=tuple(
+                    EndpointMetricsSnapshot(
+                        endpoint=endpoint,
+                        requests=c.requests,
+                        pages=c.pages,
+                        bytes_received=c.bytes_received,
+                        errors=c.errors,
+                        retries=c.retries,
+                        latency_sum_secs=c.latency_sum_secs,
+                        latency_buckets=tuple(
+                            zip(
+                                LATENCY_BUCKETS_SECS + (float("inf"),),
+                                c.latency_buckets,
+                            )
+                        ),
+                    )
+                    for endpoint, c in self._endpoints.items()
+                ),
+            )
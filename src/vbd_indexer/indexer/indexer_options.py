@@ -1,9 +1,13 @@
 from dataclasses import dataclass
-from typing import Callable, Generic, List, TypeVar
+from typing import Any, Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
 
 from vbd_indexer.indexer.decoded_event import DecodedEvent
+from vbd_indexer.indexer.indexer_checkpoint import IndexerCheckpoint
 from vbd_indexer.indexer.transformed_event import TransformedEvent
+from vbd_indexer.sinks.event_sink import EventSink
 from vbd_indexer.thor.raw_event import RawEvent
+from vbd_indexer.thor.raw_event_cache import RawEventCache
+from vbd_indexer.utils.block_ranges import BlockRange
 
 EDecoded = TypeVar("EDecoded", bound=DecodedEvent)
 ETransformed = TypeVar("ETransformed", bound=TransformedEvent)
@@ -15,7 +19,8 @@ class IndexerOptions(Generic[EDecoded, ETransformed]):
     Indexer options
     """
 
-    round_number: int
+    # block ranges to index (inclusive), overlapping ranges are indexed once
+    block_ranges: List[BlockRange]
     contract_address: str
     topic0: str
     thor_endpoints: List[str]
@@ -24,3 +29,41 @@ class IndexerOptions(Generic[EDecoded, ETransformed]):
     delay_between_thor_requests: float
     event_decoder: Callable[[RawEvent], EDecoded]
     event_transformer: Callable[[EDecoded], ETransformed | None]
+    # decodes a whole page at once, used instead of event_decoder when set
+    batch_event_decoder: Optional[Callable[[Sequence[RawEvent]], List[EDecoded]]] = None
+    # asyncio engine, keeps several requests in flight per endpoint
+    # delay_between_thor_requests then sets a per endpoint token-bucket rate
+    async_mode: bool = False
+    max_requests_in_flight_per_endpoint: int = 1
+    # split tasks that return a full page in half by block range, instead of
+    # paging through them with a growing offset
+    split_full_pages: bool = False
+    # expected events per block, used to size tasks before any are observed
+    # (defaults to the density saved in the raw_event_cache by earlier runs)
+    events_per_block_hint: Optional[float] = None
+    # raw events are served from here when cached, finalized ranges are stored
+    raw_event_cache: Optional[RawEventCache] = None
+    # completed tasks are journaled here, resume skips the journaled block ranges
+    checkpoint: Optional[IndexerCheckpoint] = None
+    resume_from_checkpoint: bool = False
+    # transient thor errors (timeouts, 429, 5xx) are retried with jittered
+    # exponential backoff, then the task is handed to another endpoint. The run
+    # fails once every endpoint used up its retries on a task. Unhealthy endpoints
+    # are benched long before (see below), so the retries cover bad luck: at a 30%
+    # error rate, 8 retries fail about one task in 50,000
+    max_retries_per_endpoint: int = 8
+    retry_backoff_secs: float = 0.5
+    # endpoints with a higher recent error rate are benched for a while, their
+    # failing tasks go back on the queue for any endpoint (this one once back)
+    endpoint_error_rate_threshold: float = 0.5
+    endpoint_bench_secs: float = 30.0
+    # check every endpoint responds before fetching, dropping dead ones
+    # (no probes when every block is cached or journaled)
+    probe_endpoints: bool = False
+    # stream transformed events to this sink instead of keeping them in memory
+    event_sink: Optional[EventSink] = None
+    # decode and transform pages in this many worker processes, 0 decodes in
+    # the fetch workers. The initializer sets up process-local state (caches)
+    decode_processes: int = 0
+    decode_process_initializer: Optional[Callable[..., None]] = None
+    decode_process_initargs: Tuple[Any, ...] = ()
@@ -1,7 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from typing import Tuple
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class IndexerTask:
     """
     Class to represent a unit of indexing work
@@ -9,3 +10,19 @@ class IndexerTask:
 
     start_block: int
     end_block: int
+    # endpoints that gave up on this task after repeated transient errors
+    failed_endpoints: Tuple[str, ...] = ()
+    # (endpoint, transient errors) of the endpoints that failed the task so far,
+    # kept while a benched endpoint puts the task back on the queue
+    endpoint_errors: Tuple[Tuple[str, int], ...] = ()
+
+    def errors_on(self, endpoint: str) -> int:
+        return dict(self.endpoint_errors).get(endpoint, 0)
+
+    def with_errors_on(self, endpoint: str, errors: int) -> "IndexerTask":
+        endpoint_errors = dict(self.endpoint_errors)
+        endpoint_errors[endpoint] = errors
+        return replace(self, endpoint_errors=tuple(endpoint_errors.items()))
+
+    def given_up_by(self, endpoint: str) -> "IndexerTask":
+        return replace(self, failed_endpoints=self.failed_endpoints + (endpoint,))
@@ -0,0 +1,169 @@
+from dataclasses import fields
+from decimal import ROUND_HALF_UP, Context, Decimal
+from typing import (
+    Any,
+    Dict,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# arrow decimal128 holds at most 38 digits
+_DECIMAL_PRECISION = 38
+_DECIMAL_CONTEXT = Context(prec=_DECIMAL_PRECISION)
+# decimal256 holds at most 76 digits
+_WIDE_DECIMAL_PRECISION = 76
+
+
+def arrow_schema_for(
+    event_type: type,
+    dict_keys: Mapping[str, Sequence[str]],
+    dictionary_fields: Sequence[str] = (),
+    decimal_scales: Mapping[str, int] = {},
+) -> pa.Schema:
+    """
+    Builds an arrow schema for the flattened records of an event dataclass
+    (see event_to_record), so every output file has the same column types
+      - int -> int64, str -> string, bool -> bool, float -> float64
+      - Decimal -> decimal128 with the scale given in decimal_scales
+      - Dict[str, X], Tuple[X, ...] or Tuple[Tuple[str, X], ...] -> one column per
+        key listed in dict_keys, named <field>_<key> (Tuple[X, ...] holds the values
+        in dict_keys order, Tuple[Tuple[str, X], ...] holds (key, value) pairs)
+    Fields listed in dictionary_fields are dictionary-encoded strings
+    """
+    schema_fields = []
+    hints = get_type_hints(event_type)
+    for field in fields(event_type):
+        field_type = hints[field.name]
+        value_type = _nested_value_type(field_type)
+        if value_type is not None:
+            for key in dict_keys[field.name]:
+                schema_fields.append(
+                    pa.field(
+                        f"{field.name}_{key}",
+                        _arrow_type(field.name, value_type, decimal_scales),
+                        nullable=False,
+                    )
+                )
+        elif field.name in dictionary_fields:
+            schema_fields.append(
+                pa.field(
+                    field.name, pa.dictionary(pa.int32(), pa.string()), nullable=False
+                )
+            )
+        else:
+            schema_fields.append(
+                pa.field(
+                    field.name,
+                    _arrow_type(field.name, field_type, decimal_scales),
+                    nullable=False,
+                )
+            )
+    return pa.schema(schema_fields)
+
+
+def nested_column_types(
+    event_type: type, decimal_scales: Mapping[str, int] = {}
+) -> Dict[str, pa.DataType]:
+    """
+    Arrow type of the columns of every nested field of an event dataclass, keyed
+    by their name prefix (<field>_), for keys not listed in the schema
+    """
+    hints = get_type_hints(event_type)
+    column_types = {}
+    for field in fields(event_type):
+        value_type = _nested_value_type(hints[field.name])
+        if value_type is not None:
+            column_types[f"{field.name}_"] = _arrow_type(
+                field.name, value_type, decimal_scales
+            )
+    return column_types
+
+
+def _nested_value_type(field_type: Any) -> Optional[Any]:
+    """
+    X of a Dict[str, X], Tuple[X, ...] or Tuple[Tuple[str, X], ...] field type,
+    None for other types
+    """
+    origin = get_origin(field_type)
+    if origin in (dict, Dict):
+        return get_args(field_type)[1]
+    if origin in (tuple, Tuple):
+        value_type = get_args(field_type)[0]
+        if get_origin(value_type) in (tuple, Tuple):
+            # (key, value) pairs
+            return get_args(value_type)[1]
+        return value_type
+    return None
+
+
+def _arrow_type(
+    name: str, python_type: Any, decimal_scales: Mapping[str, int]
+) -> pa.DataType:
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is str:
+        return pa.string()
+    if python_type is Decimal:
+        if name not in decimal_scales:
+            raise ValueError(f"No decimal scale given for field: {name}")
+        return pa.decimal128(_DECIMAL_PRECISION, decimal_scales[name])
+    raise TypeError(f"Unsupported type for arrow schema field {name}: {python_type}")
+
+
+def decimal_column(values: pa.ChunkedArray, scale: int) -> pa.ChunkedArray:
+    """
+    Converts a column of numbers or numeric strings to decimal128 with the scale
+    Values with more decimals are rounded half up, like ParquetEventSink does,
+    and nulls become 0
+    """
+    decimal_type = pa.decimal128(_DECIMAL_PRECISION, scale)
+    try:
+        if pa.types.is_floating(values.type):
+            converted = values.cast(decimal_type)
+        else:
+            # numeric strings and decimals may have more decimals than the scale:
+            # cast to a decimal with room for them, round, then narrow
+            wide_type = pa.decimal256(
+                _WIDE_DECIMAL_PRECISION,
+                _WIDE_DECIMAL_PRECISION - _DECIMAL_PRECISION + scale,
+            )
+            converted = pc.round(
+                values.cast(wide_type),
+                ndigits=scale,
+                round_mode="half_towards_infinity",
+            ).cast(decimal_type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # even more decimals (or a type arrow cannot cast), round each value
+        quantum = Decimal(1).scaleb(-scale)
+        converted = pa.chunked_array(
+            [
+                pa.array(
+                    [
+                        (
+                            None
+                            if v is None
+                            else Decimal(str(v)).quantize(
+                                quantum,
+                                rounding=ROUND_HALF_UP,
+                                context=_DECIMAL_CONTEXT,
+                            )
+                        )
+                        for v in values.to_pylist()
+                    ],
+                    type=decimal_type,
+                )
+            ]
+        )
+    return pc.fill_null(converted, pa.scalar(Decimal(0), decimal_type))
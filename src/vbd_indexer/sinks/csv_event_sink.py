@@ -0,0 +1,108 @@
+import csv
+import os
+from typing import IO, Any, Dict, List, Optional, Sequence
+
+from .event_sink import FileEventSink, event_to_record
+
+
+class CsvEventSink(FileEventSink):
+    """
+    Streams events to a CSV file, one flattened record per row
+    The header comes from the first events written. Records with new columns
+    start a part file with the wider header, the parts are merged into the file
+    on close and the rows written before get empty values. In append mode the
+    file is only replaced on close, so a run that fails never rewrites it (see
+    FollowState).
+    """
+
+    def __init__(self, filename: str, append: bool = False) -> None:
+        super().__init__(filename, append)
+        self._columns: Optional[List[str]] = None
+        if append and os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            # keep the existing header
+            with open(self.path, newline="") as f:
+                self._columns = next(csv.reader(f))
+        self._file: IO[str] = open(self.path, "a" if append else "w", newline="")
+        self._writer: Optional[csv.DictWriter] = None
+        # files written before the current one, self.path first, merged on close
+        self._parts: List[str] = []
+
+    def write(self, events: Sequence[Any]) -> None:
+        if not events:
+            return
+        records = [event_to_record(e) for e in events]
+        if self._writer is None:
+            write_header = self._columns is None
+            if self._columns is None:
+                self._columns = _record_columns(records, [])
+            self._writer = csv.DictWriter(self._file, fieldnames=self._columns)
+            if write_header:
+                self._writer.writeheader()
+        new_columns = _record_columns(records, self._columns)
+        if new_columns:
+            self._widen(new_columns)
+        self._writer.writerows(records)
+
+    def _widen(self, new_columns: List[str]) -> None:
+        """
+        Continues in a new part file with the new columns
+        """
+        columns = (self._columns or []) + new_columns
+        self._file.close()
+        self._parts.append(self._file.name)
+        self._file = open(f"{self.path}.part{len(self._parts)}", "w", newline="")
+        self._columns = columns
+        self._writer = csv.DictWriter(self._file, fieldnames=columns)
+        self._writer.writeheader()
+
+    def _merge_parts(self) -> None:
+        """
+        Writes the rows of every part under the final header, then replaces the file
+        Columns only get added at the end, the rows of a part are padded
+        """
+        columns = self._columns or []
+        merged_path = f"{self.path}.widened"
+        with open(merged_path, "w", newline="") as dst:
+            writer = csv.writer(dst)
+            writer.writerow(columns)
+            for part in self._parts:
+                with open(part, newline="") as src:
+                    reader = csv.reader(src)
+                    next(reader, None)
+                    for row in reader:
+                        writer.writerow(row + [""] * (len(columns) - len(row)))
+        for part in self._parts[1:]:
+            os.remove(part)
+        os.replace(merged_path, self.path)
+        self._parts = []
+
+    def abort(self) -> None:
+        self._file.close()
+        if self._parts:
+            # the part files, the file itself is left to FileEventSink
+            for part in self._parts[1:] + [self._file.name]:
+                os.remove(part)
+            self._parts = []
+        super().abort()
+
+    def _close_file(self) -> None:
+        if self._file.closed:
+            return
+        self._file.close()
+        if self._parts:
+            self._parts.append(self._file.name)
+            self._merge_parts()
+
+
+def _record_columns(records: Sequence[Dict[str, Any]], columns: List[str]) -> List[str]:
+    """
+    Columns of the records that are not in columns, in order of appearance
+    """
+    known = set(columns)
+    new_columns = []
+    for record in records:
+        for name in record:
+            if name not in known:
+                known.add(name)
+                new_columns.append(name)
+    return new_columns
@@ -0,0 +1,81 @@
+import os
+from abc import ABC, abstractmethod
+from dataclasses import asdict, is_dataclass
+from typing import Any, Dict, Sequence
+
+
+def event_to_record(event: Any) -> Dict[str, Any]:
+    """
+    Flattens an event dataclass to a single level record
+    Events can define to_record() to control their exported fields
+    Nested dict fields become one column per key, joined with "_" (e.g. impact_carbon)
+    """
+    record: Dict[str, Any] = {}
+    if hasattr(event, "to_record"):
+        fields = event.to_record()
+    else:
+        fields = asdict(event) if is_dataclass(event) else dict(event)
+    for name, value in fields.items():
+        if isinstance(value, dict):
+            for key, nested_value in value.items():
+                record[f"{name}_{key}"] = nested_value
+        else:
+            record[name] = value
+    return record
+
+
+class EventSink(ABC):
+    """
+    Destination for transformed events, written batch by batch as tasks complete
+    """
+
+    @abstractmethod
+    def write(self, events: Sequence[Any]) -> None:
+        """
+        Writes a batch of events
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Flushes and finalizes the output
+        """
+
+    def abort(self) -> None:
+        """
+        Discards the output after a failed run, closes by default
+        """
+        self.close()
+
+
+class FileEventSink(EventSink):
+    """
+    Base for sinks writing to a file
+    Output goes to <filename>.partial and is only renamed to filename on close,
+    so a failed run never leaves a file that looks complete.
+    In append mode the file is written in place.
+    """
+
+    def __init__(self, filename: str, append: bool = False) -> None:
+        self.filename = filename
+        self.append = append
+        self.path = filename if append else f"{filename}.partial"
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def close(self) -> None:
+        self._close_file()
+        if not self.append:
+            os.replace(self.path, self.filename)
+
+    def abort(self) -> None:
+        self._close_file()
+        if not self.append and os.path.exists(self.path):
+            os.remove(self.path)
+
+    @abstractmethod
+    def _close_file(self) -> None:
+        """
+        Flushes and closes the underlying file
+        """
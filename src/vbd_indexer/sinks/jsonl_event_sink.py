@@ -0,0 +1,24 @@
+import json
+from typing import IO, Any, Sequence
+
+from .event_sink import FileEventSink, event_to_record
+
+
+class JsonlEventSink(FileEventSink):
+    """
+    Streams events to a JSON lines file, one flattened record per line
+    Decimals are written as strings to keep their precision
+    """
+
+    def __init__(self, filename: str, append: bool = False) -> None:
+        super().__init__(filename, append)
+        self._file: IO[str] = open(self.path, "a" if append else "w")
+
+    def write(self, events: Sequence[Any]) -> None:
+        for event in events:
+            self._file.write(json.dumps(event_to_record(event), default=str))
+            self._file.write("\n")
+
+    def _close_file(self) -> None:
+        if not self._file.closed:
+            self._file.close()
@@ -0,0 +1,165 @@
+import os
+from decimal import ROUND_HALF_UP, Context, Decimal
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .event_sink import FileEventSink, event_to_record
+
+# enough digits to round any decimal256 value (the default context has 28)
+_QUANTIZE_CONTEXT = Context(prec=76)
+
+
+class ParquetEventSink(FileEventSink):
+    """
+    Streams events to a Parquet file with a fixed arrow schema (see arrow_schema_for)
+    Records are buffered and written as row groups of row_group_size rows
+    Decimals are rounded (half up) to the scale of their column
+    Record columns missing from the schema are dropped, unless their name starts
+    with a prefix of extra_column_types (see nested_column_types): the rows written
+    so far are then kept in a part file and writing continues in a new one with the
+    new column. Parts are merged row group by row group on close, the new column
+    is null for the rows of the earlier parts.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        schema: pa.Schema,
+        row_group_size: int = 65536,
+        extra_column_types: Mapping[str, pa.DataType] = {},
+    ) -> None:
+        super().__init__(filename)
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.extra_column_types = dict(extra_column_types)
+        self._quantums: Dict[str, Decimal] = {}
+        self._set_quantums()
+        self._buffer: List[Dict[str, Any]] = []
+        # files holding the rows written before the schema was widened, in order
+        self._parts: List[str] = []
+        self._writer: Optional[pq.ParquetWriter] = pq.ParquetWriter(
+            self.path, schema, compression="zstd"
+        )
+
+    def write(self, events: Sequence[Any]) -> None:
+        records = [event_to_record(e) for e in events]
+        if self.extra_column_types:
+            self._add_extra_columns(records)
+        self._buffer.extend(records)
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def _set_quantums(self) -> None:
+        self._quantums = {
+            field.name: Decimal(1).scaleb(-field.type.scale)
+            for field in self.schema
+            if pa.types.is_decimal(field.type)
+        }
+
+    def _add_extra_columns(self, records: Sequence[Dict[str, Any]]) -> None:
+        """
+        Adds the extra columns first seen in the records to the schema
+        """
+        names = set(self.schema.names)
+        new_fields = []
+        for record in records:
+            for name in record:
+                if name in names:
+                    continue
+                for prefix, column_type in self.extra_column_types.items():
+                    if name.startswith(prefix):
+                        names.add(name)
+                        new_fields.append(pa.field(name, column_type, nullable=True))
+                        break
+        if new_fields:
+            self._widen(new_fields)
+
+    def _widen(self, new_fields: List[pa.Field]) -> None:
+        """
+        Closes the rows written so far as a part, and continues in a new file
+        with the wider schema
+        """
+        if self._writer is None:
+            return
+        self._flush()
+        self._close_part()
+        self.schema = pa.schema(list(self.schema) + new_fields)
+        self._set_quantums()
+        self._writer = pq.ParquetWriter(self.path, self.schema, compression="zstd")
+
+    def _close_part(self) -> None:
+        self._writer.close()
+        part = f"{self.path}.part{len(self._parts)}"
+        os.replace(self.path, part)
+        self._parts.append(part)
+
+    def _merge_parts(self) -> None:
+        """
+        Writes the rows of every part to the file with the final schema, one row
+        group at a time
+        """
+        with pq.ParquetWriter(self.path, self.schema, compression="zstd") as writer:
+            for part in self._parts:
+                part_file = pq.ParquetFile(part)
+                for i in range(part_file.num_row_groups):
+                    writer.write_table(self._widened(part_file.read_row_group(i)))
+                part_file.close()
+                os.remove(part)
+        self._parts = []
+
+    def _widened(self, rows: pa.Table) -> pa.Table:
+        """
+        The rows of a part with the final schema, the columns it lacks are nulls
+        """
+        columns = []
+        for field in self.schema:
+            if field.name in rows.column_names:
+                columns.append(rows.column(field.name))
+            else:
+                columns.append(pa.nulls(rows.num_rows, field.type))
+        return pa.table(columns, schema=self.schema)
+
+    def _flush(self) -> None:
+        if not self._buffer or self._writer is None:
+            return
+        columns = {}
+        for field in self.schema:
+            if field.nullable:
+                # extra columns, missing from the records without that key
+                values = [record.get(field.name) for record in self._buffer]
+            else:
+                values = [record[field.name] for record in self._buffer]
+            quantum = self._quantums.get(field.name)
+            if quantum is not None:
+                values = [
+                    (
+                        None
+                        if v is None
+                        else Decimal(v).quantize(
+                            quantum, rounding=ROUND_HALF_UP, context=_QUANTIZE_CONTEXT
+                        )
+                    )
+                    for v in values
+                ]
+            columns[field.name] = pa.array(values, type=field.type)
+        self._writer.write_table(pa.table(columns, schema=self.schema))
+        self._buffer = []
+
+    def _close_file(self) -> None:
+        if self._writer is None:
+            return
+        self._flush()
+        if self._parts:
+            self._close_part()
+            self._merge_parts()
+        else:
+            self._writer.close()
+        self._writer = None
+
+    def abort(self) -> None:
+        for part in self._parts:
+            os.remove(part)
+        self._parts = []
+        super().abort()
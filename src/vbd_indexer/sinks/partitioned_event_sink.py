@@ -0,0 +1,45 @@
+from typing import Any, Callable, Dict, Hashable, Iterable, Sequence
+
+from .event_sink import EventSink
+
+
+class PartitionedEventSink(EventSink):
+    """
+    Routes every event to the sink of its partition (e.g. one file per round)
+    Sinks are created by sink_factory, up front for the given partitions and
+    on first use for any other partition key returned by partition_of.
+    Closing or aborting closes or aborts every partition sink.
+    """
+
+    def __init__(
+        self,
+        partition_of: Callable[[Any], Hashable],
+        sink_factory: Callable[[Any], EventSink],
+        partitions: Iterable[Hashable] = (),
+    ) -> None:
+        self.partition_of = partition_of
+        self.sink_factory = sink_factory
+        self.sinks: Dict[Hashable, EventSink] = {}
+        for partition in partitions:
+            self._sink(partition)
+
+    def write(self, events: Sequence[Any]) -> None:
+        batches: Dict[Hashable, list] = {}
+        for event in events:
+            batches.setdefault(self.partition_of(event), []).append(event)
+        for partition, batch in batches.items():
+            self._sink(partition).write(batch)
+
+    def close(self) -> None:
+        for sink in self.sinks.values():
+            sink.close()
+
+    def abort(self) -> None:
+        for sink in self.sinks.values():
+            sink.abort()
+
+    def _sink(self, partition: Hashable) -> EventSink:
+        sink = self.sinks.get(partition)
+        if sink is None:
+            sink = self.sinks[partition] = self.sink_factory(partition)
+        return sink
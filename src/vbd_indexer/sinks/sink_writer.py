@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence
+
+from loguru import logger
+
+from .event_sink import EventSink
+
+
+class SinkWriter:
+    """
+    Writes event batches to a sink from a dedicated thread
+    The batch queue is bounded, so producers block when the sink falls behind
+    instead of piling events up in memory.
+    An error in the sink is raised to the next producer call.
+    write_observer is called with the time (secs) of every sink write.
+    """
+
+    def __init__(
+        self,
+        sink: EventSink,
+        max_pending_batches: int = 64,
+        write_observer: Optional[Callable[[float], None]] = None,
+    ) -> None:
+        self.sink = sink
+        self.write_observer = write_observer
+        self._batches: "queue.Queue[Optional[List[Any]]]" = queue.Queue(
+            maxsize=max_pending_batches
+        )
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._write_loop, name="sink-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, events: Sequence[Any]) -> None:
+        """
+        Queues a batch of events, blocking while the queue is full
+        """
+        self._raise_error()
+        if events:
+            self._batches.put(list(events))
+
+    @property
+    def pending_batches(self) -> int:
+        """Batches queued and not written yet"""
+        return self._batches.qsize()
+
+    def close(self) -> None:
+        """
+        Writes all queued batches and closes the sink
+        """
+        self._finish()
+        self._raise_error()
+        self.sink.close()
+
+    def abort(self) -> None:
+        """
+        Stops writing and discards the sink output
+        """
+        self._finish()
+        self.sink.abort()
+
+    def _finish(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._batches.put(None)  # sentinel
+        self._thread.join()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("Event sink failed") from self._error
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = self._batches.get()
+            if batch is None:
+                return
+            if self._error is not None:
+                # keep draining so producers never block on a dead writer
+                continue
+            try:
+                started = time.perf_counter()
+                self.sink.write(batch)
+                if self.write_observer is not None:
+                    self.write_observer(time.perf_counter() - started)
+            except BaseException as e:
+                logger.error(f"Error writing events to sink: {e}")
+                self._error = e
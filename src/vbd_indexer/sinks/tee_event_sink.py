@@ -0,0 +1,25 @@
+from typing import Any, List, Sequence
+
+from .event_sink import EventSink
+
+
+class TeeEventSink(EventSink):
+    """
+    Writes every batch of events to each of several sinks (e.g. a file and a summary)
+    Closing or aborting closes or aborts every sink.
+    """
+
+    def __init__(self, sinks: Sequence[EventSink]) -> None:
+        self.sinks: List[EventSink] = list(sinks)
+
+    def write(self, events: Sequence[Any]) -> None:
+        for sink in self.sinks:
+            sink.write(events)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+    def abort(self) -> None:
+        for sink in self.sinks:
+            sink.abort()
@@ -0,0 +1,161 @@
+import time
+from typing import List, Optional
+
+import httpx
+
+from vbd_indexer.thor.http_clients import http_client_kwargs
+from vbd_indexer.thor.raw_event import RawEventPage, parse_raw_event_page
+from vbd_indexer.thor.thor_client_options import ThorClientOptions
+from vbd_indexer.thor.token_bucket import TokenBucket
+from vbd_indexer.utils import fast_json
+from vbd_indexer.utils.sampling_profiler import awaiting_response
+
+
+class AsyncThorClient:
+    """
+    asyncio counterpart of ThorClient
+    A single instance can serve many concurrent requests to the same endpoint,
+    with the same connection pool limits and HTTP/2 support as the shared sync clients
+    An asyncio client is bound to its event loop, so it is not shared process-wide
+    """
+
+    def __init__(self, options: ThorClientOptions) -> None:
+        self.options = options
+        self._client: Optional[httpx.AsyncClient] = httpx.AsyncClient(
+            **http_client_kwargs(
+                self.options.thor_url, self.options.http_request_timeout
+            )
+        )
+
+    async def dispose(self) -> None:
+        """
+        Dispose the http client
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_events(
+        self,
+        from_block: int,
+        to_block: int,
+        contract_address: str,
+        topic0: str,
+        max_events_per_request: int,
+        rate_limiter: Optional[TokenBucket] = None,
+    ) -> RawEventPage:
+        """
+        Post requests to thor to get the events
+        Each request is for max_events_per_request events, so pagination is used
+        to get all events. Before each request a token is taken from rate_limiter
+        (if given), to avoid rate limiting
+        Errors are not caught here, they go back to the caller
+        """
+        if self._client is None:
+            raise RuntimeError("AsyncThorClient is disposed")
+        offset = 0
+        all_pages_received = False
+        pages: List[RawEventPage] = []
+        while not all_pages_received:
+            # wait for a request slot
+            if rate_limiter is not None:
+                await rate_limiter.acquire_async()
+            # get events for page
+            page_events = await self._send_get_events(
+                from_block,
+                to_block,
+                contract_address,
+                topic0,
+                max_events_per_request,
+                offset,
+            )
+            # add to all paged events
+            pages.append(page_events)
+            # check if last page
+            if len(page_events) < max_events_per_request:
+                all_pages_received = True
+            else:
+                offset = offset + max_events_per_request
+        return RawEventPage.concat(pages)
+
+    async def get_events_page(
+        self,
+        from_block: int,
+        to_block: int,
+        contract_address: str,
+        topic0: str,
+        max_events_per_request: int,
+        rate_limiter: Optional[TokenBucket] = None,
+    ) -> RawEventPage:
+        """
+        Post a single request to thor for the first page of events in the block range
+        A full page (max_events_per_request events) means the range may hold more events
+        """
+        if rate_limiter is not None:
+            await rate_limiter.acquire_async()
+        return await self._send_get_events(
+            from_block,
+            to_block,
+            contract_address,
+            topic0,
+            max_events_per_request,
+            0,
+        )
+
+    async def _send_get_events(
+        self,
+        from_block: int,
+        to_block: int,
+        contract_address: str,
+        topic0: str,
+        max_events: int,
+        offset: int,
+    ) -> RawEventPage:
+        """
+        Makes a single request to thor to get events
+        """
+        if self._client is None:
+            raise RuntimeError("AsyncThorClient is disposed")
+        # build post data
+        post_data = {
+            "range": {"unit": "block", "from": from_block, "to": to_block},
+            "options": {"offset": offset, "limit": max_events, "includeIndexes": True},
+            "criteriaSet": [{"address": contract_address, "topic0": topic0}],
+        }
+        # do http post
+        started = time.monotonic()
+        with awaiting_response():
+            response = await self._client.post("/logs/event", json=post_data)
+        response.raise_for_status()
+        self._observe(started, response)
+        # process events from response
+        return parse_raw_event_page(fast_json.loads(response.content))
+
+    async def call_contract(self, contract_address: str, call_data: str) -> str:
+        """
+        Performs a contract call with the specified call data
+        Returns the json data response without decoding
+        """
+        if self._client is None:
+            raise RuntimeError("AsyncThorClient is disposed")
+        # build post data
+        post_data = {
+            "clauses": [{"to": contract_address, "value": "0", "data": call_data}]
+        }
+        # do the post request
+        started = time.monotonic()
+        with awaiting_response():
+            response = await self._client.post("/accounts/*", json=post_data)
+        response.raise_for_status()
+        self._observe(started, response)
+        response_json = response.json()
+        # get data from response
+        response_data = response_json[0]["data"]
+        return response_data
+
+    def _observe(self, started: float, response: httpx.Response) -> None:
+        """
+        Reports a successful request to the options request_observer
+        """
+        if self.options.request_observer is not None:
+            self.options.request_observer(time.monotonic() - started, response)
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, List, Tuple
+
+from eth_abi.abi import decode, encode
+from eth_utils.crypto import keccak
+
+
+@lru_cache(maxsize=256)
+def _function_abi(solidity_sig: str) -> Tuple[bytes, Tuple[str, ...]]:
+    """
+    Returns the 4 byte selector and argument types of a function signature
+    e.g. "getRound(uint256)"
+    """
+    name_end = solidity_sig.index("(")
+    args = solidity_sig[name_end + 1 : -1]
+    arg_types: List[str] = []
+    depth = 0
+    current = ""
+    # split on top level commas only, tuple types contain commas
+    for char in args:
+        if char == "," and depth == 0:
+            arg_types.append(current)
+            current = ""
+            continue
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        current += char
+    if current:
+        arg_types.append(current)
+    return keccak(text=solidity_sig)[:4], tuple(arg_types)
+
+
+@dataclass(frozen=True)
+class ContractCall:
+    """
+    A read-only contract function call, with the abi types to encode its
+    arguments and decode its outputs
+    """
+
+    contract_address: str
+    # solidity signature, e.g. "getRound(uint256)"
+    function_sig: str
+    args: Tuple[Any, ...] = ()
+    # abi types of the outputs, e.g. ("address", "uint48", "uint32")
+    output_types: Tuple[str, ...] = ()
+
+    def encode(self) -> str:
+        """
+        Encodes the call data (0x prefixed hex)
+        """
+        selector, arg_types = _function_abi(self.function_sig)
+        return "0x" + (selector + encode(list(arg_types), list(self.args))).hex()
+
+    def decode(self, data: str) -> Tuple[Any, ...]:
+        """
+        Decodes the outputs from the call response data (0x prefixed hex)
+        """
+        return decode(list(self.output_types), bytes.fromhex(data[2:]))
@@ -0,0 +1,65 @@
+import atexit
+import importlib.util
+import threading
+from typing import Any, Dict, Tuple
+
+import httpx
+
+# HTTP/2 needs the optional h2 package (pip install vbd-indexer[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# connections kept per endpoint, enough for every worker of the endpoint
+# plus the contract-call helpers
+MAX_CONNECTIONS_PER_ENDPOINT = 32
+MAX_KEEPALIVE_CONNECTIONS_PER_ENDPOINT = 16
+KEEPALIVE_EXPIRY_SECS = 60.0
+
+_clients: Dict[Tuple[str, float], httpx.Client] = {}
+_clients_lock = threading.Lock()
+
+
+def http_client_kwargs(base_url: str, timeout: float) -> Dict[str, Any]:
+    """
+    Settings shared by the sync and async http clients of an endpoint:
+    pooled keep-alive connections and HTTP/2 when available.
+    Responses are decompressed by httpx (gzip, deflate, and br/zstd if installed).
+    """
+    return {
+        "base_url": base_url,
+        "timeout": timeout,
+        "http2": HTTP2_AVAILABLE,
+        "limits": httpx.Limits(
+            max_connections=MAX_CONNECTIONS_PER_ENDPOINT,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS_PER_ENDPOINT,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECS,
+        ),
+    }
+
+
+def get_http_client(base_url: str, timeout: float) -> httpx.Client:
+    """
+    Returns the process-wide http client for an endpoint, creating it on first use
+    The client is thread-safe and shared by every ThorClient of the endpoint,
+    so connections (and TLS sessions) are reused across threads and calls
+    """
+    key = (base_url, timeout)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            client = _clients[key] = httpx.Client(
+                **http_client_kwargs(base_url, timeout)
+            )
+        return client
+
+
+def close_http_clients() -> None:
+    """
+    Closes every shared http client, they are recreated on next use
+    """
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+atexit.register(close_http_clients)
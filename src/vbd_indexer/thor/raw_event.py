@@ -1,8 +1,9 @@
+from array import array
 from dataclasses import dataclass
-from typing import List
+from typing import Any, Iterable, Iterator, List, Sequence, Tuple, overload
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RawEvent:
     """
     Raw (un-decoded) event details
@@ -12,3 +13,99 @@ class RawEvent:
     timestamp: int
     data: str
     topics: List[str]
+
+
+# (block_number, timestamp, data, topics) of one raw event
+RawEventRow = Tuple[int, int, str, List[str]]
+
+
+@dataclass(frozen=True)
+class RawEventPage(Sequence[RawEvent]):
+    """
+    Columnar page of raw events: arrays of block numbers and timestamps and
+    lists of data and topics, instead of a RawEvent object per event
+    Indexing builds the RawEvent on demand, batch decoders can read the
+    columns through rows() without building any.
+    """
+
+    block_numbers: "array[int]"
+    timestamps: "array[int]"
+    data: List[str]
+    topics: List[List[str]]
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @overload
+    def __getitem__(self, index: int) -> RawEvent: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "RawEventPage": ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RawEventPage(
+                block_numbers=self.block_numbers[index],
+                timestamps=self.timestamps[index],
+                data=self.data[index],
+                topics=self.topics[index],
+            )
+        return RawEvent(
+            block_number=self.block_numbers[index],
+            timestamp=self.timestamps[index],
+            data=self.data[index],
+            topics=self.topics[index],
+        )
+
+    def rows(self) -> Iterator[RawEventRow]:
+        """
+        Iterates the events as (block_number, timestamp, data, topics) tuples
+        """
+        return zip(self.block_numbers, self.timestamps, self.data, self.topics)
+
+    @staticmethod
+    def from_rows(rows: Iterable[RawEventRow]) -> "RawEventPage":
+        page = RawEventPage(array("q"), array("q"), [], [])
+        for block_number, timestamp, data, topics in rows:
+            page.block_numbers.append(block_number)
+            page.timestamps.append(timestamp)
+            page.data.append(data)
+            page.topics.append(topics)
+        return page
+
+    @staticmethod
+    def concat(pages: Sequence["RawEventPage"]) -> "RawEventPage":
+        """
+        Joins consecutive pages into one
+        """
+        if len(pages) == 1:
+            return pages[0]
+        page = RawEventPage(array("q"), array("q"), [], [])
+        for p in pages:
+            page.block_numbers.extend(p.block_numbers)
+            page.timestamps.extend(p.timestamps)
+            page.data.extend(p.data)
+            page.topics.extend(p.topics)
+        return page
+
+
+def raw_event_rows(raw_events: Sequence[RawEvent]) -> Iterator[RawEventRow]:
+    """
+    Iterates raw events as rows, straight from the columns of a RawEventPage
+    """
+    if isinstance(raw_events, RawEventPage):
+        return raw_events.rows()
+    return ((e.block_number, e.timestamp, e.data, e.topics) for e in raw_events)
+
+
+def parse_raw_event_page(response_json: List[Any]) -> RawEventPage:
+    """
+    Builds a page of raw events from a thor /logs/event json response
+    """
+    metas = [event["meta"] for event in response_json]
+    return RawEventPage(
+        block_numbers=array("q", [meta["blockNumber"] for meta in metas]),
+        timestamps=array("q", [meta["blockTimestamp"] for meta in metas]),
+        data=[event["data"] for event in response_json],
+        topics=[event["topics"] for event in response_json],
+    )
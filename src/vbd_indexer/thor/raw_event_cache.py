@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Sequence
+
+from vbd_indexer.thor.raw_event import RawEvent, RawEventPage, raw_event_rows
+from vbd_indexer.utils.block_ranges import (
+    BlockRange,
+    merge_block_ranges,
+    subtract_block_ranges,
+)
+
+
+class RawEventCache:
+    """
+    On-disk (sqlite) cache of raw events keyed by contract address, topic0 and
+    block span
+    A span is only recorded together with all of its events, so a covered
+    block range can be served without asking thor.
+    Only finalized block ranges should be stored.
+    Also keeps the events per block last observed for each contract address and
+    topic0, so later runs can size their tasks before fetching anything.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS spans (
+                    contract TEXT NOT NULL,
+                    topic0 TEXT NOT NULL,
+                    from_block INTEGER NOT NULL,
+                    to_block INTEGER NOT NULL
+                )
+                """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS spans_key"
+                " ON spans (contract, topic0, from_block)"
+            )
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    contract TEXT NOT NULL,
+                    topic0 TEXT NOT NULL,
+                    block_number INTEGER NOT NULL,
+                    seq INTEGER NOT NULL,
+                    timestamp INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    topics TEXT NOT NULL,
+                    PRIMARY KEY (contract, topic0, block_number, seq)
+                ) WITHOUT ROWID
+                """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS densities (
+                    contract TEXT NOT NULL,
+                    topic0 TEXT NOT NULL,
+                    events_per_block REAL NOT NULL,
+                    PRIMARY KEY (contract, topic0)
+                )
+                """)
+
+    def close(self) -> None:
+        """
+        Close the sqlite connection
+        """
+        with self._lock:
+            self._conn.close()
+
+    def missing_ranges(
+        self, contract_address: str, topic0: str, from_block: int, to_block: int
+    ) -> List[BlockRange]:
+        """
+        Returns the parts of the block range that are not cached
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT from_block, to_block FROM spans
+                WHERE contract = ? AND topic0 = ? AND from_block <= ? AND to_block >= ?
+                """,
+                (contract_address.lower(), topic0.lower(), to_block, from_block),
+            ).fetchall()
+        return subtract_block_ranges(from_block, to_block, rows)
+
+    def get_events(
+        self, contract_address: str, topic0: str, from_block: int, to_block: int
+    ) -> RawEventPage:
+        """
+        Returns the cached events in the block range, in chain order
+        Uncached parts of the range contribute no events
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT block_number, timestamp, data, topics FROM events
+                WHERE contract = ? AND topic0 = ? AND block_number BETWEEN ? AND ?
+                ORDER BY block_number, seq
+                """,
+                (contract_address.lower(), topic0.lower(), from_block, to_block),
+            ).fetchall()
+        return RawEventPage.from_rows(
+            (block_number, timestamp, data, topics.split(","))
+            for block_number, timestamp, data, topics in rows
+        )
+
+    def put_events(
+        self,
+        contract_address: str,
+        topic0: str,
+        from_block: int,
+        to_block: int,
+        events: Sequence[RawEvent],
+    ) -> None:
+        """
+        Stores all events of a fully fetched block range and marks the range as cached
+        """
+        contract = contract_address.lower()
+        topic = topic0.lower()
+        with self._lock, self._conn:
+            # replace anything already stored for the range
+            self._conn.execute(
+                """
+                DELETE FROM events
+                WHERE contract = ? AND topic0 = ? AND block_number BETWEEN ? AND ?
+                """,
+                (contract, topic, from_block, to_block),
+            )
+            self._conn.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        contract,
+                        topic,
+                        block_number,
+                        seq,
+                        timestamp,
+                        data,
+                        ",".join(topics),
+                    )
+                    for seq, (block_number, timestamp, data, topics) in enumerate(
+                        raw_event_rows(events)
+                    )
+                ),
+            )
+            # merge the new span with any overlapping or adjacent spans
+            touching = self._conn.execute(
+                """
+                SELECT rowid, from_block, to_block FROM spans
+                WHERE contract = ? AND topic0 = ? AND from_block <= ? AND to_block >= ?
+                """,
+                (contract, topic, to_block + 1, from_block - 1),
+            ).fetchall()
+            self._conn.executemany(
+                "DELETE FROM spans WHERE rowid = ?", ((row[0],) for row in touching)
+            )
+            self._conn.executemany(
+                "INSERT INTO spans VALUES (?, ?, ?, ?)",
+                (
+                    (contract, topic, span_start, span_end)
+                    for span_start, span_end in merge_block_ranges(
+                        [(from_block, to_block)] + [(r[1], r[2]) for r in touching]
+                    )
+                ),
+            )
+
+    def get_events_per_block(
+        self, contract_address: str, topic0: str
+    ) -> Optional[float]:
+        """
+        Returns the saved events per block, or None if none was saved
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT events_per_block FROM densities"
+                " WHERE contract = ? AND topic0 = ?",
+                (contract_address.lower(), topic0.lower()),
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def put_events_per_block(
+        self, contract_address: str, topic0: str, events_per_block: float
+    ) -> None:
+        """
+        Saves the observed events per block, replacing any saved before
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO densities VALUES (?, ?, ?)",
+                (contract_address.lower(), topic0.lower(), events_per_block),
+            )
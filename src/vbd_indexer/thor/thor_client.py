@@ -1,26 +1,34 @@
 import time
-from typing import List, Optional
+from typing import Any, List, Optional, Sequence, Tuple
 
 import httpx
 
-from vbd_indexer.thor.raw_event import RawEvent
+from vbd_indexer.thor.contract_call import ContractCall
+from vbd_indexer.thor.http_clients import get_http_client
+from vbd_indexer.thor.raw_event import RawEventPage, parse_raw_event_page
 from vbd_indexer.thor.thor_client_options import ThorClientOptions
+from vbd_indexer.thor.token_bucket import TokenBucket
+from vbd_indexer.utils import fast_json
 
 
 class ThorClient:
+    """
+    Thor REST api client
+    Requests go through the process-wide http client of the endpoint, so
+    instances are cheap and reuse pooled connections
+    """
+
     def __init__(self, options: ThorClientOptions) -> None:
         self.options = options
-        self._client: Optional[httpx.Client] = httpx.Client(
-            base_url=self.options.thor_url, timeout=self.options.http_request_timeout
+        self._client: Optional[httpx.Client] = get_http_client(
+            self.options.thor_url, self.options.http_request_timeout
         )
 
     def dispose(self) -> None:
         """
-        Dispose the http client
+        Release the http client, its connections stay pooled for other instances
         """
-        if self._client is not None:
-            self._client.close()
-            self._client = None
+        self._client = None
 
     def get_events(
         self,
@@ -30,21 +38,25 @@ class ThorClient:
         topic0: str,
         max_events_per_request: int,
         delay_between_requests: float,
-    ) -> List[RawEvent]:
+        rate_limiter: Optional[TokenBucket] = None,
+    ) -> RawEventPage:
         """
         Post requests to thor to get the events
         Each request is for max_events_per_request events, so pagination is used to get all events
         Between requests the current thread is paused for delay_between_requests (secs), to avoid rate limiting
+        If a rate_limiter is given, a token is also taken from it before each request
         Errors are not caught here, they go back to the caller
         """
         if self._client is None:
             raise RuntimeError("ThorClient is disposed")
         offset = 0
         all_pages_received = False
-        all_events: List[RawEvent] = []
+        pages: List[RawEventPage] = []
         while not all_pages_received:
             # sleep between requests
             time.sleep(delay_between_requests)
+            if rate_limiter is not None:
+                rate_limiter.acquire()
             # get events for page
             page_events = self._send_get_events(
                 from_block,
@@ -55,13 +67,42 @@ class ThorClient:
                 offset,
             )
             # add to all paged events
-            all_events.extend(page_events)
+            pages.append(page_events)
             # check if last page
             if len(page_events) < max_events_per_request:
                 all_pages_received = True
             else:
                 offset = offset + max_events_per_request
-        return all_events
+        return RawEventPage.concat(pages)
+
+    def get_events_page(
+        self,
+        from_block: int,
+        to_block: int,
+        contract_address: str,
+        topic0: str,
+        max_events_per_request: int,
+        delay_between_requests: float,
+        rate_limiter: Optional[TokenBucket] = None,
+    ) -> RawEventPage:
+        """
+        Post a single request to thor for the first page of events in the block range
+        A full page (max_events_per_request events) means the range may hold more events
+        The current thread is paused for delay_between_requests (secs) first, to
+        avoid rate limiting
+        If a rate_limiter is given, a token is also taken from it first
+        """
+        time.sleep(delay_between_requests)
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return self._send_get_events(
+            from_block,
+            to_block,
+            contract_address,
+            topic0,
+            max_events_per_request,
+            0,
+        )
 
     def _send_get_events(
         self,
@@ -71,7 +112,7 @@ class ThorClient:
         topic0: str,
         max_events: int,
         offset: int,
-    ) -> List[RawEvent]:
+    ) -> RawEventPage:
         """
         Makes a single request to thor to get events
         """
@@ -84,37 +125,82 @@ class ThorClient:
             "criteriaSet": [{"address": contract_address, "topic0": topic0}],
         }
         # do http post
+        started = time.monotonic()
         response = self._client.post("/logs/event", json=post_data)
         response.raise_for_status()
-        response_json = response.json()
+        self._observe(started, response)
         # process events from response
-        events: List[RawEvent] = []
-        for event in response_json:
-            events.append(
-                RawEvent(
-                    block_number=event["meta"]["blockNumber"],
-                    timestamp=event["meta"]["blockTimestamp"],
-                    data=event["data"],
-                    topics=event["topics"],
-                )
-            )
-        return events
+        return parse_raw_event_page(fast_json.loads(response.content))
 
     def call_contract(self, contract_address: str, call_data: str) -> str:
         """
         Performs a contract call with the specified call data
         Returns the json data response without decoding
         """
+        return self.call_contracts([(contract_address, call_data)])[0]
+
+    def call_contracts(
+        self,
+        calls: Sequence[Tuple[str, str]],
+        max_clauses_per_request: int = 25,
+    ) -> List[str]:
+        """
+        Performs several (contract_address, call_data) contract calls, sent as
+        the clauses of a single request (or one per max_clauses_per_request calls)
+        Returns the data responses in call order, without decoding
+        Raises an error if any call reverted
+        """
         if self._client is None:
             raise RuntimeError("ThorClient is disposed")
-        # build post data
-        post_data = {
-            "clauses": [{"to": contract_address, "value": "0", "data": call_data}]
-        }
-        # do the post request
-        response = self._client.post("/accounts/*", json=post_data)
+        results: List[str] = []
+        for i in range(0, len(calls), max_clauses_per_request):
+            batch = calls[i : i + max_clauses_per_request]
+            # build post data
+            post_data = {
+                "clauses": [
+                    {"to": contract_address, "value": "0", "data": call_data}
+                    for contract_address, call_data in batch
+                ]
+            }
+            # do the post request
+            started = time.monotonic()
+            response = self._client.post("/accounts/*", json=post_data)
+            response.raise_for_status()
+            self._observe(started, response)
+            # get data from response
+            for (contract_address, _), output in zip(batch, response.json()):
+                if output.get("reverted"):
+                    raise RuntimeError(
+                        f"Call to {contract_address} reverted: {output.get('vmError')}"
+                    )
+                results.append(output["data"])
+        return results
+
+    def call_functions(self, calls: Sequence[ContractCall]) -> List[Tuple[Any, ...]]:
+        """
+        Performs several contract function calls in one request (see call_contracts)
+        Returns the decoded outputs in call order
+        """
+        responses = self.call_contracts(
+            [(call.contract_address, call.encode()) for call in calls]
+        )
+        return [call.decode(data) for call, data in zip(calls, responses)]
+
+    def get_block_number(self, revision: str = "best") -> int:
+        """
+        Returns the block number for a block revision (best, finalized, id or number)
+        """
+        if self._client is None:
+            raise RuntimeError("ThorClient is disposed")
+        started = time.monotonic()
+        response = self._client.get(f"/blocks/{revision}")
         response.raise_for_status()
-        response_json = response.json()
-        # get data from response
-        response_data = response_json[0]["data"]
-        return response_data
+        self._observe(started, response)
+        return response.json()["number"]
+
+    def _observe(self, started: float, response: httpx.Response) -> None:
+        """
+        Reports a successful request to the options request_observer
+        """
+        if self.options.request_observer is not None:
+            self.options.request_observer(time.monotonic() - started, response)
@@ -1,4 +1,7 @@
 from dataclasses import dataclass
+from typing import Callable, Optional
+
+import httpx
 
 
 @dataclass(frozen=True)
@@ -9,3 +12,5 @@ class ThorClientOptions:
 
     thor_url: str
     http_request_timeout: int = 10
+    # called with the elapsed time (secs) and response of every successful request
+    request_observer: Optional[Callable[[float, httpx.Response], None]] = None
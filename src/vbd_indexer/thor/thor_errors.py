@@ -0,0 +1,14 @@
+import httpx
+
+
+def is_transient_thor_error(error: BaseException) -> bool:
+    """
+    True for errors worth retrying: timeouts, connection problems,
+    rate limiting (429) and server errors (5xx)
+    """
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code == 429 or status_code >= 500
+    return False
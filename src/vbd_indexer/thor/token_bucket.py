@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter
+    Tokens refill at `rate` per second up to `capacity`, each request consumes one token
+    Safe to share between threads and coroutines
+    """
+
+    def __init__(self, rate: float, capacity: int = 1) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Blocks the current thread until a token is available
+        """
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """
+        Suspends the current coroutine until a token is available
+        """
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _reserve(self) -> float:
+        """
+        Takes a token (possibly going into debt) and returns how long (secs)
+        the caller must wait before the token is theirs
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                float(self.capacity),
+                self._tokens + (now - self._last_refill) * self.rate,
+            )
+            self._last_refill = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
@@ -0,0 +1,39 @@
+from typing import Iterable, List, Tuple
+
+# inclusive (from_block, to_block) pair
+BlockRange = Tuple[int, int]
+
+
+def merge_block_ranges(ranges: Iterable[BlockRange]) -> List[BlockRange]:
+    """
+    Merges overlapping and adjacent block ranges
+    Returns sorted, non-overlapping ranges
+    """
+    merged: List[BlockRange] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_block_ranges(
+    start: int, end: int, covered: Iterable[BlockRange]
+) -> List[BlockRange]:
+    """
+    Returns the parts of start..end not covered by any of the covered ranges
+    """
+    missing: List[BlockRange] = []
+    next_block = start
+    for cov_start, cov_end in merge_block_ranges(covered):
+        if cov_end < next_block:
+            continue
+        if cov_start > end:
+            break
+        if cov_start > next_block:
+            missing.append((next_block, cov_start - 1))
+        next_block = cov_end + 1
+    if next_block <= end:
+        missing.append((next_block, end))
+    return missing
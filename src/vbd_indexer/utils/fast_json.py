@@ -0,0 +1,17 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional, pip install vbd-indexer[fast]
+    orjson = None
+
+
+def loads(content: bytes) -> Any:
+    """
+    Parses json, with orjson when it is installed (several times faster on
+    large thor responses), otherwise with the standard json module
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
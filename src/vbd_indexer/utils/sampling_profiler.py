@@ -0,0 +1,240 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from types import CodeType
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+DEFAULT_INTERVAL_SECS = 0.01
+
+# (stage, fragments of the source paths whose frames belong to the stage)
+# A sample goes to the stage of its innermost matching frame, so json parsing
+# called from the proof parser counts as json and the rest of the parser as proof parse
+STAGE_RULES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    (
+        "http",
+        ("/httpx/", "/httpcore/", "/h11/", "/h2/", "/anyio/", "/socket.py", "/ssl.py"),
+    ),
+    ("abi decode", ("/eth_abi/", "/eth_utils/", "/eth_hash/", "/Crypto/")),
+    ("json", ("/json/", "vbd_indexer/utils/fast_json.py")),
+    ("proof parse", ("vbd_indexer/b3tr/b3tr_proof_parser.py",)),
+    ("pandas", ("/pandas/",)),
+    ("arrow", ("/pyarrow/",)),
+    ("sink write", ("vbd_indexer/sinks/",)),
+)
+
+# samples whose innermost frame is in these files are blocked threads, or an
+# idle event loop in async mode
+WAIT_STAGE = "idle/io wait"
+_WAIT_FRAGMENTS = (
+    "/threading.py",
+    "/queue.py",
+    "/selectors.py",
+    "vbd_indexer/thor/token_bucket.py",
+)
+# samples of the event loop waiting in select while async requests await their
+# response (see awaiting_response)
+NETWORK_WAIT_STAGE = "network wait"
+_SELECT_FRAGMENT = "/selectors.py"
+_awaiting_responses = 0
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# threads of a kind share a name up to their numbers, e.g. indexer-worker-0-3
+_THREAD_NUMBER = re.compile(r"[-_]\d+")
+
+Stack = Tuple[CodeType, ...]
+
+
+@contextmanager
+def awaiting_response() -> Iterator[None]:
+    """
+    Marks an async request awaiting its response, so the profiler can tell the
+    event loop waiting on the network from an idle one
+    """
+    global _awaiting_responses
+    _awaiting_responses += 1
+    try:
+        yield
+    finally:
+        _awaiting_responses -= 1
+
+
+def _stage_of(stack: Stack, awaiting: bool = False) -> str:
+    """
+    Stage of a sampled stack (innermost frame first), awaiting if async requests
+    were awaiting their response when it was sampled
+    Samples outside of the known stages go to the innermost vbd_indexer module
+    """
+    file_names = [code.co_filename.replace(os.sep, "/") for code in stack]
+    if file_names and any(fragment in file_names[0] for fragment in _WAIT_FRAGMENTS):
+        if awaiting and _SELECT_FRAGMENT in file_names[0]:
+            return NETWORK_WAIT_STAGE
+        return WAIT_STAGE
+    for file_name in file_names:
+        for stage, fragments in STAGE_RULES:
+            if any(fragment in file_name for fragment in fragments):
+                return stage
+    for code in stack:
+        if code.co_filename.startswith(_PACKAGE_DIR):
+            return os.path.splitext(os.path.basename(code.co_filename))[0]
+    return "other"
+
+
+def _function_name(code: CodeType) -> str:
+    file_name = code.co_filename
+    if file_name.startswith(_PACKAGE_DIR):
+        file_name = os.path.relpath(file_name, os.path.dirname(_PACKAGE_DIR))
+    else:
+        file_name = os.path.basename(file_name)
+    return f"{code.co_qualname} ({file_name}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread of the process every interval_secs
+    Sampling works the same for worker threads, the async event loop and the
+    main thread, and costs little enough to profile production sized rounds.
+    The report breaks the samples down by stage (see STAGE_RULES), thread and function.
+    Work done in other processes (decode processes, summarize pools) is not sampled.
+    """
+
+    def __init__(self, interval_secs: float = DEFAULT_INTERVAL_SECS) -> None:
+        if interval_secs <= 0:
+            raise ValueError("interval_secs must be > 0")
+        self.interval_secs = interval_secs
+        # samples per (thread name, stack, async requests awaiting their response)
+        self.samples: Counter[Tuple[str, Stack, bool]] = Counter()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def start(self) -> None:
+        self.samples.clear()
+        self._stop_event.clear()
+        self._started = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._sample_loop, name="profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._elapsed = time.monotonic() - self._started
+
+    def _sample_loop(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop_event.wait(self.interval_secs):
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            awaiting = _awaiting_responses > 0
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                thread_name = _THREAD_NUMBER.sub("", thread_names.get(ident, "unknown"))
+                self.samples[(thread_name, tuple(stack), awaiting)] += 1
+
+    # --------
+    # Reports
+    # --------
+
+    def report(self, top: int = 25) -> str:
+        """
+        Text report: samples by stage, by thread and stage, and the top functions
+        """
+        total = sum(self.samples.values())
+        stages: Counter[str] = Counter()
+        thread_stages: Dict[str, Counter[str]] = {}
+        self_functions: Counter[CodeType] = Counter()
+        package_functions: Counter[CodeType] = Counter()
+        for (thread_name, stack, awaiting), count in self.samples.items():
+            stage = _stage_of(stack, awaiting)
+            stages[stage] += count
+            thread_stages.setdefault(thread_name, Counter())[stage] += count
+            if stack:
+                self_functions[stack[0]] += count
+            # inclusive: every vbd_indexer function on the stack, once per sample
+            for code in set(stack):
+                if code.co_filename.startswith(_PACKAGE_DIR):
+                    package_functions[code] += count
+
+        lines = [
+            f"Sampled {total} thread stacks every {self.interval_secs * 1000:g}ms "
+            f"over {self._elapsed:.1f}s",
+            "",
+        ]
+
+        def counts_table(
+            title: str,
+            counts: Counter,
+            name: Callable[[Any], str] = str,
+            of: int = total,
+        ) -> None:
+            lines.append(title)
+            lines.append(f"  {'samples':>9} {'share':>7}  name")
+            for key, count in counts.most_common(top):
+                share = 100 * count / of if of else 0.0
+                lines.append(f"  {count:>9} {share:>6.1f}%  {name(key)}")
+            lines.append("")
+
+        counts_table("Stages, all threads", stages)
+        # shares of the samples of the thread
+        for thread_name in sorted(thread_stages):
+            counts = thread_stages[thread_name]
+            counts_table(
+                f"Stages, {thread_name} threads", counts, of=sum(counts.values())
+            )
+        counts_table("Top functions (self)", self_functions, _function_name)
+        counts_table(
+            "Top vbd_indexer functions (inclusive)", package_functions, _function_name
+        )
+        return "\n".join(lines)
+
+    def folded_stacks(self) -> List[str]:
+        """
+        Samples as folded stacks (thread;outermost;...;innermost count), the
+        input format of flame graph tools such as flamegraph.pl and speedscope
+        """
+        folded: Counter[str] = Counter()
+        for (thread_name, stack, _), count in self.samples.items():
+            frames = [thread_name] + [code.co_qualname for code in reversed(stack)]
+            folded[";".join(frames)] += count
+        return [f"{frames} {count}" for frames, count in sorted(folded.items())]
+
+    def write_report(self, file_prefix: str) -> None:
+        """
+        Writes {file_prefix}.txt (report) and {file_prefix}.folded (flame graph input)
+        """
+        with open(f"{file_prefix}.txt", "w") as f:
+            f.write(self.report())
+        with open(f"{file_prefix}.folded", "w") as f:
+            f.write("\n".join(self.folded_stacks()) + "\n")
+        logger.info(f"Profile written to {file_prefix}.txt and {file_prefix}.folded")
+
+
+@contextmanager
+def profiled(file_prefix: str, enabled: bool = True) -> Iterator[None]:
+    """
+    Samples the block if enabled and writes the report files when it exits
+    """
+    if not enabled:
+        yield
+        return
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        profiler.write_report(file_prefix)
@@ -0,0 +1,88 @@
+from typing import Any, Callable, Dict, Iterator, List
+
+import pytest
+from loguru import logger
+
+from mock_thor import MockThorConfig, MockThorNode
+from vbd_indexer.b3tr.b3tr_apps import load_app_name_cache
+from vbd_indexer.b3tr.b3tr_events_defs import B3TR_REWARD_DEFINITION
+from vbd_indexer.b3tr.b3tr_models import B3TRRewardDecodedEvent, B3TRRewardEvent
+from vbd_indexer.indexer.event_indexer import EventIndexer
+from vbd_indexer.indexer.indexer_options import IndexerOptions
+from vbd_indexer.indexer.indexer_status import IndexerStatus
+
+# 2 events per block and 50 events per request: 60 block tasks return full pages
+MOCK_CONFIG = MockThorConfig(rounds=1, round_blocks=240, events_per_block=2.0, apps=5)
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _quiet_logs() -> Iterator[None]:
+    logger.disable("vbd_indexer")
+    yield
+    logger.enable("vbd_indexer")
+
+
+@pytest.fixture(scope="session")
+def mock_node() -> Iterator[MockThorNode]:
+    load_app_name_cache(MOCK_CONFIG.round_ranges(), MOCK_CONFIG.app_maps())
+    with MockThorNode(MOCK_CONFIG) as node:
+        yield node
+
+
+def _reward_options(
+    thor_endpoints: List[str], config: MockThorConfig = MOCK_CONFIG, **overrides: Any
+) -> IndexerOptions[B3TRRewardDecodedEvent, B3TRRewardEvent]:
+    reward_def = B3TR_REWARD_DEFINITION
+    options: Dict[str, Any] = dict(
+        block_ranges=[(config.start_block, config.end_block)],
+        contract_address=reward_def.contract_address,
+        topic0=reward_def.topic0,
+        thor_endpoints=thor_endpoints,
+        task_block_size=60,
+        max_events_per_thor_request=50,
+        delay_between_thor_requests=0.001,
+        event_decoder=reward_def.event_decoder,
+        event_transformer=reward_def.event_transformer,
+        batch_event_decoder=reward_def.batch_event_decoder,
+        retry_backoff_secs=0.01,
+    )
+    options.update(overrides)
+    return IndexerOptions[B3TRRewardDecodedEvent, B3TRRewardEvent](**options)
+
+
+def _run_indexer(
+    options: IndexerOptions, status: IndexerStatus = IndexerStatus.COMPLETED
+) -> EventIndexer:
+    indexer = EventIndexer(options)
+    indexer.start()
+    assert indexer.wait(timeout=120) == status, indexer.error
+    return indexer
+
+
+@pytest.fixture
+def reward_options() -> Callable[..., IndexerOptions]:
+    """
+    Options indexing every reward event of the mock rounds, fields can be overridden
+    """
+    return _reward_options
+
+
+@pytest.fixture
+def run_indexer() -> Callable[..., EventIndexer]:
+    """
+    Runs an indexer to the end, checking its final status (completed by default)
+    """
+    return _run_indexer
+
+
+@pytest.fixture(scope="session")
+def all_events(mock_node: MockThorNode) -> List[B3TRRewardEvent]:
+    """
+    The reward events of the mock rounds, indexed in one clean run
+    """
+    events = _run_indexer(_reward_options([mock_node.url])).results()
+    assert len(events) == sum(
+        MOCK_CONFIG.events_in_block(block_number)
+        for block_number in range(MOCK_CONFIG.start_block, MOCK_CONFIG.end_block + 1)
+    )
+    return events
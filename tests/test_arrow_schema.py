@@ -0,0 +1,57 @@
+from decimal import ROUND_HALF_UP, Context, Decimal
+
+import pyarrow as pa
+import pytest
+
+from vbd_indexer.sinks.arrow_schema import decimal_column
+
+_NUMBERS = [
+    str(Decimal(2.675)),
+    str(Decimal(-0.1)),
+    "-1.0000000000000000005",
+    "99999999999999999999.4999999999999999995",
+    "12",
+    None,
+]
+
+
+def _quantized(value, scale: int) -> Decimal:
+    if value is None:
+        return Decimal(0)
+    return Decimal(value).quantize(
+        Decimal(1).scaleb(-scale), rounding=ROUND_HALF_UP, context=Context(prec=38)
+    )
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        pa.chunked_array([_NUMBERS]),
+        pa.chunked_array(
+            [
+                [
+                    Decimal("-1.0000000000000000005"),
+                    Decimal("2.4999999999999999995"),
+                    None,
+                ]
+            ],
+            pa.decimal128(38, 19),
+        ),
+    ],
+    ids=["string", "decimal"],
+)
+def test_decimal_column_rounds_half_up_to_the_scale(values):
+    column = decimal_column(values, 18)
+
+    assert column.type == pa.decimal128(38, 18)
+    assert column.to_pylist() == [_quantized(v, 18) for v in values.to_pylist()]
+
+
+def test_decimal_column_of_floats():
+    values = pa.chunked_array([[2.5, -0.125, None]])
+
+    assert decimal_column(values, 3).to_pylist() == [
+        Decimal("2.5"),
+        Decimal("-0.125"),
+        Decimal(0),
+    ]
@@ -0,0 +1,17 @@
+from vbd_indexer.b3tr import b3tr_apps
+
+from conftest import MOCK_CONFIG
+
+
+def test_round_ranges_and_app_names_take_one_request(mock_node, monkeypatch):
+    monkeypatch.setattr(b3tr_apps, "DEFAULT_THOR_ENDPOINT", mock_node.url)
+    before = mock_node.stats()["requests"]
+
+    round_ranges = b3tr_apps.warm_round_cache([1])
+
+    assert mock_node.stats()["requests"] - before == 1
+    assert round_ranges == MOCK_CONFIG.round_ranges()
+    assert b3tr_apps.export_app_name_cache() == (
+        MOCK_CONFIG.round_ranges(),
+        MOCK_CONFIG.app_maps(),
+    )
@@ -0,0 +1,69 @@
+import pytest
+from eth_abi.abi import encode
+
+from mock_thor import make_raw_events
+from vbd_indexer.b3tr.b3tr_event_decoders import (
+    decode_reward_event,
+    decode_reward_events,
+)
+from vbd_indexer.thor.raw_event import RawEvent, RawEventPage
+
+from conftest import MOCK_CONFIG
+
+# proofs around the 32 byte abi word boundary, and multi-byte utf-8
+_PROOFS = [
+    "",
+    "a" * 31,
+    "b" * 32,
+    "c" * 33,
+    "é" * 16,
+    '{"impact": {"carbon": 1}, "description": "Bäume gepflanzt 🌳"}',
+    "🌍" * 100,
+]
+
+
+def _raw_event(amount: int, proof: str) -> RawEvent:
+    template = make_raw_events(1, MOCK_CONFIG)[0]
+    return RawEvent(
+        block_number=template.block_number,
+        timestamp=template.timestamp,
+        data="0x" + encode(["uint256", "string"], [amount, proof]).hex(),
+        topics=template.topics,
+    )
+
+
+def test_batch_decoder_matches_the_abi_decoder_on_a_page():
+    page = make_raw_events(500, MOCK_CONFIG)
+
+    decoded = decode_reward_events(page)
+
+    assert decoded == [decode_reward_event(raw_event) for raw_event in page]
+    assert decode_reward_events(list(page)) == decoded
+
+
+@pytest.mark.parametrize("amount", [0, 1, 2**256 - 1])
+def test_batch_decoder_matches_the_abi_decoder_on_edge_proofs(amount):
+    raw_events = [_raw_event(amount, proof) for proof in _PROOFS]
+
+    decoded = decode_reward_events(
+        RawEventPage.from_rows(
+            (e.block_number, e.timestamp, e.data, e.topics) for e in raw_events
+        )
+    )
+
+    assert decoded == [decode_reward_event(raw_event) for raw_event in raw_events]
+    assert [event.proof for event in decoded] == _PROOFS
+    assert {event.amount for event in decoded} == {amount}
+
+
+def test_batch_decoder_rejects_truncated_data():
+    raw_event = _raw_event(1, "c" * 33)
+    truncated = RawEvent(
+        block_number=raw_event.block_number,
+        timestamp=raw_event.timestamp,
+        data=raw_event.data[:-64],
+        topics=raw_event.topics,
+    )
+
+    with pytest.raises(ValueError, match="Malformed RewardDistributed data"):
+        decode_reward_events([truncated])
@@ -0,0 +1,146 @@
+import json
+from decimal import Decimal
+
+import pyarrow.parquet as pq
+import pytest
+from loguru import logger
+
+from vbd_indexer.analysis.reward_aggregate import RewardAggregate
+from vbd_indexer.b3tr.b3tr_models import B3TRRewardEvent
+from vbd_indexer.b3tr.b3tr_proof_parser import parse_reward_proof
+from vbd_indexer.b3tr.b3tr_schemas import (
+    B3TR_REWARD_ARROW_SCHEMA,
+    B3TR_REWARD_EXTRA_COLUMN_TYPES,
+)
+from vbd_indexer.sinks.parquet_event_sink import ParquetEventSink
+
+
+def _proof(impact_json: str) -> str:
+    return f'{{"version": 2, "impact": {impact_json}}}'
+
+
+def _event(impact) -> B3TRRewardEvent:
+    return B3TRRewardEvent(
+        block_number=1,
+        timestamp=0,
+        round_number=1,
+        amount=Decimal("1.5"),
+        app_id="0x01",
+        app_name="App1",
+        receiver_address="0x02",
+        impact=impact,
+    )
+
+
+@pytest.mark.parametrize("bad_value", ["NaN", "Infinity", "-Infinity", "1e25", "true"])
+def test_bad_values_of_known_impacts_are_dropped(bad_value):
+    impacts = parse_reward_proof(_proof(f'{{"carbon": {bad_value}, "water": 2.5}}'))
+
+    assert impacts == (("water", Decimal("2.5")),)
+
+
+@pytest.mark.parametrize("bad_value", ["NaN", "Infinity", "1e25"])
+def test_bad_values_do_not_fail_the_aggregate_or_parquet(tmp_path, bad_value):
+    events = [
+        _event(parse_reward_proof(_proof(f'{{"carbon": {bad_value}, "water": 2}}'))),
+        _event(parse_reward_proof(_proof('{"carbon": 1.25}'))),
+    ]
+
+    aggregate = RewardAggregate()
+    aggregate.add_events(events)
+    summary = aggregate.summary()
+    assert summary.loc[0, "carbon_total"] == 1.25
+    assert summary.loc[0, "water_total"] == 2
+
+    sink = ParquetEventSink(
+        str(tmp_path / "rewards.parquet"),
+        B3TR_REWARD_ARROW_SCHEMA,
+        extra_column_types=B3TR_REWARD_EXTRA_COLUMN_TYPES,
+    )
+    sink.write(events)
+    sink.close()
+    table = pq.read_table(tmp_path / "rewards.parquet")
+    assert table.column("impact_carbon").to_pylist() == [0, Decimal("1.25")]
+
+
+def test_values_up_to_the_column_limit_are_kept(tmp_path):
+    impacts = parse_reward_proof(
+        _proof(json.dumps({"carbon": "99999999999999999999.5", "water": -3}))
+    )
+
+    assert impacts == (
+        ("carbon", Decimal("99999999999999999999.5")),
+        ("water", Decimal(-3)),
+    )
+    sink = ParquetEventSink(
+        str(tmp_path / "rewards.parquet"),
+        B3TR_REWARD_ARROW_SCHEMA,
+        extra_column_types=B3TR_REWARD_EXTRA_COLUMN_TYPES,
+    )
+    sink.write([_event(impacts)])
+    sink.close()
+    table = pq.read_table(tmp_path / "rewards.parquet")
+    assert table.column("impact_carbon").to_pylist() == [impacts[0][1]]
+
+
+@pytest.fixture
+def warnings():
+    messages = []
+    logger.enable("vbd_indexer")
+    sink_id = logger.add(messages.append, level="WARNING", format="{message}")
+    yield messages
+    logger.remove(sink_id)
+    logger.disable("vbd_indexer")
+
+
+def test_impact_names_are_snake_cased():
+    impacts = parse_reward_proof(
+        _proof(
+            json.dumps(
+                {"CO2": 1, "newThing": 2, "Trees Planted": 3, "Carbon": 4, "carbon": 5}
+            )
+        )
+    )
+
+    assert impacts == (
+        ("co2", Decimal(1)),
+        ("new_thing", Decimal(2)),
+        ("trees_planted", Decimal(3)),
+        ("carbon", Decimal(4)),
+    )
+
+
+def test_dropped_impact_names_are_logged_once(warnings):
+    for value in (1, 2):
+        proof = _proof(json.dumps({"2x": value, "water": value}))
+        assert parse_reward_proof(proof) == (("water", Decimal(value)),)
+
+    assert [m for m in warnings if "'2x'" in m] == [
+        "Dropping reward proof impacts named '2x', not a valid name\n"
+    ]
+
+
+def test_dropped_impact_values_are_logged(warnings):
+    assert parse_reward_proof(_proof('{"carbon": false, "flag": true}')) == ()
+
+    assert len(warnings) == 2
+
+
+def test_values_are_rounded_to_the_impact_scale():
+    impacts = parse_reward_proof(
+        _proof(
+            json.dumps(
+                {
+                    "carbon": 0.1,
+                    "water": "-1.0000000000000000005",
+                    "energy": "99999999999999999999.9999999999999999995",
+                }
+            )
+        )
+    )
+
+    assert impacts == (
+        ("carbon", Decimal("0.100000000000000006")),
+        ("water", Decimal("-1.000000000000000001")),
+    )
+    assert all(value.as_tuple().exponent == -18 for _, value in impacts)
@@ -0,0 +1,70 @@
+import csv
+import os
+
+from vbd_indexer.sinks.csv_event_sink import CsvEventSink
+
+# new columns show up part way through, in several batches
+_BATCHES = [
+    [{"block": 1, "impact_carbon": 1}, {"block": 2}],
+    [{"block": 3, "impact_co2": 2}],
+    [{"block": 4, "impact_carbon": 3}],
+    [{"block": 5, "impact_new_thing": 4, "impact_co2": 5}],
+]
+
+_HEADER = ["block", "impact_carbon", "impact_co2", "impact_new_thing"]
+_ROWS = [
+    ["1", "1", "", ""],
+    ["2", "", "", ""],
+    ["3", "", "2", ""],
+    ["4", "3", "", ""],
+    ["5", "", "5", "4"],
+]
+
+
+def _rows(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def _read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_new_columns_are_merged_once_on_close(tmp_path):
+    path = tmp_path / "rewards.csv"
+    sink = CsvEventSink(str(path))
+    sink.write(_BATCHES[0])
+    sink.write(_BATCHES[1])
+    # the rows written before the new columns are left as they are
+    written = _read(sink.path)
+    assert _rows(sink.path) == [_HEADER[:2]] + [row[:2] for row in _ROWS[:2]]
+    for batch in _BATCHES[2:]:
+        sink.write(batch)
+        assert _read(sink.path) == written
+    sink.close()
+
+    assert os.listdir(tmp_path) == ["rewards.csv"]
+    assert _rows(path) == [_HEADER] + _ROWS
+
+
+def test_appended_file_is_only_replaced_on_close(tmp_path):
+    path = tmp_path / "rewards.csv"
+    sink = CsvEventSink(str(path))
+    sink.write(_BATCHES[0])
+    sink.close()
+    followed = _read(path)
+
+    sink = CsvEventSink(str(path), append=True)
+    for batch in _BATCHES[1:]:
+        sink.write(batch)
+    sink.abort()
+    assert os.listdir(tmp_path) == ["rewards.csv"]
+    assert _read(path) == followed
+
+    sink = CsvEventSink(str(path), append=True)
+    for batch in _BATCHES[1:]:
+        sink.write(batch)
+    sink.close()
+    assert os.listdir(tmp_path) == ["rewards.csv"]
+    assert _rows(path) == [_HEADER] + _ROWS
@@ -0,0 +1,138 @@
+import dataclasses
+import socket
+from collections import Counter
+
+import httpx
+import pytest
+
+from mock_thor import MockThorNode, start_nodes
+from vbd_indexer.indexer.event_indexer import EventIndexer
+from vbd_indexer.indexer.indexer_status import IndexerStatus
+
+ENGINES = pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+
+
+@pytest.fixture(scope="module")
+def flaky_nodes(mock_node):
+    # the chain of mock_node, with 30% of /logs/event requests answered with 429
+    nodes = start_nodes(3, dataclasses.replace(mock_node.config, error_rate=0.3))
+    yield nodes
+    for node in nodes:
+        node.stop()
+
+
+@pytest.fixture(scope="module")
+def flaky_node(flaky_nodes):
+    return flaky_nodes[0]
+
+
+@pytest.fixture(scope="module")
+def failing_node(mock_node):
+    with MockThorNode(dataclasses.replace(mock_node.config, error_rate=1.0)) as node:
+        yield node
+
+
+@pytest.fixture
+def dead_url() -> str:
+    """
+    An endpoint refusing connections
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def _endpoint_metrics(indexer: EventIndexer, endpoint: str):
+    return next(e for e in indexer.metrics().endpoints if e.endpoint == endpoint)
+
+
+@ENGINES
+def test_transient_errors_are_retried(
+    flaky_node, reward_options, run_indexer, all_events, async_mode
+):
+    errors_before = flaky_node.stats()["errors"]
+    indexer = run_indexer(
+        reward_options(
+            [flaky_node.url],
+            async_mode=async_mode,
+            max_retries_per_endpoint=10,
+            # never bench the only endpoint
+            endpoint_error_rate_threshold=1.0,
+        )
+    )
+
+    assert Counter(indexer.results()) == Counter(all_events)
+    errors = flaky_node.stats()["errors"] - errors_before
+    metrics = _endpoint_metrics(indexer, flaky_node.url)
+    assert errors > 0
+    assert metrics.errors == metrics.retries == errors
+
+
+@ENGINES
+@pytest.mark.parametrize("endpoints", [1, 3])
+def test_benched_endpoints_take_their_tasks_back(
+    flaky_nodes, reward_options, run_indexer, all_events, async_mode, endpoints
+):
+    urls = [node.url for node in flaky_nodes[:endpoints]]
+    # default retries and bench threshold, a short bench keeps the test fast
+    indexer = run_indexer(
+        reward_options(urls, async_mode=async_mode, endpoint_bench_secs=0.1)
+    )
+
+    assert Counter(indexer.results()) == Counter(all_events)
+
+
+@ENGINES
+def test_tasks_fail_over_from_a_dead_endpoint(
+    mock_node, dead_url, reward_options, run_indexer, all_events, async_mode
+):
+    indexer = run_indexer(
+        reward_options(
+            [dead_url, mock_node.url], async_mode=async_mode, max_retries_per_endpoint=1
+        )
+    )
+
+    assert Counter(indexer.results()) == Counter(all_events)
+    dead_metrics = _endpoint_metrics(indexer, dead_url)
+    assert dead_metrics.errors > 0
+    assert dead_metrics.pages == 0
+
+
+@ENGINES
+def test_probe_drops_a_dead_endpoint(
+    mock_node, dead_url, reward_options, run_indexer, all_events, async_mode
+):
+    indexer = run_indexer(
+        reward_options(
+            [dead_url, mock_node.url], async_mode=async_mode, probe_endpoints=True
+        )
+    )
+
+    assert Counter(indexer.results()) == Counter(all_events)
+    assert _endpoint_metrics(indexer, dead_url).errors == 0
+
+
+def test_probe_fails_without_a_live_endpoint(dead_url, reward_options):
+    indexer = EventIndexer(reward_options([dead_url], probe_endpoints=True))
+    with pytest.raises(RuntimeError, match="No thor endpoint responded"):
+        indexer.start()
+
+
+@ENGINES
+def test_fails_once_every_endpoint_failed_a_task(
+    failing_node, dead_url, reward_options, run_indexer, async_mode
+):
+    indexer = run_indexer(
+        # more retries than the errors that bench an endpoint: the errors of the
+        # task add up over the benches, so the run still ends
+        reward_options(
+            [failing_node.url, dead_url],
+            async_mode=async_mode,
+            max_retries_per_endpoint=6,
+            endpoint_bench_secs=0.1,
+        ),
+        IndexerStatus.FAILED,
+    )
+
+    assert isinstance(indexer.error, (httpx.HTTPStatusError, httpx.TransportError))
@@ -0,0 +1,41 @@
+import pytest
+
+from vbd_indexer.indexer.endpoint_health import EndpointHealth
+
+
+def _health() -> EndpointHealth:
+    return EndpointHealth("http://node", error_rate_threshold=1.0, bench_secs=1.0)
+
+
+def test_error_rate_counts_requests_on_both_sides():
+    health = _health()
+    # a task paged through 3 successful requests, then a failed request
+    for _ in range(3):
+        health.record_success(0.1)
+    health.record_events(150)
+    health.record_failure()
+
+    assert health.error_rate == 0.25
+
+
+def test_score_is_the_events_per_second_of_a_slot():
+    fast, slow = _health(), _health()
+    for health, events in ((fast, 50), (slow, 10)):
+        # same latency, but pages of 50 events against pages of 10
+        for _ in range(4):
+            health.record_success(0.1)
+            health.record_events(events)
+    slow.record_failure()
+
+    assert fast.score == pytest.approx(500)
+    assert slow.score == pytest.approx(100 * 4 / 5)
+
+
+def test_score_is_unknown_until_events_are_received():
+    health = _health()
+    assert health.score is None
+    health.record_success(0.1)
+    health.record_events(0)
+    assert health.score is None
+    health.record_events(5)
+    assert health.score == pytest.approx(50)
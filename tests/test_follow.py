@@ -0,0 +1,90 @@
+import csv
+import os
+
+import pytest
+
+from vbd_indexer import app
+from vbd_indexer.b3tr import b3tr_apps, b3tr_round
+from vbd_indexer.indexer.follow_state import FollowState
+
+from conftest import MOCK_CONFIG
+
+ROUND_FILE = "rewards-events-round-1.csv"
+
+
+@pytest.fixture
+def follow_mock_node(mock_node, tmp_path, monkeypatch):
+    """
+    The follow command polling the mock node, writing to tmp_path
+    """
+    for module in (app, b3tr_apps, b3tr_round):
+        monkeypatch.setattr(module, "DEFAULT_THOR_ENDPOINT", mock_node.url)
+    monkeypatch.setattr(app, "THOR_ENDPOINTS", [mock_node.url])
+    monkeypatch.chdir(tmp_path)
+    return mock_node
+
+
+def _read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _failing_file_sinks(monkeypatch) -> None:
+    """
+    Round file sinks that append their events, then fail to close
+    """
+    create_file_sink = app._create_file_sink
+
+    def create_failing_file_sink(*args):
+        sink = create_file_sink(*args)
+        close = sink.close
+
+        def close_then_fail():
+            close()
+            raise OSError("No space left on device")
+
+        sink.close = close_then_fail
+        return sink
+
+    monkeypatch.setattr(app, "_create_file_sink", create_failing_file_sink)
+
+
+def test_failed_poll_is_rolled_back(
+    follow_mock_node, tmp_path, monkeypatch, all_events
+):
+    state = FollowState(str(tmp_path / "follow.json"))
+    # the mock node's best block is 100 blocks after its last event
+    assert app._follow_rewards_once(state, 220, "csv")
+    followed = _read(ROUND_FILE)
+    assert state.last_block == MOCK_CONFIG.end_block - 120
+
+    with monkeypatch.context() as m:
+        _failing_file_sinks(m)
+        with pytest.raises(RuntimeError, match="Following blocks"):
+            app._follow_rewards_once(state, 0, "csv")
+    assert _read(ROUND_FILE) == followed
+    assert state.last_block == MOCK_CONFIG.end_block - 120
+
+    # the next poll fetches the same blocks again, without duplicates
+    assert app._follow_rewards_once(state, 0, "csv")
+    with open(ROUND_FILE, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == len(all_events)
+    assert sorted(int(row["block_number"]) for row in rows) == sorted(
+        event.block_number for event in all_events
+    )
+
+
+def test_rollback_removes_files_written_after_the_last_save(tmp_path):
+    saved, unsaved = tmp_path / "round-1.csv", tmp_path / "round-2.csv"
+    saved.write_text("header\nrow\n")
+    state = FollowState(str(tmp_path / "follow.json"))
+    state.save(100, "csv", [str(saved)])
+    with open(saved, "a") as f:
+        f.write("appended row\n")
+    unsaved.write_text("header\n")
+
+    FollowState(state.path).rollback([str(saved), str(unsaved)])
+
+    assert saved.read_text() == "header\nrow\n"
+    assert not os.path.exists(unsaved)
@@ -0,0 +1,125 @@
+import os
+import pickle
+from collections import Counter
+
+import pytest
+
+from vbd_indexer.indexer.indexer_checkpoint import (
+    CHECKPOINT_FORMAT_VERSION,
+    CheckpointHeader,
+    IndexerCheckpoint,
+)
+from vbd_indexer.indexer.indexer_task import IndexerTask
+
+ENGINES = pytest.mark.parametrize(
+    "async_mode, split_full_pages",
+    [(False, False), (False, True), (True, False), (True, True)],
+    ids=["sync", "sync-split", "async", "async-split"],
+)
+
+
+def _logs_requests(mock_node) -> int:
+    return mock_node.stats()["logs_requests"]
+
+
+def _journal(tmp_path, reward_options, run_indexer, mock_node, **overrides):
+    """
+    Indexes every event with a journal, returns the checkpoint and the fetch count
+    """
+    checkpoint = IndexerCheckpoint(str(tmp_path / "rewards.journal"))
+    before = _logs_requests(mock_node)
+    run_indexer(reward_options([mock_node.url], checkpoint=checkpoint, **overrides))
+    checkpoint.close()
+    return checkpoint, _logs_requests(mock_node) - before
+
+
+@ENGINES
+def test_resume_of_a_cut_journal_fetches_the_rest_once(
+    tmp_path,
+    mock_node,
+    reward_options,
+    run_indexer,
+    all_events,
+    async_mode,
+    split_full_pages,
+):
+    engine = dict(async_mode=async_mode, split_full_pages=split_full_pages)
+    checkpoint, journaled_requests = _journal(
+        tmp_path, reward_options, run_indexer, mock_node, **engine
+    )
+    # as if the run crashed part way through writing a record
+    with open(checkpoint.path, "r+b") as f:
+        f.truncate(os.path.getsize(checkpoint.path) * 3 // 5)
+
+    before = _logs_requests(mock_node)
+    indexer = run_indexer(
+        reward_options(
+            [mock_node.url],
+            checkpoint=checkpoint,
+            resume_from_checkpoint=True,
+            **engine,
+        )
+    )
+    resumed_requests = _logs_requests(mock_node) - before
+
+    assert Counter(indexer.results()) == Counter(all_events)
+    assert indexer.result_count == len(all_events)
+    assert 0 < resumed_requests < journaled_requests
+
+
+@ENGINES
+def test_resume_of_a_complete_journal_fetches_nothing(
+    tmp_path,
+    mock_node,
+    reward_options,
+    run_indexer,
+    all_events,
+    async_mode,
+    split_full_pages,
+):
+    engine = dict(async_mode=async_mode, split_full_pages=split_full_pages)
+    checkpoint, _ = _journal(tmp_path, reward_options, run_indexer, mock_node, **engine)
+
+    for _ in range(2):
+        before = _logs_requests(mock_node)
+        indexer = run_indexer(
+            reward_options(
+                [mock_node.url],
+                checkpoint=checkpoint,
+                resume_from_checkpoint=True,
+                **engine,
+            )
+        )
+        checkpoint.close()
+        assert _logs_requests(mock_node) == before
+        assert Counter(indexer.results()) == Counter(all_events)
+
+
+def test_journal_of_another_job_or_format_is_discarded(tmp_path):
+    checkpoint = IndexerCheckpoint(str(tmp_path / "rewards.journal"))
+    header = CheckpointHeader(CHECKPOINT_FORMAT_VERSION, "0xa", "0xb", ((1, 100),))
+    checkpoint.begin(header)
+    checkpoint.record(IndexerTask(1, 50), ["event"])
+    checkpoint.close()
+    assert list(checkpoint.resume(header)) == [((1, 50), ["event"])]
+    checkpoint.close()
+
+    other_job = CheckpointHeader(CHECKPOINT_FORMAT_VERSION, "0xa", "0xb", ((1, 200),))
+    assert list(checkpoint.resume(other_job)) == []
+    checkpoint.record(IndexerTask(1, 50), ["event"])
+    checkpoint.close()
+
+    other_format = CheckpointHeader(
+        CHECKPOINT_FORMAT_VERSION + 1, "0xa", "0xb", ((1, 200),)
+    )
+    assert list(checkpoint.resume(other_format)) == []
+    checkpoint.close()
+
+    # journals written before the header had a format version
+    unversioned = object.__new__(CheckpointHeader)
+    object.__setattr__(unversioned, "__dict__", {"contract_address": "0xa"})
+    with open(checkpoint.path, "wb") as f:
+        pickle.dump(unversioned, f)
+        pickle.dump((1, 50, ["event"]), f)
+    assert list(checkpoint.resume(header)) == []
+    checkpoint.close()
@@ -0,0 +1,68 @@
+import os
+from decimal import Decimal
+
+import pyarrow.parquet as pq
+
+from vbd_indexer.b3tr.b3tr_models import B3TRRewardEvent
+from vbd_indexer.b3tr.b3tr_schemas import (
+    B3TR_REWARD_ARROW_SCHEMA,
+    B3TR_REWARD_EXTRA_COLUMN_TYPES,
+)
+from vbd_indexer.sinks.parquet_event_sink import ParquetEventSink
+
+
+def _event(block_number: int, impact) -> B3TRRewardEvent:
+    return B3TRRewardEvent(
+        block_number=block_number,
+        timestamp=0,
+        round_number=1,
+        amount=Decimal(1),
+        app_id="0x01",
+        app_name="App1",
+        receiver_address="0x02",
+        impact=tuple((name, Decimal(value)) for name, value in impact),
+    )
+
+
+# new impact names show up part way through, in several batches
+_BATCHES = [
+    [_event(1, [("carbon", 1)]), _event(2, [])],
+    [_event(3, [("co2", 2)]), _event(4, [("carbon", 3)])],
+    [_event(5, [])],
+    [_event(6, [("new_thing", 4), ("co2", 5)])],
+]
+
+
+def _sink(path) -> ParquetEventSink:
+    return ParquetEventSink(
+        str(path),
+        B3TR_REWARD_ARROW_SCHEMA,
+        row_group_size=2,
+        extra_column_types=B3TR_REWARD_EXTRA_COLUMN_TYPES,
+    )
+
+
+def test_new_columns_do_not_reread_the_rows_written(tmp_path, monkeypatch):
+    path = tmp_path / "rewards.parquet"
+    sink = _sink(path)
+    with monkeypatch.context() as m:
+        m.setattr(pq, "read_table", None)
+        for batch in _BATCHES:
+            sink.write(batch)
+        sink.close()
+
+    assert os.listdir(tmp_path) == ["rewards.parquet"]
+    table = pq.read_table(path)
+    assert table.column("block_number").to_pylist() == [1, 2, 3, 4, 5, 6]
+    assert table.column("impact_carbon").to_pylist() == [1, 0, 0, 3, 0, 0]
+    assert table.column("impact_co2").to_pylist() == [None, None, 2, None, None, 5]
+    assert table.column("impact_new_thing").to_pylist() == [None] * 5 + [4]
+
+
+def test_abort_removes_every_part(tmp_path):
+    sink = _sink(tmp_path / "rewards.parquet")
+    for batch in _BATCHES:
+        sink.write(batch)
+    sink.abort()
+
+    assert os.listdir(tmp_path) == []
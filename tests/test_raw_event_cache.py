@@ -0,0 +1,86 @@
+from collections import Counter
+
+import pytest
+
+from vbd_indexer.thor.raw_event_cache import RawEventCache
+
+from conftest import MOCK_CONFIG
+
+ENGINES = pytest.mark.parametrize(
+    "async_mode, split_full_pages",
+    [(False, False), (True, True)],
+    ids=["sync", "async-split"],
+)
+
+
+def _requests(mock_node):
+    stats = mock_node.stats()
+    return stats["requests"], stats["logs_requests"]
+
+
+@ENGINES
+def test_cached_blocks_take_no_logs_request(
+    tmp_path,
+    mock_node,
+    reward_options,
+    run_indexer,
+    all_events,
+    async_mode,
+    split_full_pages,
+):
+    engine = dict(async_mode=async_mode, split_full_pages=split_full_pages)
+    cache = RawEventCache(str(tmp_path / "raw-events.db"))
+    try:
+        _, logs_requests = _requests(mock_node)
+        run_indexer(reward_options([mock_node.url], raw_event_cache=cache, **engine))
+        assert _requests(mock_node)[1] > logs_requests
+
+        for _ in range(2):
+            requests, logs_requests = _requests(mock_node)
+            indexer = run_indexer(
+                reward_options([mock_node.url], raw_event_cache=cache, **engine)
+            )
+            # not even the finalized block is asked for
+            assert _requests(mock_node) == (requests, logs_requests)
+            assert Counter(indexer.results()) == Counter(all_events)
+    finally:
+        cache.close()
+
+
+def test_only_the_blocks_missing_from_the_cache_are_fetched(
+    tmp_path, mock_node, reward_options, run_indexer, all_events
+):
+    cache = RawEventCache(str(tmp_path / "raw-events.db"))
+    middle = (MOCK_CONFIG.start_block + MOCK_CONFIG.end_block) // 2
+    try:
+        _, before = _requests(mock_node)
+        run_indexer(reward_options([mock_node.url]))
+        _, uncached_requests = _requests(mock_node)
+        uncached_requests -= before
+
+        run_indexer(
+            reward_options(
+                [mock_node.url],
+                block_ranges=[(MOCK_CONFIG.start_block, middle)],
+                raw_event_cache=cache,
+            )
+        )
+        _, before = _requests(mock_node)
+        indexer = run_indexer(reward_options([mock_node.url], raw_event_cache=cache))
+        _, rest_requests = _requests(mock_node)
+        rest_requests -= before
+
+        assert 0 < rest_requests < uncached_requests
+        assert Counter(indexer.results()) == Counter(all_events)
+        options = indexer.options
+        assert (
+            cache.missing_ranges(
+                options.contract_address,
+                options.topic0,
+                MOCK_CONFIG.start_block,
+                MOCK_CONFIG.end_block,
+            )
+            == []
+        )
+    finally:
+        cache.close()
@@ -0,0 +1,91 @@
+import json
+from collections import Counter
+from decimal import Decimal
+
+import pyarrow as pa
+
+from vbd_indexer.analysis.reward_aggregate import RewardAggregate
+from vbd_indexer.b3tr.b3tr_models import B3TRRewardEvent
+from vbd_indexer.b3tr.b3tr_schemas import B3TR_AMOUNT_SCALE, B3TR_IMPACT_SCALE
+from vbd_indexer.sinks.event_sink import event_to_record
+
+
+def _row_by_row_totals(events):
+    """
+    Per-app totals summed one event at a time, as exact Decimals
+    """
+    amount_quantum = Decimal(1).scaleb(-B3TR_AMOUNT_SCALE)
+    totals = {}
+    for event in events:
+        app = totals.setdefault(
+            event.app_name,
+            {
+                "actions": 0,
+                "rewards": Decimal(0),
+                "impacts": Counter(),
+                "wallets": set(),
+            },
+        )
+        app["actions"] += 1
+        app["rewards"] += event.amount.quantize(amount_quantum)
+        for name, value in event.impact:
+            app["impacts"][name] += value
+        app["wallets"].add(event.receiver_address)
+    return totals
+
+
+def test_merged_aggregates_match_a_row_by_row_sum(all_events):
+    merged = RewardAggregate()
+    for chunk in (all_events[:100], all_events[100:101], all_events[101:]):
+        aggregate = RewardAggregate()
+        aggregate.add_events(chunk)
+        # as saved next to a round file
+        merged.merge(
+            RewardAggregate.from_json(json.loads(json.dumps(aggregate.to_json())))
+        )
+
+    totals = _row_by_row_totals(all_events)
+    assert set(merged.apps) == set(totals)
+    for app_name, app in merged.apps.items():
+        expected = totals[app_name]
+        assert app.actions_total == expected["actions"]
+        assert app.rewards_total == expected["rewards"].scaleb(B3TR_AMOUNT_SCALE)
+        assert app.impact_totals == {
+            name: total.scaleb(B3TR_IMPACT_SCALE)
+            for name, total in expected["impacts"].items()
+        }
+        assert set(app.wallet_actions) == expected["wallets"]
+        assert sum(app.wallet_actions.values()) == expected["actions"]
+
+
+def _event(amount: str, impact: str, receiver_address: str) -> B3TRRewardEvent:
+    return B3TRRewardEvent(
+        block_number=1,
+        timestamp=0,
+        round_number=1,
+        amount=Decimal(amount),
+        app_id="0x01",
+        app_name="App1",
+        receiver_address=receiver_address,
+        impact=(("carbon", Decimal(impact)),),
+    )
+
+
+def test_totals_are_exact_from_events_and_tables():
+    # tenths do not add up exactly as floats, nor do values over 2**53
+    events = [_event("0.1", "0.1", f"0x{i % 3}") for i in range(10)] + [
+        _event("123456789012345.678", "99999999999999999999.999999999999999999", "0x9")
+        for _ in range(3)
+    ]
+    from_events = RewardAggregate()
+    from_events.add_events(events)
+    from_table = RewardAggregate()
+    from_table.add_table(pa.Table.from_pylist([event_to_record(e) for e in events]))
+
+    for aggregate in (from_events, from_table):
+        app = aggregate.apps["App1"]
+        assert app.actions_total == 13
+        assert app.rewards_total == 1_000 + 3 * 123456789012345678
+        assert app.impact_totals["carbon"] == 10**18 + 3 * (10**38 - 1)
+        assert app.wallet_actions == {"0x0": 4, "0x1": 3, "0x2": 3, "0x9": 3}
+    assert from_events.summary().equals(from_table.summary())
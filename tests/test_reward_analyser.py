@@ -0,0 +1,55 @@
+import pytest
+
+from vbd_indexer.analysis.reward_aggregate import RewardAggregate
+from vbd_indexer.analysis.reward_analyser import get_rewards_summary, get_rounds_summary
+from vbd_indexer.b3tr.b3tr_schemas import (
+    B3TR_REWARD_ARROW_SCHEMA,
+    B3TR_REWARD_EXTRA_COLUMN_TYPES,
+)
+from vbd_indexer.sinks.csv_event_sink import CsvEventSink
+from vbd_indexer.sinks.jsonl_event_sink import JsonlEventSink
+from vbd_indexer.sinks.parquet_event_sink import ParquetEventSink
+
+
+def _write_round_file(events, output_format: str) -> None:
+    file_name = f"rewards-events-round-1.{output_format}"
+    if output_format == "parquet":
+        sink = ParquetEventSink(
+            file_name,
+            B3TR_REWARD_ARROW_SCHEMA,
+            extra_column_types=B3TR_REWARD_EXTRA_COLUMN_TYPES,
+        )
+    elif output_format == "jsonl":
+        sink = JsonlEventSink(file_name)
+    else:
+        sink = CsvEventSink(file_name)
+    sink.write(events)
+    sink.close()
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet", "jsonl"])
+def test_summaries_read_the_round_file_of_any_format(
+    tmp_path, monkeypatch, all_events, output_format
+):
+    monkeypatch.chdir(tmp_path)
+    _write_round_file(all_events, output_format)
+    aggregate = RewardAggregate()
+    aggregate.add_events(all_events)
+    expected = aggregate.summary()
+
+    # the aggregate and the sketches are built from the round file, then reused
+    for _ in range(2):
+        summary = get_rewards_summary(1, approx_wallets=True)
+        assert summary.drop(columns="wallets_unique_approx").equals(expected)
+        assert (summary["wallets_unique_approx"] > 0).all()
+
+    rounds_df, totals_df = get_rounds_summary([1], approx_wallets=True)
+    assert totals_df.equals(summary)
+    assert rounds_df.drop(columns="round_number").equals(summary)
+
+
+def test_summary_without_a_round_file_names_the_round(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(FileNotFoundError, match="round 7"):
+        get_rewards_summary(7)
@@ -0,0 +1,28 @@
+from vbd_indexer.utils.sampling_profiler import (
+    NETWORK_WAIT_STAGE,
+    WAIT_STAGE,
+    SamplingProfiler,
+    _stage_of,
+)
+
+
+def test_event_loop_waiting_on_requests_is_network_wait(
+    mock_node, reward_options, run_indexer
+):
+    profiler = SamplingProfiler(interval_secs=0.001)
+    profiler.start()
+    try:
+        run_indexer(reward_options([mock_node.url], async_mode=True))
+    finally:
+        profiler.stop()
+
+    network_waits = [
+        stack
+        for thread_name, stack, awaiting in profiler.samples
+        if thread_name == "indexer-async"
+        and _stage_of(stack, awaiting) == NETWORK_WAIT_STAGE
+    ]
+    assert network_waits
+    assert NETWORK_WAIT_STAGE in profiler.report()
+    # the same wait with no request awaiting its response is idle
+    assert _stage_of(network_waits[0]) == WAIT_STAGE